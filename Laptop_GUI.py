@@ -1,58 +1,276 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog, ttk
+import math
+import queue
 import serial
 import threading
 import time
 
+import command_link
+import lora_at
+import lora_rcv
+import mission
+import telemetry
+
 # LoRa module configuration
 LORA_PORT = "/dev/ttyUSB0"  # Adjust based on your system
 BAUDRATE = 115200
 MY_ADDRESS = 99            # Controller's unique address
 NETWORK_ID = 5              # Shared network ID with boats
+LORA_SF = 12                # Spreading factor of the LoRa modules (paces command retransmissions)
+
+# Boats that START/STOP are sent to; each must acknowledge (see command_link.py)
+BOAT_ADDRESSES = [100, 101]  # Leader, follower
+COMMAND_TICK_MS = 100       # How often due command (re)transmissions are sent
+LEADER_ADDRESS = 100        # Boat that waypoint missions are uploaded to (see mission.py)
+
+# Display settings: the reader thread never touches Tk; it queues formatted lines
+# that the Tk thread applies in one batch every UI_REFRESH_MS
+UI_REFRESH_MS = 50          # Refresh period of the status display (20 Hz)
+MAX_BATCH = 1000            # Most lines applied per refresh (keeps each refresh short)
+MAX_QUEUED = 20000          # Lines waiting for display before new ones are dropped
+MAX_SCROLLBACK = 2000       # Lines kept in the status display; older ones are trimmed
+READ_IDLE_SLEEP = 0.02      # Reader thread pause when the serial buffer is empty
+
+# Swarm status table and track plot
+TABLE_REFRESH_MS = 1000     # How often the last-seen ages in the table are refreshed
+BOAT_LOST_TIME = 20         # Seconds without a packet after which a boat is shown as LOST
+TRACK_MIN_STEP = 1.0        # Metres a boat must move before a new track point is kept
+MAX_TRACK_POINTS = 400      # Track points kept per boat; older points are thinned out beyond this
+PLOT_SIZE = 400             # Width and height of the track plot in pixels
+METRES_PER_DEG_LAT = 111_320.0
+
+def configure_lora(at):
+    """
+    Configures the LoRa module behind an ATEngine with the controller's address,
+    network ID and spreading factor, writing only the settings that differ.
+    """
+    at.configure(MY_ADDRESS, NETWORK_ID, lora_at.parameters(LORA_SF))
+    print(f"LoRa module {at.summary()}")
 
-# Initialize serial connection to LoRa module
-ser = serial.Serial(LORA_PORT, BAUDRATE, timeout=2)
+def read_lines(ser, at):
+    """
+    Returns the complete lines (without line ending) among the bytes waiting on
+    the serial port, reading only what is already there. A partial line stays
+    in the AT engine's buffer until the rest arrives.
+    """
+    waiting = ser.in_waiting
+    if waiting:
+        at.buffer += ser.read(waiting)
+    lines = []
+    while True:
+        end = at.buffer.find(b"\n")
+        if end < 0:
+            return lines
+        line = bytes(at.buffer[:end]).rstrip(b"\r")
+        del at.buffer[:end + 1]
+        if line:
+            lines.append(line)
 
-def send_command(command):
+def parse_incoming(line):
     """
-    Sends a command to the LoRa module and reads the response.
+    Splits a raw line from the LoRa module into a received packet (None for
+    other lines such as +OK) and its display text.
     """
-    ser.write((command + '\r\n').encode())
-    time.sleep(0.2)
-    return ser.readline().decode(errors='ignore').strip()
+    try:
+        packet = lora_rcv.parse_rcv(line)
+    except ValueError:
+        packet = None
+    if packet is None:
+        return None, line.decode(errors='ignore')
+    return packet, f"[{packet.sender}] {packet.text} (RSSI {packet.rssi} dBm, SNR {packet.snr})"
 
-def configure_lora():
+class BoatState:
     """
-    Configures the LoRa module with the controller's address and network ID.
+    Latest known state of one boat, keyed by its LoRa address.
     """
-    send_command(f"AT+ADDRESS={MY_ADDRESS}")
-    send_command(f"AT+NETWORKID={NETWORK_ID}")
-    send_command("AT+RESET")
-    time.sleep(1)
+    def __init__(self, address):
+        self.address = address
+        self.last_seen = None
+        self.state = "SEEN"
+        self.heading = None
+        self.rssi = None
+        self.snr = None
+        self.lat = None
+        self.lon = None
+        # Mission progress reported by the leader: waypoint index and percent done
+        self.waypoint = None
+        self.progress = None
+        # Formation slot a follower reports holding (see formation_planner.py)
+        self.slot = None
+        self.frames = 0
 
-def send_lora_message(dest_addr, message):
+class SwarmState:
     """
-    Sends a message to a specific destination address via LoRa.
+    Per-boat state model built from received packets.
     """
-    command = f"AT+SEND={dest_addr},{len(message)},{message}\r\n"
-    ser.write(command.encode())
+    def __init__(self):
+        self.boats = {}
+
+    def update(self, packet, now):
+        """
+        Applies one received packet and returns the BoatState it changed.
+        """
+        boat = self.boats.get(packet.sender)
+        if boat is None:
+            boat = self.boats[packet.sender] = BoatState(packet.sender)
+        boat.last_seen = now
+        boat.rssi = packet.rssi
+        boat.snr = packet.snr
+        boat.frames += 1
+        payload = packet.text
+        if telemetry.is_binary_frame(payload):
+            try:
+                frame = telemetry.decode_frame(payload)
+            except ValueError:
+                return boat
+            if isinstance(frame, telemetry.SlotAssignment):
+                # The followers report the slot they took in their status frames
+                return boat
+            if isinstance(frame, telemetry.LeaderTelemetry):
+                # The leader only broadcasts telemetry while its route is running
+                boat.state = "ACTIVE"
+                boat.waypoint, boat.progress = frame.waypoint, frame.progress
+            else:
+                # Follower status frames are sent in every state
+                boat.slot = frame.slot
+            boat.heading = frame.heading
+            # 0, 0 means the sender has no GPS fix
+            if frame.lat or frame.lon:
+                boat.lat, boat.lon = frame.lat, frame.lon
+        elif payload.startswith("LEADER,"):
+            fields = payload.split(",")
+            try:
+                boat.heading = float(fields[3])
+            except (IndexError, ValueError):
+                return boat
+            boat.state = "ACTIVE"
+        else:
+            try:
+                ack = command_link.parse_ack(payload)
+            except ValueError:
+                return boat
+            if ack is not None:
+                boat.state = {"START": "ACTIVE", "STOP": "IDLE"}.get(ack[0], boat.state)
+        return boat
 
-def receive_lora_data():
+class TrackPlot:
     """
-    Checks for incoming data from the LoRa module.
+    Canvas plot of the boat tracks in metres around the first position seen.
+    Each boat has one track line, one marker and one label that are moved
+    with coords() on every update; the canvas is never cleared. Tracks are
+    thinned out (every other old point dropped) once they exceed
+    MAX_TRACK_POINTS, so drawing cost stays bounded over long sessions.
     """
-    if ser.in_waiting:
-        return ser.readline().decode(errors='ignore').strip()
-    return None
+    COLORS = ["#d62728", "#1f77b4", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf"]
+
+    def __init__(self, canvas, size=PLOT_SIZE):
+        self.canvas = canvas
+        self.size = size
+        self.origin = None
+        # Metres from the centre to the edge of the plot; doubled when a boat leaves the view
+        self.half_span = 50.0
+        # address -> list of (x, y) track points in metres, the same points as flat
+        # canvas coordinates (extended point by point, rebuilt only on zoom or thinning),
+        # and the canvas item ids
+        self.tracks = {}
+        self.track_coords = {}
+        self.items = {}
+
+    def to_metres(self, lat, lon):
+        lat0, lon0 = self.origin
+        return ((lon - lon0) * METRES_PER_DEG_LAT * math.cos(math.radians(lat0)),
+                (lat - lat0) * METRES_PER_DEG_LAT)
+
+    def to_canvas(self, x, y):
+        scale = self.size / (2 * self.half_span)
+        return self.size / 2 + x * scale, self.size / 2 - y * scale
+
+    def _rebuild_coords(self, address):
+        coords = self.track_coords[address] = []
+        for x, y in self.tracks[address]:
+            coords.extend(self.to_canvas(x, y))
+
+    def update(self, boat):
+        """
+        Adds the boat's latest position to its track and moves its items.
+        """
+        if boat.lat is None:
+            return
+        if self.origin is None:
+            self.origin = (boat.lat, boat.lon)
+        x, y = self.to_metres(boat.lat, boat.lon)
+        track = self.tracks.setdefault(boat.address, [])
+        coords = self.track_coords.setdefault(boat.address, [])
+        # Zoom out (redrawing every item once) when the boat leaves the view
+        rescale = False
+        while max(abs(x), abs(y)) > self.half_span * 0.95:
+            self.half_span *= 2
+            rescale = True
+        if rescale:
+            for address in self.items:
+                self._rebuild_coords(address)
+                self._draw(address)
+            coords = self.track_coords[boat.address]
+
+        if track and math.hypot(x - track[-1][0], y - track[-1][1]) < TRACK_MIN_STEP:
+            track[-1] = (x, y)
+            coords[-2:] = self.to_canvas(x, y)
+        else:
+            track.append((x, y))
+            coords.extend(self.to_canvas(x, y))
+        if len(track) > MAX_TRACK_POINTS:
+            # Keep the newest half at full resolution and every other point of the older half
+            half = len(track) // 2
+            track[:half] = track[:half:2]
+            self._rebuild_coords(boat.address)
+        if boat.address not in self.items:
+            color = self.COLORS[len(self.items) % len(self.COLORS)]
+            self.items[boat.address] = (
+                self.canvas.create_line(0, 0, 0, 0, fill=color),
+                self.canvas.create_oval(0, 0, 0, 0, fill=color, outline=""),
+                self.canvas.create_text(0, 0, text=str(boat.address), anchor=tk.SW, fill=color),
+            )
+        self._draw(boat.address)
+
+    def _draw(self, address):
+        line, marker, label = self.items[address]
+        coords = self.track_coords[address]
+        # A Tk line needs at least two points
+        self.canvas.coords(line, coords if len(coords) > 2 else coords * 2)
+        cx, cy = coords[-2], coords[-1]
+        self.canvas.coords(marker, cx - 4, cy - 4, cx + 4, cy + 4)
+        self.canvas.coords(label, cx + 5, cy - 5)
 
 class BoatControllerGUI:
-    def __init__(self, master):
+    def __init__(self, master, ser, at):
         self.master = master
+        # Serial port of the LoRa module and the AT engine that configured it
+        self.ser = ser
+        self.at = at
         self.master.title("Boat Controller")
         self.create_widgets()
+        # Per-boat state shown in the table and the track plot (only used by the Tk thread)
+        self.swarm = SwarmState()
+        self.track_plot = TrackPlot(self.track_canvas)
+        # Delivery of START/STOP with retransmissions until every boat acknowledges (Tk thread only)
+        self.commands = command_link.CommandSender(LORA_SF)
+        # Mission upload in progress or finished (mission.MissionUpload), None before the first
+        self.upload = None
+        # The module sends one packet at a time: commands and upload chunks wait for the previous one
+        self.radio_busy_until = 0.0
+        # (display text, packet or None, receive time) from the reader thread waiting to be
+        # shown, and how many were dropped (only the reader thread increments `dropped`; the
+        # Tk thread keeps its own count of the drops it has reported)
+        self.pending = queue.Queue(maxsize=MAX_QUEUED)
+        self.dropped = 0
+        self.reported_dropped = 0
         self.running = True
         self.update_thread = threading.Thread(target=self.update_status)
         self.update_thread.start()
+        self.drain_job = self.master.after(UI_REFRESH_MS, self.drain_pending)
+        self.table_job = self.master.after(TABLE_REFRESH_MS, self.refresh_table)
+        self.command_job = self.master.after(COMMAND_TICK_MS, self.send_commands)
 
     def create_widgets(self):
         """
@@ -70,46 +288,216 @@ class BoatControllerGUI:
         self.status_text = tk.Text(self.master, height=15, width=50)
         self.status_text.grid(row=1, column=0, columnspan=2, padx=10, pady=10)
 
+        # Swarm Status Table (one row per LoRa address)
+        columns = ("state", "age", "heading", "rssi", "position", "mission", "slot", "frames")
+        self.boat_table = ttk.Treeview(self.master, columns=columns, height=8)
+        self.boat_table.heading("#0", text="Address")
+        self.boat_table.column("#0", width=70)
+        for column, title, width in zip(columns, ("State", "Last seen", "Heading", "RSSI", "Position", "Mission",
+                                                  "Slot", "Frames"),
+                                        (70, 70, 70, 70, 170, 90, 50, 60)):
+            self.boat_table.heading(column, text=title)
+            self.boat_table.column(column, width=width, anchor=tk.E)
+        self.boat_table.grid(row=2, column=0, columnspan=2, padx=10, pady=10)
+
+        # Track Plot
+        self.track_canvas = tk.Canvas(self.master, width=PLOT_SIZE, height=PLOT_SIZE, background="white")
+        self.track_canvas.grid(row=0, column=2, rowspan=3, padx=10, pady=10)
+
+        # Command Delivery Status (time until all boats confirmed the last START/STOP)
+        self.command_label = ttk.Label(self.master, text="No command sent")
+        self.command_label.grid(row=3, column=0, columnspan=3, padx=10, pady=(0, 10), sticky=tk.W)
+
+        # Mission Upload (CSV or GeoJSON waypoints, sent to the leader in chunks) and its status
+        self.upload_button = ttk.Button(self.master, text="Upload Mission", command=self.upload_mission)
+        self.upload_button.grid(row=4, column=0, padx=10, pady=(0, 10))
+        self.mission_label = ttk.Label(self.master, text="No mission uploaded")
+        self.mission_label.grid(row=4, column=1, columnspan=2, padx=10, pady=(0, 10), sticky=tk.W)
+
     def start_boats(self):
         """
-        Sends the START command to both leader and follower boats.
+        Starts delivering the START command to all boats.
         """
-        send_lora_message(100, "CMD,START")  # Leader address
-        send_lora_message(101, "CMD,START")  # Follower address
-        self.status_text.insert(tk.END, "Sent START command to boats.\n")
+        self.send_to_boats("START")
 
     def stop_boats(self):
         """
-        Sends the STOP command to both leader and follower boats.
+        Starts delivering the STOP command to all boats.
+        """
+        self.send_to_boats("STOP")
+
+    def send_to_boats(self, command):
+        """
+        Replaces any command still being delivered and sends the first copy right away.
+        """
+        seq = self.commands.send(command, BOAT_ADDRESSES, time.monotonic())
+        self.append_lines([f"Sending {command} #{seq} to boats {', '.join(map(str, BOAT_ADDRESSES))}."])
+        self.master.after_cancel(self.command_job)
+        self.send_commands()
+
+    def upload_mission(self):
+        """
+        Asks for a mission file and starts uploading it to the leader (replacing any upload in progress).
+        """
+        path = filedialog.askopenfilename(title="Mission file",
+                                          filetypes=[("Missions", "*.csv *.geojson *.json"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            new_mission = mission.load(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.append_lines([f"Cannot load mission {path}: {e}"])
+            return
+        self.upload = mission.MissionUpload(new_mission, LEADER_ADDRESS, LORA_SF)
+        self.append_lines([f"Uploading {new_mission.summary()} to {LEADER_ADDRESS} "
+                           f"in {len(self.upload.chunks)} chunks."])
+
+    def send_commands(self):
+        """
+        Tk thread: sends the due command (re)transmission or else the due
+        mission chunk, if any, updates the delivery status and reschedules itself.
         """
-        send_lora_message(100, "CMD,STOP")  # Leader address
-        send_lora_message(101, "CMD,STOP")  # Follower address
-        self.status_text.insert(tk.END, "Sent STOP command to boats.\n")
+        now = time.monotonic()
+        if now >= self.radio_busy_until:
+            due = self.commands.due(now)
+            if due is not None:
+                address, payload = due
+                attempt = self.commands.pending[address][0]
+                if attempt > 1:
+                    self.append_lines([f"No ACK from {address} yet: resent {payload} (attempt {attempt})"])
+            elif self.upload is not None and not self.commands.pending:
+                # Mission chunks only go out while no START/STOP is being delivered
+                due = self.upload.due(now)
+            if due is not None:
+                address, payload = due
+                self.at.send(address, payload)
+                self.radio_busy_until = now + telemetry.lora_airtime(len(payload), sf=LORA_SF)
+        self.command_label.config(text=self.commands.status(now))
+        if self.upload is not None:
+            self.mission_label.config(text=self.upload.status(now))
+        if self.running:
+            self.command_job = self.master.after(COMMAND_TICK_MS, self.send_commands)
 
     def update_status(self):
         """
-        Continuously checks for incoming messages and updates the status display.
+        Reader thread: reads every waiting message and queues it for display.
+        Runs without touching any Tk widget (Tk is not thread-safe).
         """
+        # Packets that arrived while the module was being configured come first
+        lines = self.at.take_received()
         while self.running:
-            incoming = receive_lora_data()
-            if incoming:
-                self.status_text.insert(tk.END, f"Received: {incoming}\n")
-                self.status_text.see(tk.END)
-            time.sleep(0.1)
+            if not lines:
+                time.sleep(READ_IDLE_SLEEP)
+            for incoming in lines:
+                packet, text = parse_incoming(incoming)
+                try:
+                    self.pending.put_nowait((f"Received: {text}", packet, time.monotonic()))
+                except queue.Full:
+                    # The display cannot keep up: drop rather than grow without bound
+                    self.dropped += 1
+            lines = read_lines(self.ser, self.at)
+
+    def drain_pending(self):
+        """
+        Tk thread: applies the queued lines in one batch and reschedules itself.
+        Table rows and plot items are updated once per batch for each boat heard.
+        """
+        lines = []
+        changed = {}
+        try:
+            while len(lines) < MAX_BATCH:
+                text, packet, received = self.pending.get_nowait()
+                lines.append(text)
+                if packet is not None:
+                    boat = self.swarm.update(packet, received)
+                    changed[boat.address] = boat
+                    if self.commands.ack(packet.sender, packet.text, received):
+                        lines.append(f"{packet.sender} confirmed {self.commands.command} "
+                                     f"after {self.commands.confirmed[packet.sender]:.1f} s")
+                    if self.upload is not None and self.upload.ack(packet.sender, packet.text, received):
+                        if self.upload.result is not None:
+                            lines.append(self.upload.status(received))
+        except queue.Empty:
+            pass
+        for boat in changed.values():
+            self.show_boat(boat, time.monotonic())
+            self.track_plot.update(boat)
+        total_dropped = self.dropped
+        if total_dropped != self.reported_dropped:
+            lines.append(f"({total_dropped - self.reported_dropped} messages dropped: display could not keep up)")
+            self.reported_dropped = total_dropped
+        if lines:
+            self.append_lines(lines)
+        if self.running:
+            self.drain_job = self.master.after(UI_REFRESH_MS, self.drain_pending)
+
+    def show_boat(self, boat, now):
+        """
+        Inserts or updates the table row of one boat.
+        """
+        age = now - boat.last_seen
+        state = "LOST" if age > BOAT_LOST_TIME else boat.state
+        values = (
+            state,
+            f"{age:.0f} s",
+            f"{boat.heading:.1f}°" if boat.heading is not None else "-",
+            f"{boat.rssi} dBm",
+            f"{boat.lat:.6f}, {boat.lon:.6f}" if boat.lat is not None else "-",
+            f"WP {boat.waypoint + 1}, {boat.progress}%" if boat.waypoint is not None else "-",
+            boat.slot if boat.slot is not None else "-",
+            boat.frames,
+        )
+        iid = str(boat.address)
+        if self.boat_table.exists(iid):
+            self.boat_table.item(iid, values=values)
+        else:
+            self.boat_table.insert("", tk.END, iid=iid, text=iid, values=values)
+
+    def refresh_table(self):
+        """
+        Tk thread: refreshes the last-seen ages (and LOST states) of all rows.
+        """
+        now = time.monotonic()
+        for boat in self.swarm.boats.values():
+            self.show_boat(boat, now)
+        if self.running:
+            self.table_job = self.master.after(TABLE_REFRESH_MS, self.refresh_table)
+
+    def append_lines(self, lines):
+        """
+        Appends lines to the status display with a single insert, trims the
+        scrollback to MAX_SCROLLBACK lines, and follows the end only if the
+        user has not scrolled up.
+        """
+        at_end = self.status_text.yview()[1] >= 1.0
+        self.status_text.insert(tk.END, "\n".join(lines) + "\n")
+        # The Text widget always ends with an empty line after the last newline
+        line_count = int(self.status_text.index("end-1c").split(".")[0]) - 1
+        if line_count > MAX_SCROLLBACK:
+            self.status_text.delete("1.0", f"{line_count - MAX_SCROLLBACK + 1}.0")
+        if at_end:
+            self.status_text.see(tk.END)
 
     def on_close(self):
         """
         Handles GUI closure.
         """
         self.running = False
+        self.master.after_cancel(self.drain_job)
+        self.master.after_cancel(self.table_job)
+        self.master.after_cancel(self.command_job)
         self.update_thread.join()
-        ser.close()
+        self.ser.close()
         self.master.destroy()
 
 def main():
-    configure_lora()
+    # Initialize serial connection to LoRa module
+    ser = serial.Serial(LORA_PORT, BAUDRATE, timeout=2)
+    # Sends AT commands and waits for the module's answers (see lora_at.py)
+    at = lora_at.ATEngine(ser)
+    configure_lora(at)
     root = tk.Tk()
-    app = BoatControllerGUI(root)
+    app = BoatControllerGUI(root, ser, at)
     root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
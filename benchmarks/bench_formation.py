@@ -0,0 +1,80 @@
+import math
+import os
+import random
+import sys
+import timeit
+
+# Allow running from the repository root or from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import formation
+
+# Cost of one leader-relative range/bearing update: the cached local ENU plane
+# (formation.LocalFrame) versus haversine on the raw latitudes/longitudes, and
+# how far apart their results are. On the boat an update converts one new
+# position (a leader frame or an own fix; the other boat's position is kept in
+# the plane), so that is the main comparison.
+
+ORIGIN = (43.138460, -75.232241)
+
+
+# Positions of a leader and a follower `spread` metres apart, near ORIGIN
+def pairs(count, spread, seed=1):
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        lat = ORIGIN[0] + rng.uniform(-0.01, 0.01)
+        lon = ORIGIN[1] + rng.uniform(-0.01, 0.01)
+        distance = rng.uniform(0.5, 1) * spread
+        bearing = math.radians(rng.uniform(0, 360))
+        follower_lat = lat + distance * math.cos(bearing) / 111_132.0
+        follower_lon = lon + distance * math.sin(bearing) / (111_320.0 * math.cos(math.radians(lat)))
+        result.append((lat, lon, follower_lat, follower_lon))
+    return result
+
+
+def enu_update(plane, lat, lon, follower_lat, follower_lon):
+    leader_e, leader_n = plane.to_enu(lat, lon)
+    follower_e, follower_n = plane.to_enu(follower_lat, follower_lon)
+    return formation.range_bearing(leader_e - follower_e, leader_n - follower_n)
+
+
+# A new leader position with the follower's position already in the plane
+def enu_new_leader(plane, follower, lat, lon):
+    leader_e, leader_n = plane.to_enu(lat, lon)
+    return formation.range_bearing(leader_e - follower[0], leader_n - follower[1])
+
+
+def haversine_update(lat, lon, follower_lat, follower_lon):
+    return formation.haversine(follower_lat, follower_lon, lat, lon)
+
+
+def main():
+    plane = formation.LocalFrame(*ORIGIN)
+    samples = pairs(1000, 50)
+    n = 200
+    cached = [(lat, lon, plane.to_enu(follower_lat, follower_lon)) for lat, lon, follower_lat, follower_lon in samples]
+    hav_s = min(timeit.repeat(lambda: [haversine_update(*p) for p in samples], number=n, repeat=3))
+    one_s = min(timeit.repeat(lambda: [enu_new_leader(plane, f, lat, lon) for lat, lon, f in cached],
+                              number=n, repeat=3))
+    both_s = min(timeit.repeat(lambda: [enu_update(plane, *p) for p in samples], number=n, repeat=3))
+    updates = n * len(samples)
+    print(f"{'method':<28} {'updates/s':>12} {'us/update':>10} {'speedup':>8}")
+    for name, seconds in (("haversine", hav_s), ("local ENU, 1 new position", one_s),
+                          ("local ENU, 2 new positions", both_s)):
+        print(f"{name:<28} {updates / seconds:>12,.0f} {seconds / updates * 1e6:>10.2f} {hav_s / seconds:>7.2f}x")
+
+    # ENU (WGS-84 radii) vs haversine (sphere): the differences are the sphere's error, not the plane's
+    print(f"\n{'spread':>8} {'max range diff':>15} {'max bearing diff':>17}")
+    for spread in (20, 100, 1000, 5000):
+        range_diff = bearing_diff = 0.0
+        for p in pairs(1000, spread, seed=2):
+            enu_range, enu_bearing = enu_update(plane, *p)
+            hav_range, hav_bearing = haversine_update(*p)
+            range_diff = max(range_diff, abs(enu_range - hav_range))
+            bearing_diff = max(bearing_diff, abs((enu_bearing - hav_bearing + 180) % 360 - 180))
+        print(f"{spread:>6} m {range_diff:>13.3f} m {bearing_diff:>15.3f}°")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import math
+import os
+import random
+import sys
+import timeit
+
+# Allow running from the repository root or from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import follower_control
+import follower_logic
+import follower_replay
+import range_estimator
+import tdma
+import telemetry
+
+# Compares the follower's speed control driven by each raw RSSI reading (the old
+# follower_control.rssi_to_pwm) with the range estimator + distance control now
+# in follower_logic.py, on follower input recordings (BOAT_INPUT_RECORDING, see
+# follower_replay.py). Without recordings a synthetic session is generated: the
+# follower drifts between 8 and 32 m behind the leader while the RSSI has the
+# default model's shadowing plus occasional deep multipath fades.
+#
+#   python3 benchmarks/bench_range_estimator.py inputs_101.bin --range-calibration range_calibration_101.json
+
+LEADER_ADDRESS = 100
+# Synthetic session: length, fraction of readings hit by a fade and its depth in dB
+SYNTHETIC_MINUTES = 30
+FADE_PROBABILITY = 0.05
+FADE_DB = 15
+
+
+def synthetic_events(seed=1):
+    """
+    Returns (events, true distances) of a synthetic session: START, then one
+    leader telemetry frame per TDMA frame with a simulated RSSI.
+    """
+    rng = random.Random(seed)
+    model = range_estimator.PathLossModel()
+    period = tdma.frame_period(2)
+    events = [(0.0, follower_replay.KIND_RCV, b"+RCV=99,11,CMD,START,1,-40,10")]
+    distances = []
+    wander = 0.0
+    for i in range(int(SYNTHETIC_MINUTES * 60 / period)):
+        t = (i + 1) * period
+        wander = min(max(wander + rng.gauss(0, 0.5), -4), 4)
+        distance = 20 + 8 * math.sin(2 * math.pi * t / 300) + wander
+        rssi = model.rssi(distance) + rng.gauss(0, model.shadowing_db)
+        if rng.random() < FADE_PROBABILITY:
+            rssi -= FADE_DB
+        payload = telemetry.encode_leader(i % telemetry.SEQ_MODULO, 43.1, -75.2, 90.0)
+        line = f"+RCV={LEADER_ADDRESS},{len(payload)},{payload},{round(rssi)},9".encode()
+        events.append((t, follower_replay.KIND_RCV, line))
+        distances.append(distance)
+    return events, distances
+
+
+def run(events, range_model=None):
+    """
+    Feeds the events to FollowerLogic. Returns (timestamp, rssi, raw PWM,
+    estimator PWM, estimated distance) for every applied leader frame.
+    """
+    follower = follower_logic.FollowerLogic(LEADER_ADDRESS, range_model=range_model)
+    samples = []
+    for timestamp, kind, data in events:
+        if kind != follower_replay.KIND_RCV:
+            continue
+        try:
+            result = follower.handle_rcv(data, timestamp)
+        except (ValueError, IndexError):
+            continue
+        if result == follower_logic.LEADER:
+            samples.append((timestamp, follower.rssi, follower_control.rssi_to_pwm(follower.rssi),
+                            follower.pwm, follower.distance))
+    return samples
+
+
+def changes_per_minute(times, pwms):
+    changes = sum(a != b for a, b in zip(pwms, pwms[1:]))
+    minutes = (times[-1] - times[0]) / 60 if len(times) > 1 else 0
+    return changes / minutes if minutes else 0.0, changes
+
+
+def rms(values):
+    return math.sqrt(sum(v * v for v in values) / len(values))
+
+
+def report(name, samples, distances=None, range_model=None):
+    if len(samples) < 2:
+        print(f"{name}: fewer than 2 leader frames, nothing to compare")
+        return
+    times = [s[0] for s in samples]
+    print(f"{name}: {len(samples)} leader frames over {(times[-1] - times[0]) / 60:.1f} min")
+    print(f"  {'control':<22} {'PWM changes/min':>16} {'changes':>8} {'mean |step|':>12}")
+    for label, index in (("raw RSSI -> PWM", 2), ("range estimator", 3)):
+        pwms = [s[index] for s in samples]
+        per_minute, changes = changes_per_minute(times, pwms)
+        steps = [abs(a - b) for a, b in zip(pwms, pwms[1:]) if a != b]
+        mean_step = sum(steps) / len(steps) if steps else 0.0
+        print(f"  {label:<22} {per_minute:>16.1f} {changes:>8} {mean_step:>12.1f}")
+    if distances is not None:
+        # Ground truth is known: compare the distance estimates and the PWM the true distance calls for
+        model = range_model or range_estimator.PathLossModel()
+        raw_error = [model.distance(s[1]) - d for s, d in zip(samples, distances)]
+        estimator_error = [s[4] - d for s, d in zip(samples, distances)]
+        print(f"  distance RMS error    : raw RSSI inversion {rms(raw_error):.1f} m, "
+              f"range estimator {rms(estimator_error):.1f} m")
+        ideal = [follower_control.distance_to_pwm(d) for d in distances]
+        print(f"  PWM RMS error vs truth: raw {rms([s[2] - p for s, p in zip(samples, ideal)]):.1f}, "
+              f"range estimator {rms([s[3] - p for s, p in zip(samples, ideal)]):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PWM changes per minute: raw RSSI vs range estimator")
+    parser.add_argument("recordings", nargs="*", help="follower input recordings (BOAT_INPUT_RECORDING)")
+    parser.add_argument("--range-calibration", help="path-loss calibration of the boat (range_estimator.py)")
+    args = parser.parse_args()
+
+    range_model = range_estimator.PathLossModel.load(args.range_calibration) if args.range_calibration else None
+    if args.recordings:
+        for path in args.recordings:
+            report(path, run(follower_replay.load(path), range_model), range_model=range_model)
+    else:
+        events, distances = synthetic_events()
+        report(f"synthetic session ({FADE_PROBABILITY:.0%} fades of {FADE_DB} dB)", run(events), distances)
+
+    # Cost of one estimator update (Hampel window + Kalman step)
+    estimator = range_estimator.RangeEstimator(range_model)
+    readings = [-60 + (i * 7) % 13 for i in range(1000)]
+    n = 100
+    seconds = min(timeit.repeat(lambda: [estimator.update(r, i) for i, r in enumerate(readings)], number=n, repeat=3))
+    print(f"Estimator update: {seconds / (n * len(readings)) * 1e6:.2f} us per reading")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import timeit
+
+# Allow running from the repository root or from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import lora_rcv
+
+# Raw lines from the RYLR896 serial port, as the reader threads pass them on (without the line ending)
+LINES = {
+    "command": b"+RCV=99,9,CMD,START,-42,11",
+    "telemetry": b"+RCV=100,29,#MdIEGGi2GZZ4KNM5MJWfi0v/AP8A,-67,9",
+    "ascii leader": b"+RCV=100,34,LEADER,43.138460,-75.232241,123.45,-67,9",
+}
+
+
+# The parsing done by the boat scripts before the shared parser
+def parse_split(raw):
+    incoming = raw.decode(errors='ignore').strip()
+    parts = incoming.replace("+RCV=", "").split(",")
+    return int(parts[0]), parts[2:-2], int(parts[-2]), int(parts[-1])
+
+
+def main():
+    n = 20_000
+    print(f"{'frame':<14} {'split frames/s':>15} {'lora_rcv frames/s':>18} {'speedup':>8}")
+    for name, line in LINES.items():
+        # Both parsers are called directly (the RcvFrame is what the callers use), alternating
+        # short runs so a slow spell of the machine does not only hit one of them
+        split_s = shared_s = float("inf")
+        for _ in range(20):
+            split_s = min(split_s, timeit.timeit(lambda: parse_split(line), number=n))
+            shared_s = min(shared_s, timeit.timeit(lambda: lora_rcv.parse_rcv(line), number=n))
+        print(f"{name:<14} {n / split_s:>15,.0f} {n / shared_s:>18,.0f} {split_s / shared_s:>7.2f}x")
+
+    # The old code reads RSSI from a fixed field index, so any extra comma in the payload
+    # shifts it; the length field always finds the real RSSI/SNR
+    line = b"+RCV=100,37,LEADER,43.138460,-75.232241,123.45,OK,-67,9\r\n"
+    parts = line.decode().strip().replace("+RCV=", "").split(",")
+    print(f"\nsplit-based RSSI field (parts[6]): {parts[6]!r}")
+    print(f"lora_rcv RSSI                   : {lora_rcv.parse_rcv(line).rssi}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import argparse
+import gc
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+# Allow running from the repository root or from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import compass_calibration
+import compass_sampler
+import follower_control
+import follower_logic
+import gps_reader
+import hardware
+import lora_rcv
+import telemetry
+
+# Regression suite for the hot paths of the boat code. Every operation runs
+# on recorded/generated inputs with the hardware replaced by fakes, so it runs
+# the same on a laptop as on a Pi:
+#   rcv_parse        lora_rcv.parse_rcv on a leader telemetry +RCV= line
+#   compass_heading  CompassSampler.poll: raw HMC5883L bytes -> calibrated heading -> circular mean
+#   rssi_pwm         the RSSI step: range filter update, distance -> PWM, deadband
+#   heading_step     heading difference and motor directions, and the PID control step
+#   leader_frame     FollowerLogic.handle_rcv of a leader frame (parse, decode, RSSI step, target)
+#   telemetry_encode telemetry.encode_leader with mission progress
+#   nmea_rmc         one $GPRMC sentence through NmeaFramer.feed and parse_rmc
+#
+# Each sample times a batch of calls (a single call is too short for the
+# clock), so p50/p99 are per-call latencies of batch means; the garbage
+# collector stays enabled, as on the boat. ops/s is calls over total time.
+# The operations are measured in several interleaved rounds and the best
+# round of each is kept, like the min of timeit.repeat in the other benchmarks.
+#
+#   python3 benchmarks/bench_suite.py --save baseline.json
+#   ... change the code ...
+#   python3 benchmarks/bench_suite.py --compare baseline.json --threshold 0.1
+#
+# --compare exits with status 1 if the p50 latency of any operation grew by
+# more than the threshold (a fraction); ops/s and p99 changes are only reported.
+
+# Target duration of one timed batch in seconds
+BATCH_TIME = 200e-6
+LEADER_ADDRESS = 100
+LAT, LON, HEADING = 43.138460, -75.232241, 123.45
+
+
+class RecordedBus:
+    """
+    I2C bus returning prerecorded HMC5883L data blocks in turn.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = itertools.cycle(blocks)
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        return next(self.blocks)
+
+
+def compass_blocks():
+    """
+    Raw data register blocks of the fake compass (hardware.FakeSMBus) for one full turn.
+    """
+    boat = hardware.FakeBoat(hardware.VirtualClock(1))
+    bus = hardware.FakeSMBus(boat)
+    blocks = []
+    for heading in range(0, 360, 3):
+        boat.heading = float(heading)
+        blocks.append(bus.read_i2c_block_data(hardware.HMC5883L_ADDR, hardware.HMC5883L_DATA_REG, 6))
+    return blocks
+
+
+def rssi_samples(count=500, seed=1):
+    """
+    Leader RSSI readings drifting between -50 and -80 dBm with noise and occasional outliers.
+    """
+    rng = random.Random(seed)
+    samples = []
+    for i in range(count):
+        rssi = -65 + 15 * math.sin(i / 40) + rng.gauss(0, 3)
+        if rng.random() < 0.05:
+            rssi -= 20
+        samples.append(round(rssi))
+    return samples
+
+
+def leader_lines(rssis):
+    """
+    +RCV= lines of leader frames whose sequence numbers keep increasing when cycled.
+    """
+    # 256 frames 256 apart wrap exactly at SEQ_MODULO, so every frame is new to the sequence filter
+    step = telemetry.SEQ_MODULO // 256
+    lines = []
+    for i in range(256):
+        payload = telemetry.encode_leader(i * step, LAT + i * 1e-6, LON, (HEADING + i) % 360, fix_age=0.4,
+                                          mission=7, waypoint=2, progress=40)
+        lines.append(f"+RCV={LEADER_ADDRESS},{len(payload)},{payload},{rssis[i % len(rssis)]},9".encode())
+    return lines
+
+
+def active_follower():
+    """
+    A FollowerLogic that has received START and a leader frame (RSSI distance control, no GPS).
+    """
+    follower = follower_logic.FollowerLogic(LEADER_ADDRESS, address=LEADER_ADDRESS + 1)
+    follower.handle_rcv(b"+RCV=99,9,CMD,START,-42,11", 0.0)
+    follower.handle_rcv(leader_lines([-60])[0], 0.0)
+    return follower
+
+
+# --- Operations ---
+# Each setup function returns a function running one operation on the next input.
+
+def setup_rcv_parse():
+    lines = itertools.cycle(leader_lines(rssi_samples()))
+    return lambda: lora_rcv.parse_rcv(next(lines))
+
+
+def setup_compass_heading():
+    calibration = compass_calibration.CompassCalibration(12.0, -30.0, ((1.02, 0.03), (0.03, 0.97)))
+    sampler = compass_sampler.CompassSampler(RecordedBus(compass_blocks()), calibration=calibration)
+    return sampler.poll
+
+
+def setup_rssi_pwm():
+    follower = active_follower()
+    rssis = itertools.cycle(rssi_samples())
+    clock = itertools.count(0.0, 0.1)
+
+    def step():
+        distance, variance = follower.range.update(next(rssis), next(clock))
+        follower.pwm = follower_control.apply_deadband(follower.pwm,
+                                                       follower_control.distance_to_pwm(distance, variance))
+    return step
+
+
+def setup_heading_step():
+    follower = active_follower()
+    headings = itertools.cycle([(follower.target_heading + offset) % 360 for offset in range(-180, 180, 7)])
+
+    def step():
+        heading = next(headings)
+        follower_control.motor_directions(follower_control.heading_difference(follower.target_heading, heading))
+        return follower.control_step(heading)
+    return step
+
+
+def setup_leader_frame():
+    follower = active_follower()
+    lines = itertools.cycle(leader_lines(rssi_samples()))
+    clock = itertools.count(1.0, 0.1)
+    return lambda: follower.handle_rcv(next(lines), next(clock))
+
+
+def setup_telemetry_encode():
+    seqs = itertools.cycle(range(telemetry.SEQ_MODULO))
+    return lambda: telemetry.encode_leader(next(seqs), LAT, LON, HEADING, fix_age=0.4,
+                                           mission=7, waypoint=2, progress=40)
+
+
+def setup_nmea_rmc():
+    rng = random.Random(2)
+    sentences = itertools.cycle([hardware.fake_gprmc(LAT + rng.uniform(-0.01, 0.01),
+                                                     LON + rng.uniform(-0.01, 0.01), rng.uniform(0, 360))
+                                 for _ in range(100)])
+    framer = gps_reader.NmeaFramer()
+
+    def step():
+        for sentence in framer.feed(next(sentences)):
+            gps_reader.parse_rmc(sentence)
+    return step
+
+
+OPERATIONS = {
+    "rcv_parse": setup_rcv_parse,
+    "compass_heading": setup_compass_heading,
+    "rssi_pwm": setup_rssi_pwm,
+    "heading_step": setup_heading_step,
+    "leader_frame": setup_leader_frame,
+    "telemetry_encode": setup_telemetry_encode,
+    "nmea_rmc": setup_nmea_rmc,
+}
+
+
+# --- Measurement ---
+
+def batch_size(step):
+    """
+    Number of calls that take about BATCH_TIME.
+    """
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            step()
+        elapsed = time.perf_counter() - start
+        if elapsed >= BATCH_TIME or batch >= 1 << 20:
+            return max(1, int(batch * BATCH_TIME / elapsed)) if elapsed > 0 else batch
+        batch *= 2
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def measure(step, duration, warmup=0.1):
+    """
+    Runs `step` for about `duration` seconds. Returns ops/s, p50 and p99 latency in
+    microseconds and the number of samples.
+    """
+    batch = batch_size(step)
+    perf_counter = time.perf_counter
+    deadline = perf_counter() + warmup
+    while perf_counter() < deadline:
+        step()
+    samples = []
+    calls = 0
+    total = 0.0
+    end = perf_counter() + duration
+    while True:
+        start = perf_counter()
+        for _ in range(batch):
+            step()
+        stop = perf_counter()
+        samples.append((stop - start) / batch)
+        calls += batch
+        total += stop - start
+        if stop >= end:
+            break
+    samples.sort()
+    return {"ops_per_sec": calls / total, "p50_us": percentile(samples, 0.50) * 1e6,
+            "p99_us": percentile(samples, 0.99) * 1e6, "samples": len(samples), "batch": batch}
+
+
+def environment():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "platform": platform.platform()}
+
+
+def run(names, duration, rounds):
+    """
+    Measures every operation `rounds` times, round-robin (a slow spell of the
+    machine then hits one round of each operation rather than every round of
+    one), and keeps the round with the lowest p50 of each.
+    """
+    steps = {name: OPERATIONS[name]() for name in names}
+    results = {}
+    for _ in range(rounds):
+        for name, step in steps.items():
+            gc.collect()
+            result = measure(step, duration / rounds)
+            if name not in results or result["p50_us"] < results[name]["p50_us"]:
+                results[name] = result
+    print(f"{'operation':<17} {'ops/s':>12} {'p50 us':>9} {'p99 us':>9} {'samples':>8}")
+    for name, result in results.items():
+        print(f"{name:<17} {result['ops_per_sec']:>12,.0f} {result['p50_us']:>9.2f} {result['p99_us']:>9.2f} "
+              f"{result['samples']:>8}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every operation against the baseline and returns the
+    names of the operations whose p50 latency grew by more than `threshold`.
+    """
+    if baseline["environment"] != environment():
+        print(f"\nWarning: baseline recorded on {baseline['environment']['platform']} "
+              f"(Python {baseline['environment']['python']}); the comparison may not be meaningful")
+    print(f"\n{'operation':<17} {'ops/s':>8} {'p50':>8} {'p99':>8}  (change vs baseline, regression: p50 > "
+          f"+{threshold:.0%})")
+    regressions = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<17} {'(not in baseline)':>26}")
+            continue
+        ops = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        p50 = result["p50_us"] / base["p50_us"] - 1
+        p99 = result["p99_us"] / base["p99_us"] - 1
+        regressed = p50 > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<17} {ops:>+8.1%} {p50:>+8.1%} {p99:>+8.1%}  {'REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the boat code's hot paths and compare with a baseline")
+    parser.add_argument("operations", nargs="*", metavar="operation",
+                        help=f"operations to run (default: all of {', '.join(OPERATIONS)})")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds to time each operation")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds the duration is split into (best is kept)")
+    parser.add_argument("--save", metavar="FILE", help="write the results to a baseline JSON file")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="p50 latency increase counted as a regression, as a fraction (default 0.10)")
+    args = parser.parse_args()
+    unknown = [name for name in args.operations if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operation {unknown[0]!r} (choose from {', '.join(OPERATIONS)})")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    results = run(args.operations or list(OPERATIONS), args.duration, args.rounds)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(),
+                       "duration": args.duration, "rounds": args.rounds, "results": results}, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
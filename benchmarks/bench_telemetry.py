@@ -0,0 +1,47 @@
+import os
+import sys
+import timeit
+
+# Allow running from the repository root or from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import telemetry
+
+# Sample leader state used for both formats
+LAT, LON, HEADING = 43.138460, -75.232241, 123.45
+
+
+# Current ASCII format sent by leaderboat.py
+def encode_ascii():
+    return f"LEADER,{LAT:.6f},{LON:.6f},{HEADING:.2f}"
+
+
+# Current ASCII parsing done by followerboat.py on the payload part of a +RCV= line
+def decode_ascii(payload):
+    parts = payload.split(",")
+    return float(parts[1]), float(parts[2]), float(parts[3])
+
+
+def main():
+    ascii_frame = encode_ascii()
+    binary_frame = telemetry.encode_leader(1234, LAT, LON, HEADING)
+
+    print("Leader telemetry frame comparison (RYLR896 default SF12/125 kHz/CR4-5)")
+    print(f"{'format':<8} {'bytes':>5} {'airtime ms':>11} {'encode us':>10} {'decode us':>10}")
+    for name, frame, encode, decode in (
+        ("ascii", ascii_frame, encode_ascii, lambda: decode_ascii(ascii_frame)),
+        ("binary", binary_frame, lambda: telemetry.encode_leader(1234, LAT, LON, HEADING),
+         lambda: telemetry.decode_frame(binary_frame)),
+    ):
+        n = 100_000
+        encode_us = min(timeit.repeat(encode, number=n, repeat=3)) / n * 1e6
+        decode_us = min(timeit.repeat(decode, number=n, repeat=3)) / n * 1e6
+        airtime_ms = telemetry.lora_airtime(len(frame)) * 1000
+        print(f"{name:<8} {len(frame):>5} {airtime_ms:>11.1f} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+    print(f"ascii  : {ascii_frame}")
+    print(f"binary : {binary_frame}  (also carries seq and timestamp)")
+
+
+if __name__ == "__main__":
+    main()
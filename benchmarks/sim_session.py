@@ -0,0 +1,153 @@
+import argparse
+import math
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Run a full leader + follower session against the fake hardware backend
+# (see hardware.py) faster than real time, acting as the controller node that
+# sends START and STOP (retransmitted until acknowledged, see command_link.py),
+# and report what happened (from the boats' flight recordings).
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+# LoRa settings of the controller node played by this script
+CONTROLLER_ADDRESS = 99
+NETWORK_ID = 5
+BOAT_ADDRESSES = {"leaderboat.py": 100, "followerboat.py": 101}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a faster-than-real-time leader + follower session on fake hardware")
+    parser.add_argument("--speed", type=float, default=100, help="virtual clock speed-up factor")
+    parser.add_argument("--duration", type=float, default=120, help="virtual seconds between START and STOP")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability that a LoRa packet is lost")
+    args = parser.parse_args()
+
+    lora_dir = tempfile.mkdtemp(prefix="boat_fake_lora_")
+    env = dict(os.environ, BOAT_HARDWARE="fake", BOAT_CLOCK_SPEED=str(args.speed),
+               BOAT_FAKE_LORA_DIR=lora_dir, BOAT_RECORDER_DIR=lora_dir, BOAT_FAKE_LORA_LOSS=str(args.loss))
+    # The fake backend is selected when hardware.py is imported
+    os.environ.update(env)
+    import command_link
+    import flight_recorder
+    import hardware
+    import lora_rcv
+    clock = hardware.clock
+
+    # Start both boats and collect their output with virtual timestamps
+    output = {name: [] for name in BOAT_ADDRESSES}
+    procs = {}
+    for name in BOAT_ADDRESSES:
+        proc = subprocess.Popen([sys.executable, "-u", name], cwd=REPO_DIR, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        procs[name] = proc
+
+        def collect(proc=proc, lines=output[name]):
+            for line in proc.stdout:
+                lines.append((clock.monotonic(), line.rstrip("\n")))
+        threading.Thread(target=collect, daemon=True).start()
+
+    wall_start = time.monotonic()
+    virtual_start = clock.monotonic()
+
+    # Controller radio
+    radio = hardware.FakeSerial("controller", timeout=1)
+    radio.write(f"AT+ADDRESS={CONTROLLER_ADDRESS}\r\nAT+NETWORKID={NETWORK_ID}\r\n".encode())
+
+    # Received ACK payloads, as (sender, payload, virtual time)
+    acks = queue.Queue()
+
+    def receive():
+        while radio.is_open:
+            try:
+                line = radio.readline().rstrip(b"\r\n")
+                packet = lora_rcv.parse_rcv(line)
+            except (OSError, ValueError):
+                continue
+            if packet is not None:
+                acks.put((packet.sender, packet.text, clock.monotonic()))
+    threading.Thread(target=receive, daemon=True).start()
+
+    sender = command_link.CommandSender()
+
+    def deliver(command):
+        """
+        Sends a command until every boat has acknowledged it (or the attempts run out).
+        """
+        transmissions = sender.transmissions
+        sender.send(command, list(BOAT_ADDRESSES.values()), clock.monotonic())
+        while sender.pending:
+            due = sender.due(clock.monotonic())
+            if due is not None:
+                address, payload = due
+                radio.write(f"AT+SEND={address},{len(payload)},{payload}\r\n".encode())
+            while not acks.empty():
+                sender.ack(*acks.get())
+            clock.sleep(0.05)
+        return sender.status(clock.monotonic()), sender.transmissions - transmissions
+
+    # Wait until both boats have configured their radios
+    while not all(any("ready" in line for _, line in output[name]) for name in BOAT_ADDRESSES):
+        if any(proc.poll() is not None for proc in procs.values()):
+            break
+        time.sleep(0.01)
+
+    start_status = deliver("START")
+    clock.sleep(args.duration)
+    stop_time = clock.monotonic()
+    stop_status = deliver("STOP")
+    # Let the last ACK leave the air
+    clock.sleep(2)
+
+    for proc in procs.values():
+        proc.send_signal(signal.SIGINT)
+    for proc in procs.values():
+        proc.wait(timeout=10)
+    radio.close()
+    recordings = {name: flight_recorder.read_records(os.path.join(lora_dir, f"flight_{address}.bin"))
+                  for name, address in BOAT_ADDRESSES.items()}
+    shutil.rmtree(lora_dir, ignore_errors=True)
+
+    wall = time.monotonic() - wall_start
+    virtual = clock.monotonic() - virtual_start
+
+    def count(name, event, steering=False):
+        return sum(r.event == event and (not steering or (r.state == flight_recorder.STATE_ACTIVE
+                                                          and not math.isnan(r.heading)))
+                   for r in recordings[name])
+
+    def stop_latency(name):
+        times = [t for t, line in output[name] if "STOP command received" in line and t >= stop_time]
+        return f"{times[0] - stop_time:.2f} s" if times else "not received"
+
+    print(f"Session: {virtual:.1f} virtual s in {wall:.2f} wall s ({virtual / wall:.0f}x real time)")
+    print(f"Leader telemetry frames sent     : {count('leaderboat.py', flight_recorder.EVENT_BROADCAST)}")
+    print(f"Follower leader frames processed : {count('followerboat.py', flight_recorder.EVENT_LEADER_FRAME)}")
+    print(f"Follower control steps           : {count('followerboat.py', flight_recorder.EVENT_TICK, steering=True)}")
+    print(f"STOP latency (incl. airtime)     : leader {stop_latency('leaderboat.py')}, "
+          f"follower {stop_latency('followerboat.py')}")
+    for status, transmissions in (start_status, stop_status):
+        print(f"Command delivery                 : {status} ({transmissions} transmissions)")
+    for name in BOAT_ADDRESSES:
+        for _, line in output[name]:
+            if line.startswith(("LoRa module", "Control loop:", "Motor driver:", "TDMA:")):
+                # "Control loop: ..." -> "Leader control loop: ..." (words such as TDMA or LoRa keep their case)
+                if not any(c.isupper() for c in line.split()[0][1:]):
+                    line = line[0].lower() + line[1:]
+                print(f"{name[:-len('boat.py')].capitalize()} {line}")
+    for name, proc in procs.items():
+        if proc.returncode not in (0, -signal.SIGINT):
+            print(f"{name} exited with {proc.returncode}; last output:")
+            for _, line in output[name][-10:]:
+                print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
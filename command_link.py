@@ -0,0 +1,208 @@
+import random
+import time
+
+import telemetry
+
+# --- Acknowledged Commands ---
+# START/STOP are sent as CMD,<command>,<seq>. A boat answers every copy it
+# receives with ACK,<command>,<seq> to the sender (after acting on it, so an ACK
+# for STOP means the motors are stopped) and acts on each sequence number once.
+# The sender retransmits to each boat that has not answered, with exponential
+# backoff and jitter, until it is acknowledged or the attempts run out.
+# Legacy CMD,<command> payloads without a sequence number are still accepted.
+#
+# Sequence numbers are 16 bits and compared with serial number arithmetic
+# (telemetry.SequenceFilter). The sender starts from the wall clock in seconds,
+# so a restarted GUI continues ahead of the numbers it used before.
+
+# Seconds without a new command after which a boat accepts any sequence number
+# (longer than the sender can keep retrying one command)
+COMMAND_RESET_TIME = 120
+
+# Retransmission schedule: the n-th retry waits RETRY_BASE * 2**(n-1) seconds,
+# at most RETRY_MAX, +/- RETRY_JITTER of that so boats retried together drift apart.
+# RETRY_BASE covers an SF12 command and its ACK on air (about 1.2 s each) plus the
+# boat waiting up to one TDMA frame for its slot (3.2 s with two boats, see tdma.py)
+RETRY_BASE = 6.0
+RETRY_MAX = 15.0
+RETRY_JITTER = 0.25
+MAX_ATTEMPTS = 6
+# Margin added to the command + ACK airtime between two sends of the sender's module
+SEND_MARGIN = 0.1
+
+
+def encode_command(command, seq):
+    return f"CMD,{command},{seq}"
+
+
+def encode_ack(command, seq):
+    return f"ACK,{command},{seq}"
+
+
+def _parse(payload, kind):
+    fields = payload.split(",")
+    if len(fields) < 2 or fields[0] != kind:
+        return None
+    command = fields[1].strip().upper()
+    seq = int(fields[2]) % telemetry.SEQ_MODULO if len(fields) >= 3 and fields[2].strip() else None
+    return command, seq
+
+
+def parse_command(payload):
+    """
+    Parses a CMD,<command>[,<seq>] payload into (command, seq), where seq is
+    None for legacy commands. Returns None for other payloads and raises
+    ValueError for a malformed sequence number.
+    """
+    return _parse(payload, "CMD")
+
+
+def parse_ack(payload):
+    """
+    Parses an ACK,<command>,<seq> payload into (command, seq). Returns None
+    for other payloads and raises ValueError for a malformed sequence number.
+    """
+    ack = _parse(payload, "ACK")
+    return ack if ack is not None and ack[1] is not None else None
+
+
+class CommandFilter:
+    """
+    Boat side: decides which received commands to act on. Each sender has its
+    own sequence filter, so a retransmitted copy (or a late copy of an older
+    command, e.g. START arriving after STOP) is not applied again.
+    """
+
+    def __init__(self, reset_after=COMMAND_RESET_TIME):
+        self.reset_after = reset_after
+        self.filters = {}
+
+    def accept(self, sender, seq, now):
+        """
+        Returns True if the command should be acted on.
+        """
+        if seq is None:
+            return True
+        sequence = self.filters.get(sender)
+        if sequence is None:
+            sequence = self.filters[sender] = telemetry.SequenceFilter(self.reset_after)
+        return sequence.accept(seq, now)
+
+
+class CommandSender:
+    """
+    Sender side: delivers the latest command to a set of boats. A new command
+    replaces the previous one (a STOP is never queued behind retries of a
+    START). Call due() regularly and send what it returns; feed received ACKs
+    to ack(). Sends are spaced by the command + ACK airtime so the sender's
+    module is free and its own ACKs are not talked over.
+    """
+
+    def __init__(self, sf=12, base=RETRY_BASE, maximum=RETRY_MAX, jitter=RETRY_JITTER,
+                 max_attempts=MAX_ATTEMPTS, seq=None, rng=None):
+        self.sf = sf
+        self.base = base
+        self.maximum = maximum
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.rng = rng or random.Random()
+        self.seq = int(time.time()) % telemetry.SEQ_MODULO if seq is None else seq
+        self.command = None
+        self.payload = None
+        self.sent_at = None
+        # address -> [attempts so far, time of the next attempt]
+        self.pending = {}
+        # address -> seconds from send() to its ACK
+        self.confirmed = {}
+        self.failed = set()
+        self.spacing = 0.0
+        self.next_send = 0.0
+        self.transmissions = 0
+
+    def send(self, command, addresses, now):
+        """
+        Starts delivering a new command to the given addresses. Returns its sequence number.
+        """
+        self.seq = (self.seq + 1) % telemetry.SEQ_MODULO
+        self.command = command
+        self.payload = encode_command(command, self.seq)
+        ack_length = len(encode_ack(command, self.seq))
+        self.spacing = (telemetry.lora_airtime(len(self.payload), sf=self.sf)
+                        + telemetry.lora_airtime(ack_length, sf=self.sf) + SEND_MARGIN)
+        self.sent_at = now
+        self.pending = {address: [0, now] for address in addresses}
+        self.confirmed = {}
+        self.failed = set()
+        return self.seq
+
+    def backoff(self, attempts):
+        """
+        Seconds to wait for an ACK after the given number of attempts.
+        """
+        delay = min(self.base * 2 ** (attempts - 1), self.maximum)
+        return delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def due(self, now):
+        """
+        Returns the (address, payload) to transmit now, or None. Gives up on
+        addresses that have not answered MAX_ATTEMPTS transmissions.
+        """
+        if now < self.next_send:
+            return None
+        for address, (attempts, next_time) in sorted(self.pending.items(), key=lambda item: item[1][1]):
+            if next_time > now:
+                break
+            if attempts >= self.max_attempts:
+                del self.pending[address]
+                self.failed.add(address)
+                continue
+            self.pending[address] = [attempts + 1, now + self.backoff(attempts + 1)]
+            self.next_send = now + self.spacing
+            self.transmissions += 1
+            return address, self.payload
+        return None
+
+    def ack(self, sender, payload, now):
+        """
+        Applies a received payload. Returns True if it acknowledged the current command.
+        """
+        try:
+            ack = parse_ack(payload)
+        except ValueError:
+            return False
+        if ack != (self.command, self.seq):
+            # Not an ACK, or a late ACK of an earlier command
+            return False
+        if sender in self.pending or sender in self.failed:
+            self.pending.pop(sender, None)
+            self.failed.discard(sender)
+            self.confirmed[sender] = now - self.sent_at
+            return True
+        return False
+
+    def all_confirmed(self):
+        """
+        Seconds from send() until the last boat acknowledged, or None if some have not.
+        """
+        if self.command is None or self.pending or self.failed:
+            return None
+        return max(self.confirmed.values(), default=0.0)
+
+    def status(self, now):
+        """
+        One-line delivery status of the current command.
+        """
+        if self.command is None:
+            return "No command sent"
+        target = {"START": "started", "STOP": "stopped"}.get(self.command, "acknowledged")
+        total = len(self.pending) + len(self.confirmed) + len(self.failed)
+        done = self.all_confirmed()
+        if done is not None:
+            return f"{self.command} #{self.seq}: all {total} boats confirmed {target} in {done:.1f} s"
+        text = f"{self.command} #{self.seq}: {len(self.confirmed)}/{total} confirmed {target}"
+        if self.pending:
+            text += f", waiting {now - self.sent_at:.1f} s for {', '.join(map(str, sorted(self.pending)))}"
+        if self.failed:
+            text += (f", NO ACK from {', '.join(map(str, sorted(self.failed)))} "
+                     f"after {self.max_attempts} attempts")
+        return text
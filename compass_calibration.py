@@ -0,0 +1,201 @@
+import argparse
+import json
+import math
+import os
+
+import compass_sampler
+import hardware
+
+# --- Hard/Soft-Iron Compass Calibration ---
+# Rotating the boat through a full circle makes the raw X/Y readings trace an
+# ellipse instead of a circle centred on zero: the offset of the centre is the
+# hard-iron error (magnetised parts, motor magnets) and the stretch/tilt is the
+# soft-iron error. A least-squares conic fit of a rotation sweep gives both; the
+# runtime correction is then a fixed offset and 2x2 matrix:
+#   [x', y'] = M @ [x - offset_x, y - offset_y]
+#
+# Calibrate on the boat (rotate it slowly through at least one full turn):
+#   python3 compass_calibration.py --address 101 --duration 30
+
+
+class CompassCalibration:
+    """
+    Precomputed hard-iron offset and soft-iron correction matrix.
+    """
+
+    def __init__(self, offset_x=0.0, offset_y=0.0, matrix=((1.0, 0.0), (0.0, 1.0))):
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        (self.m00, self.m01), (self.m10, self.m11) = matrix
+
+    @property
+    def matrix(self):
+        return (self.m00, self.m01), (self.m10, self.m11)
+
+    def apply(self, x, y):
+        """
+        Returns the corrected (x, y) for a raw reading.
+        """
+        x -= self.offset_x
+        y -= self.offset_y
+        return self.m00 * x + self.m01 * y, self.m10 * x + self.m11 * y
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"offset": [self.offset_x, self.offset_y], "matrix": self.matrix}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a calibration file, or returns the identity calibration if it does not exist.
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["offset"][0], data["offset"][1], data["matrix"])
+
+
+def _solve(a, b):
+    """
+    Solves the linear system a @ x = b (Gaussian elimination with partial pivoting).
+    """
+    n = len(b)
+    m = [list(row) + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise ValueError("singular system: the samples do not describe an ellipse")
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            factor = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= factor * m[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def fit_ellipse(xs, ys):
+    """
+    Fits A x^2 + B xy + C y^2 + D x + E y = 1 to the samples and returns the
+    CompassCalibration that maps the ellipse onto a circle of the same area.
+    """
+    if len(xs) < 5:
+        raise ValueError("need at least 5 samples")
+    # Normalize the data so the normal equations are well conditioned
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    scale = math.sqrt(sum((x - mean_x) ** 2 + (y - mean_y) ** 2 for x, y in zip(xs, ys)) / len(xs)) or 1.0
+
+    # Normal equations of the linear least-squares problem
+    ata = [[0.0] * 5 for _ in range(5)]
+    atb = [0.0] * 5
+    for x, y in zip(xs, ys):
+        u = (x - mean_x) / scale
+        v = (y - mean_y) / scale
+        row = (u * u, u * v, v * v, u, v)
+        for i in range(5):
+            atb[i] += row[i]
+            for j in range(5):
+                ata[i][j] += row[i] * row[j]
+    a, b, c, d, e = _solve(ata, atb)
+
+    # Centre: gradient of the conic is zero -> [2A B; B 2C] @ centre = -[D; E]
+    det = 4 * a * c - b * b
+    if det <= 0:
+        raise ValueError("fitted conic is not an ellipse; rotate through a full circle")
+    cu = (-2 * c * d + b * e) / det
+    cv = (b * d - 2 * a * e) / det
+    # Shape matrix S with (p - centre)^T S (p - centre) = 1, back in raw units
+    k = 1 + a * cu * cu + b * cu * cv + c * cv * cv
+    s00, s01, s11 = a / k / scale ** 2, b / 2 / k / scale ** 2, c / k / scale ** 2
+
+    # Correction W = R * sqrt(S) maps the ellipse onto a circle of radius R,
+    # where R is the geometric mean of the semi-axes (keeps the field strength scale)
+    det_s = s00 * s11 - s01 * s01
+    root_det = math.sqrt(det_s)
+    radius = 1 / math.sqrt(root_det)
+    norm = radius / math.sqrt(s00 + s11 + 2 * root_det)
+    matrix = ((norm * (s00 + root_det), norm * s01), (norm * s01, norm * (s11 + root_det)))
+    return CompassCalibration(mean_x + scale * cu, mean_y + scale * cv, matrix)
+
+
+def sweep_coverage(xs, ys, calibration, sectors=8):
+    """
+    Fraction of the `sectors` heading sectors covered by the corrected samples.
+    """
+    seen = set()
+    for x, y in zip(xs, ys):
+        heading = compass_sampler.heading_from_xy(*calibration.apply(x, y))
+        seen.add(int(heading / (360 / sectors)) % sectors)
+    return len(seen) / sectors
+
+
+def radius_spread(xs, ys, calibration):
+    """
+    Relative standard deviation of the corrected field magnitude (0 = perfect circle).
+    """
+    radii = [math.hypot(*calibration.apply(x, y)) for x, y in zip(xs, ys)]
+    mean = sum(radii) / len(radii)
+    return math.sqrt(sum((r - mean) ** 2 for r in radii) / len(radii)) / mean
+
+
+def calibration_path(address):
+    """
+    Default calibration file of the boat with the given LoRa address.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"compass_calibration_{address}.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hard/soft-iron calibration of the HMC5883L compass")
+    parser.add_argument("--address", type=int, required=True, help="LoRa address of this boat")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to sample while rotating")
+    parser.add_argument("--rate", type=float, default=75, help="samples per second")
+    args = parser.parse_args()
+
+    clock = hardware.clock
+    bus = hardware.open_i2c_bus(1)
+    # Same configuration as the boat scripts: 8-average, 75 Hz, continuous measurement
+    bus.write_byte_data(compass_sampler.HMC5883L_ADDR, 0x00, 0x78)
+    bus.write_byte_data(compass_sampler.HMC5883L_ADDR, 0x01, 0xA0)
+    bus.write_byte_data(compass_sampler.HMC5883L_ADDR, 0x02, 0x00)
+
+    print(f"Rotate the boat slowly through at least one full turn ({args.duration:.0f} s)...")
+    xs, ys = [], []
+    end = clock.monotonic() + args.duration
+    while clock.monotonic() < end:
+        try:
+            data = bus.read_i2c_block_data(compass_sampler.HMC5883L_ADDR, compass_sampler.DATA_REG, 6)
+        except OSError as e:
+            print(f"Error reading compass: {e}")
+        else:
+            x, y, _ = compass_sampler.decode_block(data)
+            xs.append(x)
+            ys.append(y)
+        clock.sleep(1 / args.rate)
+
+    try:
+        calibration = fit_ellipse(xs, ys)
+    except ValueError as e:
+        print(f"Calibration failed: {e}")
+        return
+    coverage = sweep_coverage(xs, ys, calibration)
+    print(f"{len(xs)} samples, heading coverage {coverage:.0%}")
+    print(f"Hard-iron offset: ({calibration.offset_x:.1f}, {calibration.offset_y:.1f})")
+    print(f"Soft-iron matrix: {calibration.matrix}")
+    print(f"Field magnitude spread: raw {radius_spread(xs, ys, CompassCalibration()):.1%}, "
+          f"corrected {radius_spread(xs, ys, calibration):.1%}")
+    if coverage < 1:
+        print("Not all headings were covered; rotate through a full turn and run again.")
+        return
+
+    path = calibration_path(args.address)
+    calibration.save(path)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import math
+import threading
+from array import array
+
+import hardware
+
+# --- HMC5883L Compass Sampler ---
+# A background thread reads the compass at the sensor's output rate into a
+# fixed-size ring buffer of sin/cos values. The control loops get the filtered
+# heading (circular mean over the window, kept as running sums) and the age of
+# the last good sample in O(1), without touching the I2C bus themselves.
+
+HMC5883L_ADDR = 0x1E
+DATA_REG = 0x03
+
+
+def decode_block(data):
+    """
+    Converts the 6 data register bytes (X, Z, Y, big endian two's complement)
+    into signed (x, y, z) values.
+    """
+    x = (data[0] << 8) | data[1]
+    z = (data[2] << 8) | data[3]
+    y = (data[4] << 8) | data[5]
+    if x >= 32768: x -= 65536
+    if y >= 32768: y -= 65536
+    if z >= 32768: z -= 65536
+    return x, y, z
+
+
+def heading_from_xy(x, y):
+    """
+    Heading in degrees (0-360) from the horizontal field components.
+    """
+    heading = math.degrees(math.atan2(y, x))
+    return heading + 360 if heading < 0 else heading
+
+
+class CompassSampler:
+    """
+    Samples an HMC5883L on `bus` at `rate` Hz and keeps the circular mean of
+    the last `window` headings. If a `calibration` (see compass_calibration.py)
+    is given, its precomputed hard/soft-iron correction is applied to every sample.
+    """
+
+    def __init__(self, bus, rate=75, window=8, clock=hardware.clock, address=HMC5883L_ADDR,
+                 calibration=None):
+        self.bus = bus
+        self.calibration = calibration
+        self.period = 1.0 / rate
+        self.window = window
+        self.clock = clock
+        self.address = address
+        # Ring buffer of unit vectors and their running sums
+        self._sin = array("d", [0.0] * window)
+        self._cos = array("d", [0.0] * window)
+        self._index = 0
+        self._sum_sin = 0.0
+        self._sum_cos = 0.0
+        # (filtered heading, monotonic time of the last good sample), replaced atomically
+        self._latest = (None, -math.inf)
+        # Statistics
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+        self.running = False
+        self.thread = None
+
+    def _add(self, heading):
+        rad = math.radians(heading)
+        s, c = math.sin(rad), math.cos(rad)
+        i = self._index
+        # Swap the oldest sample out of the running sums
+        self._sum_sin += s - self._sin[i]
+        self._sum_cos += c - self._cos[i]
+        self._sin[i] = s
+        self._cos[i] = c
+        self._index = (i + 1) % self.window
+        if self._index == 0:
+            # Re-sum once per lap so floating point error cannot accumulate
+            self._sum_sin = math.fsum(self._sin)
+            self._sum_cos = math.fsum(self._cos)
+        mean = math.degrees(math.atan2(self._sum_sin, self._sum_cos)) % 360
+        # A tiny negative angle rounds up to exactly 360 in floating point
+        return 0.0 if mean == 360 else mean
+
+    def poll(self):
+        """
+        Reads one sample from the sensor. Returns False if the read failed.
+        """
+        try:
+            data = self.bus.read_i2c_block_data(self.address, DATA_REG, 6)
+        except OSError as e:
+            self.errors += 1
+            self.last_error = e
+            return False
+        x, y, _ = decode_block(data)
+        if self.calibration is not None:
+            x, y = self.calibration.apply(x, y)
+        self._latest = (self._add(heading_from_xy(x, y)), self.clock.monotonic())
+        self.samples += 1
+        return True
+
+    def _run(self):
+        next_sample = self.clock.monotonic()
+        while self.running:
+            self.poll()
+            # Keep a fixed sample grid; skip missed samples instead of bursting
+            next_sample += self.period
+            now = self.clock.monotonic()
+            if next_sample < now:
+                next_sample = now + self.period
+            self.clock.sleep(next_sample - now)
+
+    def start(self):
+        """
+        Starts the background sampling thread.
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the background sampling thread.
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def latest(self):
+        """
+        Returns (filtered heading in degrees, seconds since the last good sample).
+        The heading is None until the first good sample.
+        """
+        heading, sampled_at = self._latest
+        return heading, self.clock.monotonic() - sampled_at
@@ -1,63 +1,327 @@
+import collections
 import serial
+import threading
 import time
 
+import lora_at
+import lora_rcv
+import telemetry
+
 # LoRa module configuration
 LORA_PORT = "/dev/ttyUSB0"  # Adjust based on your system
 BAUDRATE = 115200
 MY_ADDRESS = 200            # Controller's unique address
 NETWORK_ID = 5              # Shared network ID with boats
+LORA_SF = 12                # Spreading factor of the LoRa module (AT+PARAMETER), used for send pacing
+
+# USB gadget serial link to the laptop running the GUI
+USB_PORT = "/dev/ttyGS0"
+USB_BAUDRATE = 115200
+
+# Relay settings
+# The laptop talks to the relay exactly as it would to a LoRa module: its lines
+# (AT commands) go to the LoRa module and the module's lines (+RCV=, +OK, ...)
+# come back. CMD frames (and their ACKs) use a priority lane in both directions.
+QUEUE_SIZE = 64             # Normal lines buffered per direction
+PRIORITY_QUEUE_SIZE = 16    # CMD lines buffered per direction
+READ_TIMEOUT = 0.2          # Serial read timeout of the reader threads (how fast they notice a stop)
+USB_WRITE_TIMEOUT = 1.0     # Seconds a write to the laptop may block before the line is dropped
+RESPONSE_TIMEOUT = 1.0      # Seconds to wait for the module's answer to a command (on top of airtime)
+STATS_PERIOD = 10           # Seconds between relay statistics printouts
 
 # Initialize serial connection to LoRa module
 ser = serial.Serial(LORA_PORT, BAUDRATE, timeout=2)
+# Sends AT commands and waits for the module's answers (see lora_at.py)
+at = lora_at.ATEngine(ser)
 
-def send_command(command):
+def configure_lora():
     """
-    Sends a command to the LoRa module and reads the response.
+    Configures the LoRa module with the controller's address, network ID and
+    spreading factor, writing only the settings that differ.
     """
-    ser.write((command + '\r\n').encode())
-    time.sleep(0.2)
-    return ser.readline().decode(errors='ignore').strip()
+    at.configure(MY_ADDRESS, NETWORK_ID, lora_at.parameters(LORA_SF))
+    print(f"LoRa module {at.summary()}")
 
-def configure_lora():
+def format_incoming(line):
+    """
+    Formats a raw line from the LoRa module for display, splitting received
+    packets into sender, payload, RSSI and SNR.
+    """
+    try:
+        packet = lora_rcv.parse_rcv(line)
+    except ValueError:
+        packet = None
+    if packet is None:
+        return line.decode(errors='ignore')
+    return f"[{packet.sender}] {packet.text} (RSSI {packet.rssi} dBm, SNR {packet.snr})"
+
+def send_payload(line):
     """
-    Configures the LoRa module with the controller's address and network ID.
+    Returns the payload of an AT+SEND=<addr>,<len>,<payload> line, or None for other lines.
     """
-    send_command(f"AT+ADDRESS={MY_ADDRESS}")
-    send_command(f"AT+NETWORKID={NETWORK_ID}")
-    send_command("AT+RESET")
-    time.sleep(1)
+    if not line.startswith(b"AT+SEND="):
+        return None
+    parts = line[8:].split(b",", 2)
+    return parts[2] if len(parts) == 3 else None
 
-def send_lora_message(dest_addr, message):
+def is_priority_to_lora(line):
     """
-    Sends a message to a specific destination address via LoRa.
+    True for laptop lines that send a CMD frame.
     """
-    command = f"AT+SEND={dest_addr},{len(message)},{message}\r\n"
-    ser.write(command.encode())
+    payload = send_payload(line)
+    return payload is not None and payload.startswith(b"CMD")
 
-def receive_lora_data():
+def is_priority_to_usb(line):
     """
-    Checks for incoming data from the LoRa module.
+    True for LoRa lines that carry a CMD frame or its ACK.
+    """
+    try:
+        packet = lora_rcv.parse_rcv(line)
+    except ValueError:
+        return False
+    return packet is not None and bytes(packet.payload[:3]) in (b"CMD", b"ACK")
+
+class RelayQueue:
+    """
+    Bounded two-lane queue: get() always returns priority lines first. When a
+    lane is full, put() either rejects the new line or drops the oldest line
+    of that lane, and counts it.
+    """
+    def __init__(self, size=QUEUE_SIZE, priority_size=PRIORITY_QUEUE_SIZE, drop_oldest=False):
+        self.lanes = (collections.deque(), collections.deque())
+        self.sizes = (size, priority_size)
+        self.drop_oldest = drop_oldest
+        self.cond = threading.Condition()
+        self.max_depth = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def put(self, line, priority=False):
+        """
+        Queues a line. Returns False if it was rejected because its lane is full.
+        """
+        with self.cond:
+            lane = self.lanes[priority]
+            if len(lane) >= self.sizes[priority]:
+                if not self.drop_oldest:
+                    self.rejected += 1
+                    return False
+                lane.popleft()
+                self.dropped += 1
+            lane.append(line)
+            self.max_depth = max(self.max_depth, self.depth())
+            self.cond.notify()
+            return True
+
+    def get(self, timeout):
+        """
+        Returns (line, priority), or None if nothing arrived within timeout seconds.
+        """
+        with self.cond:
+            if not self.cond.wait_for(self.depth, timeout):
+                return None
+            if self.lanes[True]:
+                return self.lanes[True].popleft(), True
+            return self.lanes[False].popleft(), False
+
+    def depth(self):
+        return len(self.lanes[False]) + len(self.lanes[True])
+
+class RelayDirection:
     """
-    if ser.in_waiting:
-        return ser.readline().decode(errors='ignore').strip()
-    return None
+    Counters of one relay direction.
+    """
+    def __init__(self, name, queue):
+        self.name = name
+        self.queue = queue
+        self.lines_in = 0
+        self.lines_out = 0
+        self.bytes_out = 0
+        self.priority_out = 0
+        self.write_errors = 0
+        # Totals at the last stats() call, for the throughput since then
+        self._last = (time.monotonic(), 0, 0)
+
+    def sent(self, line, priority):
+        self.lines_out += 1
+        self.bytes_out += len(line) + 2
+        if priority:
+            self.priority_out += 1
+
+    def stats(self):
+        """
+        Returns the counters, the queue depth and the throughput since the last call.
+        """
+        now = time.monotonic()
+        last_time, last_lines, last_bytes = self._last
+        elapsed = max(now - last_time, 1e-9)
+        self._last = (now, self.lines_out, self.bytes_out)
+        return {
+            "lines_in": self.lines_in,
+            "lines_out": self.lines_out,
+            "priority_out": self.priority_out,
+            "lines_per_s": (self.lines_out - last_lines) / elapsed,
+            "bytes_per_s": (self.bytes_out - last_bytes) / elapsed,
+            "depth": self.queue.depth(),
+            "max_depth": self.queue.max_depth,
+            "rejected": self.queue.rejected,
+            "dropped": self.queue.dropped,
+            "write_errors": self.write_errors,
+        }
+
+class Relay:
+    """
+    Bidirectional line relay between the laptop (USB) and the LoRa module,
+    one reader and one writer thread per direction.
+
+    USB -> LoRa: the LoRa module takes one command at a time, so the writer
+    waits for its answer (and for the packet's airtime after AT+SEND) before
+    the next line. When the queue is full the line is rejected and the laptop
+    gets +ERR=QUEUE_FULL (explicit backpressure), so the reader never blocks
+    and a CMD line behind a backlog is still read and sent next.
+
+    LoRa -> USB: the air cannot be paused, so when the laptop does not keep
+    up the oldest queued telemetry is dropped; CMD lines have their own lane.
+    """
+    def __init__(self, usb, lora, lora_sf=LORA_SF):
+        self.usb = usb
+        self.lora = lora
+        self.lora_sf = lora_sf
+        self.to_lora = RelayDirection("USB->LoRa", RelayQueue())
+        self.to_usb = RelayDirection("LoRa->USB", RelayQueue(drop_oldest=True))
+        # Set by the LoRa reader when the module answers a command
+        self.response = threading.Event()
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        for target in (self._usb_reader, self._lora_writer, self._lora_reader, self._usb_writer):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+    def _read_lines(self, port):
+        """
+        Yields complete lines (without line ending) read from a serial port until stopped.
+        """
+        buffer = bytearray()
+        while self.running:
+            try:
+                data = port.read(port.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                print(f"Serial read error: {e}")
+                time.sleep(READ_TIMEOUT)
+                continue
+            if not data:
+                continue
+            buffer += data
+            while True:
+                end = buffer.find(b"\n")
+                if end < 0:
+                    break
+                line = bytes(buffer[:end]).rstrip(b"\r")
+                del buffer[:end + 1]
+                if line:
+                    yield line
+
+    def _usb_reader(self):
+        for line in self._read_lines(self.usb):
+            self.to_lora.lines_in += 1
+            if not self.to_lora.queue.put(line, is_priority_to_lora(line)):
+                # Tell the laptop its line was not accepted; it can retry later
+                self.to_usb.queue.put(b"+ERR=QUEUE_FULL", True)
+
+    def _lora_writer(self):
+        while self.running:
+            item = self.to_lora.queue.get(READ_TIMEOUT)
+            if item is None:
+                continue
+            line, priority = item
+            payload = send_payload(line)
+            airtime = telemetry.lora_airtime(len(payload), sf=self.lora_sf) if payload is not None else 0.0
+            self.response.clear()
+            started = time.monotonic()
+            try:
+                self.lora.write(line + b"\r\n")
+            except (serial.SerialException, OSError) as e:
+                print(f"LoRa write error: {e}")
+                self.to_lora.write_errors += 1
+                continue
+            self.to_lora.sent(line, priority)
+            if priority:
+                print(f"Relayed to LoRa: {line.decode(errors='ignore')}")
+            # One command at a time: wait for the module's answer, then for the packet to leave the air
+            self.response.wait(airtime + RESPONSE_TIMEOUT)
+            remaining = started + airtime - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _lora_reader(self):
+        for line in self._read_lines(self.lora):
+            self.to_usb.lines_in += 1
+            if not lora_rcv.is_rcv(line):
+                # +OK, +ERR=..., +READY, ...: the answer to the last command
+                self.response.set()
+            self.to_usb.queue.put(line, is_priority_to_usb(line))
+
+    def _usb_writer(self):
+        while self.running:
+            item = self.to_usb.queue.get(READ_TIMEOUT)
+            if item is None:
+                continue
+            line, priority = item
+            try:
+                self.usb.write(line + b"\r\n")
+            except (serial.SerialException, OSError):
+                # Laptop not reading (write timeout) or disconnected
+                self.to_usb.write_errors += 1
+                continue
+            self.to_usb.sent(line, priority)
+            if priority and lora_rcv.is_rcv(line):
+                print(f"Relayed to USB: {format_incoming(line)}")
+
+    def stats(self):
+        """
+        Returns the statistics of both directions.
+        """
+        return {direction.name: direction.stats() for direction in (self.to_lora, self.to_usb)}
+
+def format_stats(stats):
+    return " | ".join(
+        f"{name}: {s['lines_out']} lines ({s['priority_out']} CMD), {s['lines_per_s']:.1f} lines/s, "
+        f"{s['bytes_per_s']:.0f} B/s, queue {s['depth']} (max {s['max_depth']}), "
+        f"{s['rejected']} rejected, {s['dropped']} dropped, {s['write_errors']} write errors"
+        for name, s in stats.items())
 
 def main():
     """
-    Main loop to handle sending and receiving LoRa messages.
+    Configures the LoRa module and relays between the laptop and the boats.
     """
     configure_lora()
-    print("Controller is running. Press Ctrl+C to exit.")
+    usb = serial.Serial(USB_PORT, USB_BAUDRATE, timeout=READ_TIMEOUT, write_timeout=USB_WRITE_TIMEOUT)
+    ser.timeout = READ_TIMEOUT
+    relay = Relay(usb, ser)
+    # Packets that arrived while the module was being configured are relayed first
+    for line in at.take_received():
+        relay.to_usb.queue.put(line, is_priority_to_usb(line))
+    relay.start()
+    print(f"Controller is relaying between {USB_PORT} and LoRa. Press Ctrl+C to exit.")
 
     try:
         while True:
-            incoming = receive_lora_data()
-            if incoming:
-                print(f"Received: {incoming}")
-            time.sleep(0.1)
+            time.sleep(STATS_PERIOD)
+            print(f"Relay: {format_stats(relay.stats())}")
     except KeyboardInterrupt:
         print("Shutting down controller.")
     finally:
+        relay.stop()
+        usb.close()
         ser.close()
 
 if __name__ == "__main__":
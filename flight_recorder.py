@@ -0,0 +1,212 @@
+import argparse
+import csv
+import math
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+
+import hardware
+
+# --- Binary Flight Recorder ---
+# The boats log one fixed-size binary record per control step into a
+# preallocated, memory-mapped ring file instead of printing to stdout (which is
+# synchronous journal I/O on the SD card under systemd). A write is a struct
+# pack into the page cache; the kernel flushes it in the background and the
+# newest records survive a crash or power cut up to the last flush.
+#
+# Decode a recording on the laptop:
+#   python3 flight_recorder.py flight_101.bin --csv flight_101.csv
+#
+# File layout (little endian):
+#   header  8s magic, H version, H record size, I capacity, Q records written, 8x
+#   records capacity * RECORD_STRUCT; record i is stored at slot i % capacity
+MAGIC = b"BOATFR\x00\x00"
+VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sHHIQ8x")
+# Offset of the "records written" counter inside the header
+COUNT_STRUCT = struct.Struct("<Q")
+COUNT_OFFSET = 16
+
+# Record layout (32 bytes):
+#   d  timestamp       clock.monotonic() of the boat in seconds
+#   B  state           STATE_IDLE / STATE_ACTIVE
+#   B  event           what the record describes (EVENT_* below)
+#   H  seq             leader telemetry sequence number (EVENT_LEADER_FRAME / EVENT_BROADCAST)
+#   f  heading         own filtered compass heading in degrees, NaN if unknown
+#   f  leader_heading  last leader heading in degrees, NaN if unknown
+#   h  rssi            RSSI of the last leader frame in dBm, 0 if none
+#   h  pwm             forward PWM set by the distance control
+#   h  left            signed duty cycle of the left motor (negative = reverse)
+#   h  right           signed duty cycle of the right motor
+RECORD_STRUCT = struct.Struct("<dBBHffhhhh4x")
+FIELDS = "timestamp state event seq heading leader_heading rssi pwm left right"
+Record = namedtuple("Record", FIELDS)
+
+STATE_IDLE = 0
+STATE_ACTIVE = 1
+STATES = {"IDLE": STATE_IDLE, "ACTIVE": STATE_ACTIVE}
+
+EVENT_TICK = 0          # control step / main loop iteration
+EVENT_LEADER_FRAME = 1  # follower accepted a leader telemetry frame
+EVENT_COMMAND = 2       # START or STOP received
+EVENT_BROADCAST = 3     # leader sent a telemetry frame
+EVENT_SEGMENT = 4       # leader started a route segment
+EVENT_NAMES = ["TICK", "LEADER_FRAME", "COMMAND", "BROADCAST", "SEGMENT"]
+
+# Default number of records in the ring (2 MB): about 55 minutes of the follower (one record
+# per 20 Hz control step), about 22 minutes of the leader (one per 50 Hz main loop iteration)
+DEFAULT_CAPACITY = 65536
+# Directory the boats write their recordings to
+RECORDER_DIR = os.environ.get("BOAT_RECORDER_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+
+def recording_path(address):
+    """
+    Default recording file of the boat with the given LoRa address.
+    """
+    return os.path.join(RECORDER_DIR, f"flight_{address}.bin")
+
+
+class FlightRecorder:
+    """
+    Appends records to a preallocated memory-mapped ring file. An existing
+    recording with the same layout is continued, so a restart keeps the
+    history; anything else is overwritten.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, clock=hardware.clock):
+        self.path = path
+        self.clock = clock
+        size = HEADER_STRUCT.size + capacity * RECORD_STRUCT.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            resume = os.fstat(fd).st_size == size
+            if not resume:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, version, record_size, stored_capacity, count = HEADER_STRUCT.unpack_from(self.map, 0)
+        if not resume or (magic, version, record_size, stored_capacity) != (MAGIC, VERSION, RECORD_STRUCT.size, capacity):
+            count = 0
+            HEADER_STRUCT.pack_into(self.map, 0, MAGIC, VERSION, RECORD_STRUCT.size, capacity, 0)
+        self.capacity = capacity
+        self.count = count
+
+    def record(self, state, event, heading=None, leader_heading=None, rssi=0, pwm=0, left=0, right=0, seq=0):
+        """
+        Appends one record stamped with the current clock time. Never blocks on disk I/O.
+        """
+        offset = HEADER_STRUCT.size + (self.count % self.capacity) * RECORD_STRUCT.size
+        RECORD_STRUCT.pack_into(
+            self.map, offset, self.clock.monotonic(), STATES.get(state, STATE_IDLE), event, seq & 0xFFFF,
+            math.nan if heading is None else heading,
+            math.nan if leader_heading is None else leader_heading,
+            rssi, pwm, left, right)
+        self.count += 1
+        COUNT_STRUCT.pack_into(self.map, COUNT_OFFSET, self.count)
+
+    def close(self):
+        """
+        Flushes the ring file to disk and unmaps it.
+        """
+        self.map.flush()
+        self.map.close()
+
+
+class RateLimitedLog:
+    """
+    Opt-in human-readable log: prints a message only if enabled, and at most
+    once per `interval` seconds for each key.
+    """
+
+    def __init__(self, enabled, interval=1.0, clock=hardware.clock):
+        self.enabled = enabled
+        self.interval = interval
+        self.clock = clock
+        self.last = {}
+
+    def __call__(self, key, message):
+        if not self.enabled:
+            return
+        now = self.clock.monotonic()
+        if now - self.last.get(key, -math.inf) >= self.interval:
+            self.last[key] = now
+            print(message)
+
+
+# --- Offline Decoder ---
+def _read_ring(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, record_size, capacity, count = HEADER_STRUCT.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_STRUCT.size:
+        raise ValueError(f"{path} is not a version {VERSION} flight recording")
+    # Slots in chronological order: oldest surviving record first
+    first = max(0, count - capacity)
+    slots = [i % capacity for i in range(first, count)]
+    return data, slots
+
+
+def read_records(path):
+    """
+    Returns the records of a recording, oldest first.
+    """
+    data, slots = _read_ring(path)
+    return [Record._make(RECORD_STRUCT.unpack_from(data, HEADER_STRUCT.size + slot * RECORD_STRUCT.size))
+            for slot in slots]
+
+
+def to_numpy(path):
+    """
+    Returns the records of a recording as a NumPy structured array, oldest first.
+    """
+    import numpy as np
+    dtype = np.dtype({
+        "names": FIELDS.split(),
+        "formats": ["<f8", "u1", "u1", "<u2", "<f4", "<f4", "<i2", "<i2", "<i2", "<i2"],
+        "offsets": [0, 8, 9, 10, 12, 16, 20, 22, 24, 26],
+        "itemsize": RECORD_STRUCT.size,
+    })
+    data, slots = _read_ring(path)
+    records = np.frombuffer(data, dtype=dtype, offset=HEADER_STRUCT.size,
+                            count=(len(data) - HEADER_STRUCT.size) // RECORD_STRUCT.size)
+    return records[np.array(slots, dtype=np.int64)]
+
+
+def write_csv(records, f):
+    writer = csv.writer(f)
+    writer.writerow(FIELDS.split())
+    for r in records:
+        writer.writerow([f"{r.timestamp:.4f}", "ACTIVE" if r.state == STATE_ACTIVE else "IDLE",
+                         EVENT_NAMES[r.event] if r.event < len(EVENT_NAMES) else r.event, r.seq,
+                         f"{r.heading:.2f}", f"{r.leader_heading:.2f}", r.rssi, r.pwm, r.left, r.right])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a boat flight recording")
+    parser.add_argument("path", help="flight_<address>.bin file copied from the boat")
+    parser.add_argument("--csv", help="write the records to this CSV file ('-' for stdout)")
+    args = parser.parse_args()
+
+    records = read_records(args.path)
+    if args.csv == "-":
+        write_csv(records, sys.stdout)
+        return
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            write_csv(records, f)
+    counts = {name: 0 for name in EVENT_NAMES}
+    for r in records:
+        if r.event < len(EVENT_NAMES):
+            counts[EVENT_NAMES[r.event]] += 1
+    span = records[-1].timestamp - records[0].timestamp if records else 0.0
+    print(f"{len(records)} records over {span:.1f} s: "
+          + ", ".join(f"{count} {name}" for name, count in counts.items() if count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import math
+
+# --- Follower Control Law ---
+# Formation-keeping logic of the follower boats, kept free of any hardware access
+# so followerboat.py and the off-boat tools (e.g. swarm_sim.py) run exactly the same law.
+
+# Tolerance in degrees for heading alignment before driving straight
+HEADING_TOLERANCE = 5
+
+# RSSI thresholds for distance control
+# If RSSI is greater than RSSI_CLOSE, the boat is too close
+# If RSSI is less than RSSI_FAR, the boat is too far
+RSSI_CLOSE = -50
+RSSI_FAR = -75
+# Minimum and maximum PWM values for motor speed control
+PWM_MIN = 70
+PWM_MAX = 100
+
+# Distance band in metres of the speed control driven by the range estimator
+# (range_estimator.py); with the default path-loss model these are the distances
+# at which the mean RSSI is RSSI_CLOSE and RSSI_FAR
+DISTANCE_CLOSE = 4.0
+DISTANCE_FAR = 40.0
+# Relative standard deviation of the distance estimate at which the PWM is pulled
+# halfway towards the middle of the PWM range (an uncertain estimate gives a moderate speed)
+UNCERTAINTY_SCALE = 0.5
+# Smaller PWM changes are not applied, so the motors are not retuned on every packet
+PWM_DEADBAND = 3
+
+# GPS formation keeping (when both boats have a GPS fix, see formation.py):
+# commanded position of the follower, OFFSET_BACK metres behind the leader and
+# OFFSET_RIGHT metres to its starboard side (negative: to port)
+OFFSET_BACK = 10.0
+OFFSET_RIGHT = -5.0
+# The follower steers at a point LOOKAHEAD metres ahead of its slot (larger: gentler corrections)
+LOOKAHEAD = 10.0
+# PWM when holding the slot, and PWM change per metre the slot is ahead (+) or behind (-)
+CRUISE_PWM = 85
+SPEED_GAIN = 2.0
+
+
+def distance_status(rssi):
+    """
+    Describes the distance to the leader implied by an RSSI reading.
+    """
+    if rssi > RSSI_CLOSE:
+        return "Too Close"
+    if rssi < RSSI_FAR:
+        return "Too Far"
+    return "OK"
+
+
+def rssi_to_pwm(rssi):
+    """
+    Maps the leader's RSSI to a motor PWM: slow when too close, full speed when
+    too far and linearly interpolated in between.
+    """
+    if rssi > RSSI_CLOSE:
+        return PWM_MIN
+    if rssi < RSSI_FAR:
+        return PWM_MAX
+    # Ratio is 0 when RSSI = RSSI_CLOSE, 1 when RSSI = RSSI_FAR
+    ratio = (RSSI_CLOSE - rssi) / (RSSI_CLOSE - RSSI_FAR)
+    return int(PWM_MIN + (PWM_MAX - PWM_MIN) * ratio)
+
+
+def distance_to_pwm(distance, variance=0.0):
+    """
+    Maps the estimated distance to the leader (metres) and its variance to a
+    motor PWM: slow when too close, full speed when too far and linearly
+    interpolated in between, pulled towards the middle of the PWM range the
+    more uncertain the estimate is.
+    """
+    # Ratio is 0 at DISTANCE_CLOSE and 1 at DISTANCE_FAR
+    ratio = min(max((distance - DISTANCE_CLOSE) / (DISTANCE_FAR - DISTANCE_CLOSE), 0.0), 1.0)
+    relative_std = math.sqrt(variance) / distance
+    weight = 1 / (1 + (relative_std / UNCERTAINTY_SCALE) ** 2)
+    middle = (PWM_MIN + PWM_MAX) / 2
+    return int(round(middle + (PWM_MIN + (PWM_MAX - PWM_MIN) * ratio - middle) * weight))
+
+
+def formation_heading(leader_heading, ahead, starboard):
+    """
+    Heading that brings the follower back to its slot from the slot's position
+    relative to it (ahead / to starboard in metres along the leader's heading):
+    the leader heading turned towards a point LOOKAHEAD metres past the slot,
+    at most 90 degrees (a slot behind the follower is reached by slowing down).
+    """
+    correction = math.degrees(math.atan2(starboard, max(ahead, 0.0) + LOOKAHEAD))
+    return (leader_heading + correction) % 360
+
+
+def formation_pwm(ahead):
+    """
+    Forward PWM from how far the slot is ahead of the follower (negative: behind).
+    """
+    return int(round(min(max(CRUISE_PWM + SPEED_GAIN * ahead, PWM_MIN), PWM_MAX)))
+
+
+def apply_deadband(current, target):
+    """
+    Returns the PWM to use: target if it differs from the current PWM by at
+    least PWM_DEADBAND (or reaches a limit), otherwise the current PWM.
+    """
+    if abs(target - current) >= PWM_DEADBAND or target in (PWM_MIN, PWM_MAX):
+        return target
+    return current
+
+
+def heading_difference(target, current):
+    """
+    Returns target - current normalized to the range -180 to +180 degrees.
+    """
+    diff = target - current
+    if diff > 180: diff -= 360
+    elif diff < -180: diff += 360
+    return diff
+
+
+def motor_directions(diff):
+    """
+    Returns the (left, right) motor directions for a heading difference:
+    1 is forward and -1 is reverse. Inside HEADING_TOLERANCE both motors drive
+    forward, otherwise the boat spins towards the target heading.
+    """
+    if abs(diff) <= HEADING_TOLERANCE:
+        return 1, 1
+    if diff > 0:
+        return 1, -1
+    return -1, 1
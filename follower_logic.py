@@ -0,0 +1,248 @@
+import command_link
+import follower_control
+import formation
+import heading_controller
+import lora_rcv
+import range_estimator
+import telemetry
+
+# --- Follower Decision Logic ---
+# Everything the follower decides from its inputs (received +RCV= lines, its own
+# GPS fixes and the compass heading at each control step), without any hardware
+# access or clock.
+# followerboat.py feeds it live data; follower_replay.py feeds it a recording,
+# so a session from the water can be replayed exactly on the laptop.
+
+# What handle_rcv() found in a received line
+START = "START"
+STOP = "STOP"
+LEADER = "LEADER"
+DUPLICATE = "DUPLICATE"
+REPEATED = "REPEATED"
+ASSIGNMENT = "ASSIGNMENT"
+
+# Returned by control_step() instead of motor duty cycles while steering without a
+# compass heading: stop the motors (compare with `is`)
+COAST = object()
+
+# Seconds after which the follower's own GPS fix, and the leader position from
+# its last frame, are too old for GPS formation keeping (RSSI distance is used instead)
+GPS_STALE_TIME = 3.0
+LEADER_STALE_TIME = 10.0
+
+
+class FollowerLogic:
+    """
+    State of one follower: IDLE/ACTIVE, the latest leader heading and RSSI,
+    the estimated distance to the leader, the distance-based forward PWM and
+    the PID heading controller. `range_model` is the path-loss calibration of
+    this boat (range_estimator.PathLossModel, default model if None).
+
+    While both boats have a recent GPS fix the follower holds its slot `offset`
+    = (metres behind, metres to starboard) of the leader instead: the target
+    heading and PWM come from the slot's position in the local ENU plane.
+    The leader's slot assignment frames replace `offset` with the offset of
+    the formation slot given to this boat's `address` (formation_planner.py).
+    """
+
+    def __init__(self, leader_address=100, sequence_reset_time=10, control_rate=heading_controller.CONTROL_RATE,
+                 initial_pwm=90, range_model=None,
+                 offset=(follower_control.OFFSET_BACK, follower_control.OFFSET_RIGHT), address=None):
+        self.leader_address = leader_address
+        self.address = address
+        self.period = 1.0 / control_rate
+        self.state = "IDLE"
+        self.leader_heading = None
+        # Heading the PID steers to: the leader heading, corrected towards the slot in GPS formation
+        self.target_heading = None
+        self.leader_frame = None
+        self.rejected_seq = None
+        self.rssi = 0
+        # Distance to the leader in metres and its variance, estimated from the RSSI
+        self.range = range_estimator.RangeEstimator(range_model)
+        self.distance = None
+        self.distance_variance = None
+        self.pwm = initial_pwm
+        # GPS formation keeping: local plane (anchored at the first leader position), the
+        # (east, north) positions of both boats with the times of their fixes, and the
+        # slot's position relative to the follower as (ahead, starboard), None when not in use
+        self.offset = self.default_offset = offset
+        # Formation slot assigned by the leader (None: default offset) and the formation it belongs to
+        self.slot = None
+        self.formation = None
+        self.plane = None
+        self.position = None
+        self.position_time = None
+        self.leader_position = None
+        self.leader_position_time = None
+        self.slot_error = None
+        self.diff = None
+        self.sequence = telemetry.SequenceFilter(sequence_reset_time)
+        self.commands = command_link.CommandFilter()
+        # (sender, payload) of the ACK the boat should send for the last command, if any
+        self.ack = None
+        # Last packet parsed by handle_rcv (None if the line was not a valid packet)
+        self.packet = None
+        self.pid = heading_controller.HeadingPID()
+
+    def handle_rcv(self, line, now):
+        """
+        Processes one +RCV= line received at monotonic time `now`. Returns START,
+        STOP, LEADER (a new leader frame was applied), DUPLICATE, REPEATED (a
+        command already acted on), ASSIGNMENT (a slot assignment covering this
+        boat) or None (ignored). For commands with a sequence
+        number, `ack` is set to the ACK to send. Raises ValueError for malformed
+        lines and payloads.
+        """
+        self.packet = None
+        packet = self.packet = lora_rcv.parse_rcv(line)
+        if packet is None:
+            return None
+        payload = packet.text
+        fields = payload.split(",")
+
+        # Commands: CMD,<command>[,<seq>] (see command_link.py)
+        parsed = command_link.parse_command(payload)
+        if parsed is not None:
+            command, seq = parsed
+            if seq is not None:
+                # Every copy is acknowledged: the ACK of an earlier copy may have been lost
+                self.ack = (packet.sender, command_link.encode_ack(command, seq))
+                if not self.commands.accept(packet.sender, seq, now):
+                    return REPEATED
+            if command == "START":
+                self.state = "ACTIVE"
+                # Start the distance estimate over: the boats may have been moved while idle
+                self.range.reset()
+                return START
+            if command == "STOP":
+                self.state = "IDLE"
+                # Start the next run without integral from this one
+                self.pid.reset()
+                return STOP
+            return None
+
+        # Slot assignments are applied in any state, so the boats know their slots before START
+        if (packet.sender == self.leader_address and telemetry.is_binary_frame(payload)
+                and telemetry.message_type(payload) == telemetry.MSG_ASSIGNMENT):
+            return self._apply_assignment(telemetry.decode_frame(payload))
+
+        # Only the leader's telemetry is used for formation keeping, and only while ACTIVE
+        if self.state != "ACTIVE" or packet.sender != self.leader_address:
+            return None
+        # Binary telemetry frame payload: #<base64 frame>
+        # Legacy text payload:            LEADER,<lat>,<lon>,<heading>
+        if telemetry.is_binary_frame(payload):
+            frame = telemetry.decode_frame(payload)
+            # Skip frames we have already seen or that arrived after a newer one
+            if not self.sequence.accept(frame.seq, now):
+                self.rejected_seq = frame.seq
+                return DUPLICATE
+            self.leader_frame = frame
+            self.leader_heading = frame.heading
+            if frame.fix_age is not None:
+                self.leader_position = self._to_plane(frame.lat, frame.lon)
+                self.leader_position_time = now - frame.fix_age
+        elif len(fields) >= 4 and fields[0] == "LEADER":
+            self.leader_frame = None
+            self.leader_heading = float(fields[3])
+            self.leader_position = self._to_plane(float(fields[1]), float(fields[2]))
+            self.leader_position_time = now
+        else:
+            return None
+        # RSSI is appended by the LoRa module on reception; the distance estimated
+        # from it sets the forward speed when there is no GPS formation keeping
+        self.rssi = packet.rssi
+        self.distance, self.distance_variance = self.range.update(self.rssi, now)
+        self._update_target(now)
+        return LEADER
+
+    def _apply_assignment(self, frame):
+        if self.address is None:
+            return None
+        index = self.address - self.leader_address - 1
+        if not frame.first <= index < frame.first + len(frame.slots):
+            return None
+        if frame.formation >= len(formation.FORMATIONS):
+            raise ValueError(f"unknown formation {frame.formation}")
+        self.slot = frame.slots[index - frame.first]
+        if self.slot is None:
+            self.formation = None
+            self.offset = self.default_offset
+        else:
+            self.formation = formation.FORMATIONS[frame.formation]
+            self.offset = formation.slot_offset(self.formation, self.slot, frame.spacing)
+        return ASSIGNMENT
+
+    def handle_fix(self, lat, lon, fix_time):
+        """
+        Applies a GPS fix of the follower itself, taken at monotonic time `fix_time`.
+        """
+        self.position = self._to_plane(lat, lon)
+        self.position_time = fix_time
+        if self.state == "ACTIVE" and self.leader_heading is not None:
+            self._update_target(fix_time)
+
+    def _to_plane(self, lat, lon):
+        if self.plane is None:
+            self.plane = formation.LocalFrame(lat, lon)
+        position = self.plane.to_enu(lat, lon)
+        if not self.plane.contains(*position):
+            # Far from the anchor: start a new plane here (the other boat is converted again on its next fix)
+            self.plane = formation.LocalFrame(lat, lon)
+            self.position = self.leader_position = None
+            position = (0.0, 0.0)
+        return position
+
+    @property
+    def leader_range_bearing(self):
+        """
+        (range in metres, bearing in degrees) from the follower to the leader, or None without both positions.
+        """
+        if self.position is None or self.leader_position is None:
+            return None
+        return formation.range_bearing(self.leader_position[0] - self.position[0],
+                                       self.leader_position[1] - self.position[1])
+
+    def _update_target(self, now):
+        """
+        Sets the target heading and forward PWM: from the slot position when
+        both GPS positions are recent, otherwise the leader heading and the
+        PWM for the distance estimated from the RSSI.
+        """
+        if (self.position is not None and self.leader_position is not None
+                and now - self.position_time <= GPS_STALE_TIME
+                and now - self.leader_position_time <= LEADER_STALE_TIME):
+            self.slot_error = formation.slot_error(self.position, self.leader_position,
+                                                      self.leader_heading, *self.offset)
+            self.target_heading = follower_control.formation_heading(self.leader_heading, *self.slot_error)
+            pwm = follower_control.formation_pwm(self.slot_error[0])
+        else:
+            self.slot_error = None
+            self.target_heading = self.leader_heading
+            if self.distance is None:
+                return
+            pwm = follower_control.distance_to_pwm(self.distance, self.distance_variance)
+        self.pwm = follower_control.apply_deadband(self.pwm, pwm)
+
+    @property
+    def steering(self):
+        """
+        True if the next control step needs the compass heading.
+        """
+        return self.state == "ACTIVE" and self.leader_heading is not None
+
+    def control_step(self, heading):
+        """
+        Runs one fixed-rate control step with the current compass heading (None
+        if stale). Returns the signed (left, right) motor duty cycles, the COAST
+        sentinel (stop the motors rather than keep a turn going blind) while
+        steering without a heading, or None when not steering.
+        """
+        if not self.steering:
+            return None
+        if heading is None:
+            return COAST
+        self.diff = follower_control.heading_difference(self.target_heading, heading)
+        turn = self.pid.update(self.target_heading, heading, self.period)
+        return heading_controller.differential_thrust(self.pwm, turn)
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import math
+import os
+import struct
+import sys
+import time
+
+import follower_logic
+import range_estimator
+
+# --- Follower Record/Replay ---
+# With BOAT_INPUT_RECORDING=<file> the follower writes every input of its
+# decision logic to <file>: each received +RCV= line and the compass heading
+# used by each control step, and its own GPS fixes, with monotonic timestamps. Replaying the file runs
+# the same FollowerLogic as followerboat.py as fast as the CPU allows and emits
+# the motor command trace, so behaviour can be diffed across code changes:
+#
+#   python3 follower_replay.py inputs_101.bin --trace before.csv
+#   python3 follower_replay.py inputs_101.bin --trace after.csv --repeat 1000
+#
+# File layout (little endian): 8-byte MAGIC, then events of
+#   EVENT_STRUCT (d timestamp, B kind, H data length) followed by the data:
+#   KIND_RCV   the raw +RCV= line
+#   KIND_TICK  HEADING_STRUCT: compass heading of the control step, NaN if stale or not read
+#   KIND_FIX   FIX_STRUCT: latitude and longitude of a GPS fix (the timestamp is the time of the fix)
+MAGIC = b"BOATIN01"
+EVENT_STRUCT = struct.Struct("<dBH")
+HEADING_STRUCT = struct.Struct("<d")
+FIX_STRUCT = struct.Struct("<dd")
+KIND_RCV = 1
+KIND_TICK = 2
+KIND_FIX = 3
+
+
+class InputRecorder:
+    """
+    Appends the follower's inputs to a recording file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+
+    def rcv(self, timestamp, line):
+        self.file.write(EVENT_STRUCT.pack(timestamp, KIND_RCV, len(line)))
+        self.file.write(line)
+
+    def tick(self, timestamp, heading):
+        self.file.write(EVENT_STRUCT.pack(timestamp, KIND_TICK, HEADING_STRUCT.size))
+        self.file.write(HEADING_STRUCT.pack(math.nan if heading is None else heading))
+
+    def fix(self, timestamp, lat, lon):
+        self.file.write(EVENT_STRUCT.pack(timestamp, KIND_FIX, FIX_STRUCT.size))
+        self.file.write(FIX_STRUCT.pack(lat, lon))
+
+    def close(self):
+        self.file.close()
+
+
+def load(path):
+    """
+    Reads a recording into a list of (timestamp, kind, data) events, where data
+    is the line (bytes) for KIND_RCV, the heading (or None) for KIND_TICK and
+    (lat, lon) for KIND_FIX.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a follower input recording")
+    events = []
+    offset = len(MAGIC)
+    # A recording cut off mid-event (e.g. power loss) ends at the last complete event
+    while offset + EVENT_STRUCT.size <= len(data):
+        timestamp, kind, length = EVENT_STRUCT.unpack_from(data, offset)
+        offset += EVENT_STRUCT.size
+        if offset + length > len(data):
+            break
+        payload = data[offset:offset + length]
+        offset += length
+        if kind == KIND_TICK:
+            heading = HEADING_STRUCT.unpack(payload)[0]
+            payload = None if math.isnan(heading) else heading
+        elif kind == KIND_FIX:
+            payload = FIX_STRUCT.unpack(payload)
+        events.append((timestamp, kind, payload))
+    return events
+
+
+def replay(events, leader_address=100, sequence_reset_time=10, control_rate=20, range_model=None, address=None):
+    """
+    Runs the events through a fresh FollowerLogic (of the boat at `address`,
+    which picks its slot from the leader's assignments). Returns the motor command
+    trace as (timestamp, left, right) tuples; STOP and COAST are (timestamp, 0, 0) commands.
+    """
+    follower = follower_logic.FollowerLogic(leader_address, sequence_reset_time, control_rate,
+                                            range_model=range_model, address=address)
+    trace = []
+    for timestamp, kind, data in events:
+        if kind == KIND_TICK:
+            command = follower.control_step(data)
+            if command is follower_logic.COAST:
+                trace.append((timestamp, 0, 0))
+            elif command is not None:
+                trace.append((timestamp, command[0], command[1]))
+        elif kind == KIND_FIX:
+            follower.handle_fix(data[0], data[1], timestamp)
+        elif kind == KIND_RCV:
+            try:
+                result = follower.handle_rcv(data, timestamp)
+            except (ValueError, IndexError):
+                # Same as the boat: malformed packets are reported and skipped
+                continue
+            if result == follower_logic.STOP:
+                trace.append((timestamp, 0, 0))
+    return trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a follower input recording through the follower logic")
+    parser.add_argument("path", help="recording made with BOAT_INPUT_RECORDING")
+    parser.add_argument("--trace", help="write the motor command trace to this CSV file ('-' for stdout)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many times to benchmark")
+    parser.add_argument("--leader", type=int, default=100, help="LoRa address of the leader")
+    parser.add_argument("--address", type=int, default=101, help="LoRa address of the recorded follower")
+    parser.add_argument("--rate", type=float, default=20, help="control rate in Hz the recording was made with")
+    parser.add_argument("--range-calibration",
+                        help="path-loss calibration of the boat (default: the file the boat at --address loads, "
+                             "see range_estimator.py)")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    events = load(args.path)
+    # Same model as the boat: its own calibration file, or the default model if there is none
+    range_file = args.range_calibration or range_estimator.calibration_path(args.address)
+    if not os.path.exists(range_file):
+        print(f"No range calibration found at {range_file}; using the default path-loss model", file=sys.stderr)
+    range_model = range_estimator.PathLossModel.load(range_file)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        trace = replay(events, args.leader, control_rate=args.rate, range_model=range_model, address=args.address)
+    elapsed = time.perf_counter() - start
+
+    if args.trace:
+        f = sys.stdout if args.trace == "-" else open(args.trace, "w", newline="")
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "left", "right"])
+        writer.writerows((f"{t:.4f}", left, right) for t, left, right in trace)
+        if f is not sys.stdout:
+            f.close()
+
+    ticks = sum(kind == KIND_TICK for _, kind, _ in events)
+    span = events[-1][0] - events[0][0] if events else 0.0
+    print(f"{len(events)} events ({ticks} control steps) over {span:.1f} s -> {len(trace)} motor commands",
+          file=sys.stderr)
+    print(f"{args.repeat} replays in {elapsed:.3f} s: {args.repeat / elapsed:.0f} replays/s, "
+          f"{elapsed / max(args.repeat * len(events), 1) * 1e6:.2f} us per event", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
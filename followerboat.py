@@ -1,8 +1,22 @@
-import time
-import serial
-import math
-import smbus2
-import pigpio
+import os
+import queue
+import select
+import threading
+
+import compass_calibration
+import compass_sampler
+import flight_recorder
+import follower_logic
+import follower_replay
+import gps_reader
+import hardware
+import lora_at
+import heading_controller
+import lora_rcv
+import motor_driver
+import range_estimator
+import tdma
+import telemetry
 
 # --- Configuration Variables ---
 # Serial port for the LoRa module
@@ -13,6 +27,21 @@ BAUDRATE = 115200
 MY_ADDRESS = 101
 # Network ID for the LoRa network (must match other devices)
 NETWORK_ID = 5
+# Spreading factor of the LoRa modules, written at startup (AT+PARAMETER); sets the TDMA slot length
+LORA_SF = 12
+# Address of the leader boat. The leader broadcasts telemetry to every node,
+# so frames from any other sender are ignored
+LEADER_ADDRESS = 100
+# The follower status frames (position, heading, formation slot) are broadcast,
+# so both the leader (slot assignment) and the GUI receive them
+BROADCAST_ADDR = 0
+# A status frame goes out every STATUS_FRAMES TDMA frames (every STATUS_PERIOD
+# seconds before the leader's schedule is known); the other slots are left for ACKs
+STATUS_FRAMES = 2
+STATUS_PERIOD = 5.0
+# Seconds without an accepted leader frame after which the sequence filter starts over
+# (e.g. when the leader restarts and its sequence number goes back to 0)
+SEQUENCE_RESET_TIME = 10
 
 # GPIO pins connected to the TB6612FNG motor driver
 # AIN1, AIN2: Logic pins for Motor A direction
@@ -22,213 +51,281 @@ NETWORK_ID = 5
 AIN1, AIN2, BIN1, BIN2 = 5, 10, 13, 19
 PWMA, PWMB, STBY = 9, 26, 6
 
-# Tolerance in degrees for heading alignment before driving straight
-HEADING_TOLERANCE = 5
+# Heading tolerance, distance band, PWM limits and the commanded GPS formation
+# offset (OFFSET_BACK / OFFSET_RIGHT) of the formation control law are defined in
+# follower_control.py (shared with the simulator); the RSSI path-loss model used
+# to estimate the distance is calibrated with range_estimator.py
+
 # Balance factors for left and right motor speeds (adjust for calibration)
 LEFT_MOTOR_BALANCE = 1.0
 RIGHT_MOTOR_BALANCE = 1.0
 
-# RSSI thresholds for distance control
-# If RSSI is greater than RSSI_CLOSE, the boat is too close
-# If RSSI is less than RSSI_FAR, the boat is too far
-RSSI_CLOSE = -50
-RSSI_FAR = -75
-# Minimum and maximum PWM values for motor speed control
-PWM_MIN = 70
-PWM_MAX = 100
-# Variable to store the current motor PWM duty cycle
-current_pwm = 90
-
-# Current state of the follower boat (IDLE or ACTIVE)
-# IDLE: Waiting for START command
-# ACTIVE: Following the leader and maintaining formation
-STATE = "IDLE"
+# Motor PWM duty cycle used until the first leader frame sets it from the estimated distance
+INITIAL_PWM = 90
+
+# Rate in Hz of the PID heading/motor control loop (runs independently of LoRa traffic);
+# the PID gains are defined in heading_controller.py
+CONTROL_RATE = 20
+
+# Compass output rate in Hz (must match CONFIG_REG_A below) and number of samples averaged
+COMPASS_RATE = 75
+COMPASS_WINDOW = 8
+# Seconds after which the last good compass sample is too old to steer by
+COMPASS_STALE_TIME = 0.5
+
+# GPIO pins of the GPS software UART (GPS TX -> Pi RX, Pi TX -> GPS RX) and its baud rate.
+# With a GPS fix on both boats the follower holds its offset from the leader by position
+GPS_RX_GPIO = 27
+GPS_TX_GPIO = 22
+GPS_BAUD = 9600
+
+# Clock used for all timing (runs faster than real time with the fake hardware backend)
+clock = hardware.clock
+
+# Every control step is written to the binary flight recorder (see flight_recorder.py).
+# Human-readable status lines are opt-in (BOAT_VERBOSE=1) and printed at most once
+# per LOG_INTERVAL seconds each; START/STOP and errors are always printed
+VERBOSE = os.environ.get("BOAT_VERBOSE") == "1"
+LOG_INTERVAL = 1.0
+
+# Set BOAT_INPUT_RECORDING=<file> to record every +RCV= line and control-step heading
+# for exact replay on the laptop (see follower_replay.py)
+INPUT_RECORDING = os.environ.get("BOAT_INPUT_RECORDING")
 
 # --- LoRa Module Class ---
 # Handles serial communication with the RYLR896 LoRa module
 class RYLR896:
     def __init__(self, port, baudrate=115200):
         # Initialize serial connection
-        self.ser = serial.Serial(port, baudrate, timeout=2)
+        self.ser = hardware.open_serial(port, baudrate, timeout=2)
+        # Sends AT commands and waits for the module's answers (see lora_at.py)
+        self.at = lora_at.ATEngine(self.ser, clock)
 
-    # Send an AT command to the LoRa module and read the response
+    # Send an AT command to the LoRa module and return its response
+    # (raises lora_at.LoraError on +ERR or when the module does not answer)
     def send_command(self, command):
-        self.ser.write((command + '\r\n').encode())
-        # Small delay to allow the module to process the command and respond
-        time.sleep(0.2)
-        # Read and return the response line, stripping whitespace
-        return self.ser.readline().decode(errors='ignore').strip()
-
-    # Configure the LoRa module's address and network ID
-    def configure(self, address, network_id):
-        self.send_command(f"AT+ADDRESS={address}")
-        self.send_command(f"AT+NETWORKID={network_id}")
-        # Reset the module to apply configuration changes
-        self.send_command("AT+RESET")
-        # Wait for the module to reset
-        time.sleep(1)
-
-    # Check for and receive data from the LoRa module
-    def receive_data(self):
-        # Check if there is data waiting in the serial buffer
-        if self.ser.in_waiting:
-            # Read a line from the serial buffer and return it
-            return self.ser.readline().decode(errors='ignore').strip()
-        # Return None if no data is available
-        return None
+        return self.at.command(command)
+
+    # Configure the LoRa module's address, network ID and spreading factor. Each
+    # setting is queried first and only written if it differs; the module is only
+    # reset (to apply the changes) if something was written
+    def configure(self, address, network_id, sf=12):
+        self.at.configure(address, network_id, lora_at.parameters(sf))
+        print(f"LoRa module {self.at.summary()}")
+
+    # Send data packet to a specific destination address
+    def send_data(self, dest_addr, message):
+        # Format the AT command for sending data
+        command = f"AT+SEND={dest_addr},{len(message)},{message}\r\n"
+        # Encode and write the command to the serial port (the +OK response is discarded by the reader thread)
+        self.ser.write(command.encode())
+
+    # Start a background thread that reads the serial port as soon as data arrives
+    # and queues every complete +RCV= line for the main loop
+    def start_receiver(self):
+        self.rx_queue = queue.Queue()
+        # Packets that arrived while the module was being configured come first
+        for line in self.at.take_received():
+            self.rx_queue.put(line)
+        self.running = True
+        self.rx_thread = threading.Thread(target=self._reader_loop, daemon=True)
+        self.rx_thread.start()
+
+    # Stop the background reader thread
+    def stop_receiver(self):
+        self.running = False
+        self.rx_thread.join(timeout=1)
+
+    # Reader thread: sleep on the serial file descriptor until bytes arrive,
+    # then split the stream into lines so bursts of frames are never left behind
+    def _reader_loop(self):
+        buffer = bytearray()
+        fd = self.ser.fileno()
+        while self.running:
+            # Wake up on incoming data, or every 0.5 s to check if we should exit
+            ready, _, _ = select.select([fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                # Read everything that is currently waiting (at least one byte)
+                buffer += self.ser.read(self.ser.in_waiting or 1)
+            except hardware.SerialException as e:
+                print(f"Serial read error: {e}")
+                continue
+            # Queue every complete line; keep any partial line for the next read
+            while True:
+                end = buffer.find(b"\n")
+                if end < 0:
+                    break
+                line = bytes(buffer[:end]).rstrip(b"\r")
+                del buffer[:end + 1]
+                if lora_rcv.is_rcv(line):
+                    self.rx_queue.put(line)
+
+    # Return the next received +RCV= line (raw bytes), waiting up to `timeout` seconds for one
+    def receive_data(self, timeout=0):
+        try:
+            return self.rx_queue.get(timeout=clock.to_real(timeout)) if timeout > 0 else self.rx_queue.get_nowait()
+        except queue.Empty:
+            # Return None if no data is available
+            return None
 
 # --- Hardware Initialization ---
-# Initialize pigpio library
-pi = pigpio.pi()
+# Initialize pigpio library (or the fake motor driver when BOAT_HARDWARE=fake, see hardware.py)
+pi = hardware.open_pigpio()
 
+# Motor driver that remembers the pin states and only sends pigpio what changed (see motor_driver.py)
+motors = motor_driver.MotorDriver(pi, AIN1, AIN2, BIN1, BIN2, PWMA, PWMB, STBY,
+                                  left_balance=LEFT_MOTOR_BALANCE, right_balance=RIGHT_MOTOR_BALANCE)
 # Set motor control pins as outputs using pigpio
-for pin in [AIN1, AIN2, BIN1, BIN2, STBY]:
-    pi.set_mode(pin, pigpio.OUTPUT)
+motors.setup()
 
 # Initialize I2C bus for the compass sensor
-bus = smbus2.SMBus(1)
+bus = hardware.open_i2c_bus(1)
 # Configure the HMC5883L compass sensor
 # 0x1E is the default I2C address
-# 0x00 (CONFIG_REG_A): 0x70 sets 8-average, 75 Hz, Normal Measurement
-bus.write_byte_data(0x1E, 0x00, 0x70)
+# 0x00 (CONFIG_REG_A): 0x78 sets 8-average, 75 Hz, Normal Measurement
+bus.write_byte_data(0x1E, 0x00, 0x78)
 # 0x01 (CONFIG_REG_B): 0xA0 sets Gain = 5, Range = +/- 4.7 Gauss (adjust as needed)
 bus.write_byte_data(0x1E, 0x01, 0xA0)
 # 0x02 (MODE_REG): 0x00 sets Continuous Measurement Mode
 bus.write_byte_data(0x1E, 0x02, 0x00)
+# Load this boat's hard/soft-iron calibration (identity if compass_calibration.py has not been run)
+calibration_file = compass_calibration.calibration_path(MY_ADDRESS)
+calibration = compass_calibration.CompassCalibration.load(calibration_file)
+if not os.path.exists(calibration_file):
+    print(f"No compass calibration found at {calibration_file}; using raw readings")
+# Sample the compass in the background at its 75 Hz output rate (see compass_sampler.py)
+compass = compass_sampler.CompassSampler(bus, rate=COMPASS_RATE, window=COMPASS_WINDOW, clock=clock,
+                                         calibration=calibration)
+compass.start()
+
+# Read this boat's GPS in the background, keeping only the latest $GPRMC fix (see gps_reader.py)
+gps = gps_reader.GpsReader(pi, rx_gpio=GPS_RX_GPIO, tx_gpio=GPS_TX_GPIO, baud=GPS_BAUD, clock=clock)
+gps.configure()
+gps.start()
+
+# Flight recorder ring file and the rate-limited status log
+recorder = flight_recorder.FlightRecorder(flight_recorder.recording_path(MY_ADDRESS), clock=clock)
+log = flight_recorder.RateLimitedLog(VERBOSE, LOG_INTERVAL, clock)
+inputs = follower_replay.InputRecorder(INPUT_RECORDING) if INPUT_RECORDING else None
 
 # Initialize the LoRa module
 lora = RYLR896(LORA_PORT, BAUDRATE)
 # Configure the LoRa module with the boat's address and network ID
-lora.configure(MY_ADDRESS, NETWORK_ID)
+lora.configure(MY_ADDRESS, NETWORK_ID, LORA_SF)
+# Start reading LoRa data in the background (after configuration, so AT responses are not consumed)
+lora.start_receiver()
 
 # --- Sensor Reading Functions ---
-# Read heading data from the HMC5883L compass sensor
+# Get the filtered heading from the HMC5883L compass sampler
+# Returns None if there has been no good sample for COMPASS_STALE_TIME seconds
 def read_heading():
-    try:
-        # Read raw data from the sensor (X, Z, Y) registers
-        data = bus.read_i2c_block_data(0x1E, 0x03, 6)
-        # Combine bytes to form 16-bit signed integers for X and Y axes
-        x = (data[0] << 8) | data[1]
-        y = (data[4] << 8) | data[5]
-
-        # Convert raw data to signed integers (two's complement)
-        if x >= 32768: x -= 65536
-        if y >= 32768: y -= 65536
-
-        # Calculate heading in radians using arctan2 (Y, X)
-        # Convert radians to degrees
-        heading = math.degrees(math.atan2(y, x))
-
-        # Normalize heading to 0-360 degrees
-        return heading + 360 if heading < 0 else heading
-    except Exception as e:
-        # Print error if reading or calculation fails
-        print(f"Error reading compass: {e}")
-        # Return 0.0 or last known heading in a real application
-        return 0.0
+    heading, age = compass.latest()
+    if heading is None or age > COMPASS_STALE_TIME:
+        # Report how old the data is instead of returning a fake heading
+        log("compass", f"Compass data is stale ({age:.2f} s old, {compass.errors} read errors, last: {compass.last_error})")
+        return None
+    return heading
 
 # --- Motor Control Functions ---
-# Drive the motors based on heading difference and PWM speed
-def drive_motors(diff, pwm):
-    # Enable the motor driver
-    pi.write(STBY, 1)
-
-    # Check if the heading difference is within the tolerance
-    if abs(diff) <= HEADING_TOLERANCE:
-        # Drive straight forward
-        pi.write(AIN1, 1); pi.write(AIN2, 0) # Motor A Forward
-        pi.write(BIN1, 1); pi.write(BIN2, 0) # Motor B Forward
-        print("Driving Straight")
-    # If the heading difference is positive, turn right
-    elif diff > 0:
-        # Turn right (Motor A Forward, Motor B Reverse)
-        pi.write(AIN1, 1); pi.write(AIN2, 0) # Motor A Forward
-        pi.write(BIN1, 0); pi.write(BIN2, 1) # Motor B Reverse
-        print("Turning Right")
-    # If the heading difference is negative, turn left
-    else:
-        # Turn left (Motor A Reverse, Motor B Forward)
-        pi.write(AIN1, 0); pi.write(AIN2, 1) # Motor A Reverse
-        pi.write(BIN1, 1); pi.write(BIN2, 0) # Motor B Forward
-        print("Turning Left")
-
-    # Set the PWM duty cycle for both motors, applying balance factors
-    # Duty cycle should be between 0 and 255
-    pi.set_PWM_dutycycle(PWMA, int(pwm * LEFT_MOTOR_BALANCE))
-    pi.set_PWM_dutycycle(PWMB, int(pwm * RIGHT_MOTOR_BALANCE))
+# Motors are driven with motors.drive(left, right) at signed duty cycles:
+# positive is forward, negative is reverse (see heading_controller.differential_thrust)
 
 # Stop both motors and disable the motor driver
 def stop_motors():
-    pi.set_PWM_dutycycle(PWMA, 0) # Set PWM to 0
-    pi.set_PWM_dutycycle(PWMB, 0)
-    pi.write(STBY, 0) # Disable the motor driver
+    motors.stop()
     print("Motors Stopped")
 
 # --- Main Loop ---
 print("Follower ready and waiting for START command...")
 
-# Variable to store the last received heading from the leader
-last_leader_heading = None
+# Load this boat's RSSI path-loss calibration (default model if range_estimator.py has not been run)
+range_file = range_estimator.calibration_path(MY_ADDRESS)
+range_model = range_estimator.PathLossModel.load(range_file)
+if not os.path.exists(range_file):
+    print(f"No range calibration found at {range_file}; using the default path-loss model")
+# Formation-keeping decisions (state, leader heading, distance-based PWM, PID), see follower_logic.py.
+# The follower starts IDLE (waiting for START) and is ACTIVE while following the leader
+follower = follower_logic.FollowerLogic(LEADER_ADDRESS, SEQUENCE_RESET_TIME, CONTROL_RATE, INITIAL_PWM, range_model,
+                                        address=MY_ADDRESS)
+# Fixed-rate schedule of the control step (also measures its jitter)
+control_loop = heading_controller.LoopTimer(CONTROL_RATE, clock)
+# Outgoing frames wait for this boat's TDMA slot, as announced and timed by the leader (see tdma.py)
+scheduler = tdma.TdmaScheduler(MY_ADDRESS, LEADER_ADDRESS, LORA_SF)
+# Last GPS fix passed to the follower logic
+last_fix = None
+# Sequence number and due time of the next status frame
+status_seq = 0
+status_deadline = clock.monotonic()
 
 try:
     # Infinite loop to continuously receive data and control the boat
     while True:
-        # Attempt to receive data from the LoRa module
-        incoming = lora.receive_data()
-
-        # Check if data was received and it's a valid RCV message
-        if incoming and incoming.startswith("+RCV="):
-            print(f"Received RAW LoRa data: {incoming}")
+        # Wait for LoRa data, but never past the next control step
+        incoming = lora.receive_data(timeout=control_loop.time_until_tick())
+
+        # Check if data was received (the reader thread only queues +RCV= lines)
+        if incoming:
+            log("raw", f"Received RAW LoRa data: {incoming.decode(errors='ignore')}")
+            now = clock.monotonic()
+            if inputs:
+                inputs.rcv(now, incoming)
             try:
-                # Remove the "+RCV=" prefix and split the message by commas
-                parts = incoming.replace("+RCV=", "").split(",")
-
-                # --- Check for Command Messages ---
-                # Expected format for commands: +RCV=<sender>,<length>,CMD,<command>
-                if len(parts) >= 4 and parts[2] == "CMD":
-                    command = parts[3].strip().upper()
-                    # If START command is received
-                    if command == "START":
-                        print("START command received! Entering ACTIVE state.")
-                        STATE = "ACTIVE"
-                    # If STOP command is received
-                    elif command == "STOP":
-                        print("STOP command received! Entering IDLE state.")
-                        STATE = "IDLE"
-                        # Stop motors immediately when STOP is received
-                        stop_motors()
-                    # Continue to the next loop iteration after processing a command
-                    continue
-
-                # --- Process Data from Leader (only if in ACTIVE state) ---
-                # Expected format for Leader data: +RCV=<sender>,<length>,LEADER,<lat>,<lon>,<heading>,<rssi>
-                if STATE == "ACTIVE" and len(parts) >= 7 and parts[2] == "LEADER":
-                    # Parse leader's data
-                    # lat = float(parts[3]) # Latitude (not used in this version for control)
-                    # lon = float(parts[4]) # Longitude (not used in this version for control)
-                    last_leader_heading = float(parts[5]) # Leader's heading
-                    rssi = int(parts[6]) # RSSI from the leader
-
-                    print(f"Leader Heading: {last_leader_heading:.2f}° | RSSI: {rssi} dBm")
-
-                    # Adjust PWM based on RSSI (distance control)
-                    if rssi > RSSI_CLOSE:
-                        # Too close, reduce speed
-                        print("Distance: Too Close")
-                        current_pwm = PWM_MIN
-                    elif rssi < RSSI_FAR:
-                        # Too far, increase speed
-                        print("Distance: Too Far")
-                        current_pwm = PWM_MAX
+                # Commands (CMD,START / CMD,STOP, see command_link.py) and leader telemetry (binary frame or legacy
+                # LEADER,<lat>,<lon>,<heading>); the distance estimated from the RSSI appended by the
+                # LoRa module sets the PWM
+                result = follower.handle_rcv(incoming, now)
+                # The leader's TDMA announcements and telemetry frames set the slot schedule
+                try:
+                    scheduler.observe(follower.packet, now)
+                except ValueError as e:
+                    # Announced frame too small for this boat: stay unscheduled rather than take another boat's slot
+                    print(f"TDMA schedule not usable: {e}")
+
+                if result == follower_logic.START:
+                    print("START command received! Entering ACTIVE state.")
+                    recorder.record(follower.state, flight_recorder.EVENT_COMMAND, pwm=follower.pwm)
+                elif result == follower_logic.STOP:
+                    print("STOP command received! Entering IDLE state.")
+                    # Stop motors immediately when STOP is received
+                    stop_motors()
+                    recorder.record(follower.state, flight_recorder.EVENT_COMMAND, pwm=follower.pwm)
+                elif result == follower_logic.REPEATED:
+                    log("repeated", "Command already received; acknowledging it again")
+                elif result == follower_logic.DUPLICATE:
+                    log("duplicate", f"Discarding stale/duplicate leader frame #{follower.rejected_seq}")
+                elif result == follower_logic.ASSIGNMENT:
+                    if follower.slot is None:
+                        log("slot", "No formation slot assigned; holding the default offset")
                     else:
-                        # Distance is within acceptable range, interpolate PWM
-                        print("Distance: OK")
-                        # Linear interpolation of PWM based on RSSI within the OK range
-                        # Ratio is 0 when RSSI = RSSI_CLOSE, 1 when RSSI = RSSI_FAR
-                        ratio = (RSSI_CLOSE - rssi) / (RSSI_CLOSE - RSSI_FAR)
-                        current_pwm = int(PWM_MIN + (PWM_MAX - PWM_MIN) * ratio)
-
-                    print(f"Adjusted PWM: {current_pwm}")
+                        back, right = follower.offset
+                        log("slot", f"Formation slot: {follower.formation} #{follower.slot} "
+                                    f"({back:.0f} m back, {right:+.0f} m to starboard)")
+                elif result == follower_logic.LEADER:
+                    frame = follower.leader_frame
+                    if frame is not None:
+                        # The leader position drives GPS formation keeping (see FollowerLogic.handle_rcv)
+                        # Age of the leader's GPS fix when it sent the frame (None without a fix)
+                        fix_status = f"{frame.fix_age:.1f} s" if frame.fix_age is not None else "no fix"
+                        log("position", f"Leader position: {frame.lat:.6f}, {frame.lon:.6f} (GPS fix age {fix_status})")
+                    recorder.record(follower.state, flight_recorder.EVENT_LEADER_FRAME,
+                                    leader_heading=follower.leader_heading, rssi=follower.rssi, pwm=follower.pwm,
+                                    left=motors.left, right=motors.right, seq=frame.seq if frame else 0)
+                    log("leader", f"Leader Heading: {follower.leader_heading:.2f}° | RSSI: {follower.rssi} dBm | "
+                                  f"Distance: {follower.distance:.1f} ± {follower.distance_variance ** 0.5:.1f} m | "
+                                  f"Adjusted PWM: {follower.pwm}")
+                    if follower.slot_error is not None:
+                        leader_range, leader_bearing = follower.leader_range_bearing
+                        ahead, starboard = follower.slot_error
+                        log("formation", f"GPS: leader {leader_range:.1f} m at {leader_bearing:.0f}° | "
+                                         f"Slot {ahead:+.1f} m ahead, {starboard:+.1f} m to starboard | "
+                                         f"Target Heading: {follower.target_heading:.2f}°")
+
+                # Acknowledge the command to its sender (after acting on it) in this boat's slot
+                if follower.ack is not None:
+                    scheduler.send(*follower.ack, now)
+                    follower.ack = None
 
             except ValueError as e:
                 # Handle errors during data parsing
@@ -240,42 +337,89 @@ try:
                 # Catch any other unexpected errors during processing
                 print(f"An unexpected error occurred: {e}")
 
+        # Pass each new GPS fix of this boat to the follower logic (GPS formation keeping)
+        fix, fix_age = gps.latest()
+        if fix is not None and fix is not last_fix:
+            last_fix = fix
+            fix_time = clock.monotonic() - fix_age
+            if inputs:
+                inputs.fix(fix_time, fix.latitude, fix.longitude)
+            follower.handle_fix(fix.latitude, fix.longitude, fix_time)
+
+        # Report this boat's position and slot to the leader (also a sign of life for the slot assignment)
+        now = clock.monotonic()
+        if now >= status_deadline:
+            fix, fix_age = gps.latest()
+            heading = compass.latest()[0]
+            status = telemetry.encode_follower(status_seq, fix.latitude if fix else 0.0, fix.longitude if fix else 0.0,
+                                               heading if heading is not None else 0.0, fix_age, follower.slot)
+            scheduler.send(BROADCAST_ADDR, status, now)
+            status_seq = (status_seq + 1) % telemetry.SEQ_MODULO
+            period = STATUS_FRAMES * scheduler.frame_period if scheduler.frame_period else STATUS_PERIOD
+            status_deadline = now + period
+
+        # Transmit the next queued frame if this boat's slot has room for it
+        outgoing = scheduler.poll(clock.monotonic())
+        if outgoing is not None:
+            lora.send_data(*outgoing)
+
+        # Only run the control step when it is due, so every PID step has the same dt
+        if not control_loop.tick():
+            continue
 
         # --- Heading Matching and Motor Control (only if ACTIVE and Leader data received) ---
-        # Only attempt to match heading if the boat is ACTIVE and we have a leader heading
-        if STATE == "ACTIVE" and last_leader_heading is not None:
-            # Read the follower boat's current heading
-            my_heading = read_heading()
-            # Calculate the difference between leader's heading and follower's heading
-            diff = last_leader_heading - my_heading
-
-            # Normalize the heading difference to be within -180 to +180 degrees
-            if diff > 180: diff -= 360
-            elif diff < -180: diff += 360
-
-            print(f"My Heading: {my_heading:.2f}° | Leader Heading: {last_leader_heading:.2f}° | Heading Difference: {diff:+.2f}°")
-            # Drive the motors based on the heading difference and calculated PWM speed
-            drive_motors(diff, current_pwm)
-
-        # Small delay in the main loop to prevent high CPU usage
-        time.sleep(0.5)
+        # Read the compass only when the follower is steering towards a leader heading
+        my_heading = read_heading() if follower.steering else None
+        if inputs:
+            inputs.tick(clock.monotonic(), my_heading)
+        # PID turn command towards the target heading, split into left/right thrust around the forward PWM;
+        # COAST when the compass has been stale for COMPASS_STALE_TIME (stop rather than steer blind)
+        command = follower.control_step(my_heading)
+        if command is follower_logic.COAST:
+            if motors.left or motors.right:
+                print("No compass heading: stopping the motors until it is back")
+                stop_motors()
+        elif command is not None:
+            left, right = command
+            log("heading", f"My Heading: {my_heading:.2f}° | Target Heading: {follower.target_heading:.2f}° | Heading Difference: {follower.diff:+.2f}° | Thrust L/R: {left}/{right}")
+            motors.drive(left, right)
+
+        # One flight recorder record per control step
+        recorder.record(follower.state, flight_recorder.EVENT_TICK, my_heading, follower.leader_heading,
+                        follower.rssi, follower.pwm, motors.left, motors.right)
 
 # --- Cleanup on Exit ---
 except KeyboardInterrupt:
     # Handle Ctrl+C to stop the script gracefully
     print("Stopping follower...")
-    # Stop the motors
+    print(f"Control loop: {control_loop.summary()}")
+    print(f"Motor driver: {motors.summary()}")
+    print(f"TDMA: {scheduler.summary()}")
+    print(f"GPS: {gps.summary()}")
+    # Stop the motors and the compass sampler, and flush the flight recorder
     stop_motors()
+    compass.stop()
+    gps.stop()
+    recorder.close()
+    if inputs:
+        inputs.close()
     # Stop the pigpio daemon connection
     pi.stop()
-    # Close the serial connection to the LoRa module
+    # Stop the LoRa reader thread and close the serial connection
+    lora.stop_receiver()
     lora.ser.close()
 except Exception as e:
     # Catch any other unexpected errors during execution
     print(f"An unexpected error caused the program to stop: {e}")
     # Attempt to clean up resources
     stop_motors()
+    compass.stop()
+    gps.stop()
+    recorder.close()
+    if inputs:
+        inputs.close()
     pi.stop()
+    lora.stop_receiver()
     if lora.ser and lora.ser.isOpen():
         lora.ser.close()
 
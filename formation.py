@@ -0,0 +1,126 @@
+import math
+
+# --- Leader-Relative Geometry ---
+# Positions are converted to a local east/north tangent plane (ENU, up is not
+# used) anchored at the first leader position of the session. The metres per
+# degree of latitude and longitude at the anchor are computed once (WGS-84
+# radii of curvature), so each conversion is two subtractions and two
+# multiplications. Within ANCHOR_RADIUS of the anchor the error of the
+# leader-follower vector is far below the GPS noise (a few cm per 100 m).
+# haversine() is the spherical great-circle reference (benchmarks/bench_formation.py).
+
+# WGS-84 semi-major axis in metres and first eccentricity squared
+WGS84_A = 6_378_137.0
+WGS84_E2 = 6.694379990141316e-3
+# Mean Earth radius in metres (haversine)
+EARTH_RADIUS = 6_371_008.8
+# Metres from the anchor after which the plane is re-anchored
+ANCHOR_RADIUS = 5000.0
+
+
+class LocalFrame:
+    """
+    East/north tangent plane around (lat0, lon0) in degrees.
+    """
+
+    def __init__(self, lat0, lon0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        lat = math.radians(lat0)
+        w = 1 - WGS84_E2 * math.sin(lat) ** 2
+        # Meridional and prime vertical radii of curvature at the anchor
+        meridian = WGS84_A * (1 - WGS84_E2) / w ** 1.5
+        normal = WGS84_A / math.sqrt(w)
+        self.north_per_deg = math.radians(1) * meridian
+        self.east_per_deg = math.radians(1) * normal * math.cos(lat)
+
+    def to_enu(self, lat, lon):
+        """
+        Returns (east, north) in metres of a position in degrees.
+        """
+        # Longitude difference wrapped to -180..180 (anchors near the antimeridian)
+        dlon = (lon - self.lon0 + 180) % 360 - 180
+        return dlon * self.east_per_deg, (lat - self.lat0) * self.north_per_deg
+
+    def contains(self, east, north):
+        """
+        True if (east, north) is close enough to the anchor for the plane to be accurate.
+        """
+        return east * east + north * north <= ANCHOR_RADIUS * ANCHOR_RADIUS
+
+
+def range_bearing(east, north):
+    """
+    Length in metres and compass bearing in degrees of an east/north vector.
+    """
+    return math.hypot(east, north), math.degrees(math.atan2(east, north)) % 360
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in metres and initial bearing in degrees from point 1 to point 2.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    distance = 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+    y = math.sin(dlambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return distance, math.degrees(math.atan2(y, x)) % 360
+
+
+def slot_error(follower, leader, leader_heading, back, right):
+    """
+    Where the follower's slot (`back` metres behind and `right` metres to
+    starboard of the leader, negative: to port) is relative to the follower,
+    as (ahead, starboard) in metres along the leader's heading. follower and
+    leader are (east, north) positions.
+    """
+    rad = math.radians(leader_heading)
+    # Unit vectors of the leader's forward and starboard directions in east/north
+    forward_e, forward_n = math.sin(rad), math.cos(rad)
+    starboard_e, starboard_n = forward_n, -forward_e
+    slot_e = leader[0] - back * forward_e + right * starboard_e
+    slot_n = leader[1] - back * forward_n + right * starboard_n
+    de, dn = slot_e - follower[0], slot_n - follower[1]
+    return de * forward_e + dn * forward_n, de * starboard_e + dn * starboard_n
+
+
+# --- Formation Geometries ---
+# Slots are (back, right) offsets from the leader in metres, as in slot_error():
+# `back` behind it along its heading, `right` to starboard (negative: to port).
+# Slot 0 is the one nearest the leader and each formation's slots are numbered
+# outwards, so the slots of a smaller swarm are the first ones of a larger one.
+#   line_abreast  side by side with the leader, alternately to starboard and port
+#   echelon       a diagonal line back and to starboard
+#   wedge         a V behind the leader, alternately on the starboard and port arm
+#   column        in line astern
+# Slot assignment frames carry the formation as its index in FORMATIONS.
+FORMATIONS = ("line_abreast", "echelon", "wedge", "column")
+# Default distance between neighbouring slots in metres (along each axis)
+SLOT_SPACING = 10.0
+
+
+def slot_offset(formation, slot, spacing=SLOT_SPACING):
+    """
+    (back, right) offset in metres of slot number `slot` of a formation.
+    """
+    # Rank of the slot on its side and the side (1: starboard, -1: port) for the two-sided formations
+    rank, side = slot // 2 + 1, 1 if slot % 2 == 0 else -1
+    if formation == "line_abreast":
+        return 0.0, side * rank * spacing
+    if formation == "echelon":
+        return (slot + 1) * spacing, (slot + 1) * spacing
+    if formation == "wedge":
+        return rank * spacing, side * rank * spacing
+    if formation == "column":
+        return (slot + 1) * spacing, 0.0
+    raise ValueError(f"unknown formation {formation!r}")
+
+
+def slot_offsets(formation, count, spacing=SLOT_SPACING):
+    """
+    (back, right) offsets of the first `count` slots of a formation.
+    """
+    return [slot_offset(formation, slot, spacing) for slot in range(count)]
@@ -0,0 +1,225 @@
+import math
+
+import formation
+import telemetry
+
+# --- Formation Slot Assignment ---
+# The leader gives every follower it hears a slot of the current formation
+# (formation.FORMATIONS) and broadcasts the assignment. Followers report their
+# position and the slot they hold in status frames (telemetry.MSG_FOLLOWER);
+# one that has not been heard for the leader's timeout drops out.
+#
+# A full assignment (at START, or when the formation changes) minimises the
+# total distance the followers travel to their slots: the Hungarian method in
+# its shortest augmenting path form (Jonker-Volgenant style: column reduction
+# assigns most followers up front, then one Dijkstra search over reduced costs
+# per remaining follower, O(n^3) worst case). 50 followers take about 4 ms on a
+# laptop. The search scans one short row per step, so it runs in plain Python:
+# a NumPy-vectorised version spends more on per-call overhead than it saves
+# and is slower up to 100 followers (benchmarks/bench_formation_planner.py),
+# and the boats do not need numpy.
+#
+# When a follower drops out or joins, the others keep their slots: with one
+# slot per follower the formation loses or gains its outermost slot, and only
+# the followers without a slot (new ones, and the one that held a removed slot)
+# are assigned to the free slots, again by minimum travel. Nobody else moves,
+# so the formation does not reshuffle every time a boat is lost.
+
+# Formation flown until set_formation() is called
+DEFAULT_FORMATION = "wedge"
+
+
+def hungarian(cost):
+    """
+    Minimum-cost assignment of the rows of `cost` (n lists of m costs, n <= m)
+    to distinct columns. Returns the column index of each row.
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    if n > m:
+        raise ValueError(f"cannot assign {n} rows to {m} columns")
+    # Row and column potentials (reduced cost: cost[i][j] - u[i] - v[j] >= 0, 0 on assigned pairs)
+    u = [0.0] * n
+    v = [0.0] * m
+    col4row = [-1] * n
+    row4col = [-1] * m
+    if n == m:
+        # Column reduction: each column's cheapest row takes it if that row is still free
+        for j in range(m):
+            i = min(range(n), key=lambda i: cost[i][j])
+            v[j] = cost[i][j]
+            if col4row[i] < 0:
+                col4row[i], row4col[j] = j, i
+    path = [0] * m
+    for start in range(n):
+        if col4row[start] >= 0:
+            continue
+        # Dijkstra from the free row over reduced costs until a free column is reached
+        shortest = [math.inf] * m
+        remaining = list(range(m))
+        rows, columns = [start], []
+        row, lowest = start, 0.0
+        while True:
+            base = lowest - u[row]
+            costs = cost[row]
+            lowest, index = math.inf, -1
+            for k, j in enumerate(remaining):
+                reduced = base + costs[j] - v[j]
+                if reduced < shortest[j]:
+                    path[j] = row
+                    shortest[j] = reduced
+                # On ties prefer a free column: it ends the search
+                if shortest[j] < lowest or (shortest[j] == lowest and row4col[j] < 0):
+                    lowest, index = shortest[j], k
+            column = remaining.pop(index)
+            columns.append(column)
+            if row4col[column] < 0:
+                break
+            row = row4col[column]
+            rows.append(row)
+        # Update the potentials of the rows and columns reached, then augment along the path
+        u[start] += lowest
+        for row in rows[1:]:
+            u[row] += lowest - shortest[col4row[row]]
+        for j in columns:
+            v[j] -= lowest - shortest[j]
+        while True:
+            row = path[column]
+            row4col[column] = row
+            col4row[row], column = column, col4row[row]
+            if row == start:
+                break
+    return col4row
+
+
+def slot_positions(leader, heading, offsets):
+    """
+    (east, north) positions of (back, right) slot offsets behind a leader at
+    `leader` (east, north) steering `heading` degrees.
+    """
+    rad = math.radians(heading)
+    forward_e, forward_n = math.sin(rad), math.cos(rad)
+    return [(leader[0] - back * forward_e + right * forward_n, leader[1] - back * forward_n - right * forward_e)
+            for back, right in offsets]
+
+
+def travel_costs(positions, slots):
+    """
+    Distances in metres from each position (rows; None if unknown) to each slot
+    (columns). A follower without a position costs the same for every slot.
+    """
+    return [[0.0] * len(slots) if p is None else [math.hypot(p[0] - e, p[1] - n) for e, n in slots]
+            for p in positions]
+
+
+class SlotPlanner:
+    """
+    Followers heard by the leader, their positions and their formation slots.
+    Call observe() for every packet from a follower, expire() and plan()
+    regularly, and broadcast frames() whenever plan() changed the assignment
+    (or unconfirmed() is not empty).
+    """
+
+    def __init__(self, leader_address, formation_name=DEFAULT_FORMATION, spacing=formation.SLOT_SPACING):
+        self.leader_address = leader_address
+        self.formation = None
+        self.spacing = spacing
+        self.set_formation(formation_name, spacing)
+        # address -> slot index
+        self.assignment = {}
+        # Assignment number sent with the frames, incremented on every change
+        self.epoch = 0
+        # address -> [last heard (monotonic s), (lat, lon) or None, slot it reported or None]
+        self.followers = {}
+        self.full_solves = 0
+        self.repairs = 0
+
+    def set_formation(self, formation_name, spacing=None):
+        """
+        Switches formation; the next plan() assigns all slots from scratch.
+        """
+        if formation_name not in formation.FORMATIONS:
+            raise ValueError(f"unknown formation {formation_name!r}")
+        self.formation = formation_name
+        if spacing is not None:
+            self.spacing = spacing
+        self.assignment = {}
+
+    def observe(self, address, now, status=None):
+        """
+        Records a packet from a follower; status is its decoded FollowerStatus, if it was one.
+        """
+        entry = self.followers.setdefault(address, [now, None, None])
+        entry[0] = now
+        if status is not None:
+            entry[1] = (status.lat, status.lon) if status.fix_age is not None else None
+            entry[2] = status.slot
+
+    def expire(self, now, timeout):
+        """
+        Forgets the followers not heard for `timeout` seconds and returns their addresses.
+        """
+        dropped = sorted(a for a, (seen, _, _) in self.followers.items() if now - seen > timeout)
+        for address in dropped:
+            del self.followers[address]
+        return dropped
+
+    def plan(self, leader_lat=None, leader_lon=None, heading=0.0, full=False):
+        """
+        Updates the assignment for the current followers, from the leader's
+        position and heading (all followers cost the same without a leader
+        fix). full=True reassigns every slot. Returns True if it changed.
+        """
+        addresses = sorted(self.followers)
+        count = len(addresses)
+        if full or not self.assignment:
+            kept = {}
+        else:
+            kept = {a: s for a, s in self.assignment.items() if a in self.followers and s < count}
+        orphans = [a for a in addresses if a not in kept]
+        if orphans:
+            free = sorted(set(range(count)) - set(kept.values()))
+            if leader_lat is None:
+                # No slot positions to measure travel to: fill the free slots in address order
+                kept.update(zip(orphans, free))
+            else:
+                plane = formation.LocalFrame(leader_lat, leader_lon)
+                positions = [None if self.followers[a][1] is None else plane.to_enu(*self.followers[a][1])
+                             for a in orphans]
+                offsets = [formation.slot_offset(self.formation, slot, self.spacing) for slot in free]
+                columns = hungarian(travel_costs(positions, slot_positions((0.0, 0.0), heading, offsets)))
+                kept.update((a, free[c]) for a, c in zip(orphans, columns))
+            if len(orphans) == count:
+                self.full_solves += 1
+            else:
+                self.repairs += 1
+        if kept == self.assignment:
+            return False
+        self.assignment = kept
+        self.epoch = (self.epoch + 1) % 256
+        return True
+
+    def unconfirmed(self):
+        """
+        Followers whose last status frame reported a different slot than the one assigned.
+        """
+        return sorted(a for a, slot in self.assignment.items() if self.followers[a][2] != slot)
+
+    def frames(self):
+        """
+        Slot assignment payloads (telemetry.encode_assignment) covering every follower with a slot.
+        """
+        if not self.assignment:
+            return []
+        indices = {address - self.leader_address - 1: slot for address, slot in self.assignment.items()}
+        code = formation.FORMATIONS.index(self.formation)
+        payloads = []
+        for first in range(0, max(indices) + 1, telemetry.ASSIGNMENT_SLOTS):
+            slots = [indices.get(i) for i in range(first, min(first + telemetry.ASSIGNMENT_SLOTS, max(indices) + 1))]
+            if any(slot is not None for slot in slots):
+                payloads.append(telemetry.encode_assignment(self.epoch, code, self.spacing, first, slots))
+        return payloads
+
+    def summary(self):
+        slots = ", ".join(f"{a}: {s}" for a, s in sorted(self.assignment.items()))
+        return f"{self.formation} #{self.epoch} ({len(self.assignment)} followers) {slots}"
@@ -0,0 +1,227 @@
+import threading
+from collections import namedtuple
+
+import hardware
+
+# --- Streaming NMEA GPS Reader ---
+# The GPS module is read through a pigpio bit-banged UART. A background thread
+# feeds the raw bytes into an incremental NMEA framer and keeps the latest valid
+# $GPRMC fix in a slot the control loop can read at any time.
+
+# Default GPIO pins and baud rate of the GPS module
+GPS_TX = 27  # GPS TX -> Pi RX
+GPS_RX = 22  # Pi TX -> GPS RX
+BAUD = 9600
+
+# Commands that disable every NMEA sentence except $GPRMC (u-blox PUBX,40)
+RMC_ONLY_COMMANDS = [
+    "$PUBX,40,GGA,0,0,0,0*5A",
+    "$PUBX,40,GLL,0,0,0,0*5C",
+    "$PUBX,40,VTG,0,0,0,0*5E",
+    "$PUBX,40,GSA,0,0,0,0*4E",
+    "$PUBX,40,GSV,0,0,0,0*59",
+]
+
+# A decoded RMC fix
+GpsFix = namedtuple("GpsFix", "time date latitude longitude speed_knots heading")
+
+
+def nmea_checksum(body):
+    """
+    XOR of all characters between '$' and '*' (body is bytes).
+    """
+    checksum = 0
+    for byte in body:
+        checksum ^= byte
+    return checksum
+
+
+class NmeaFramer:
+    """
+    Splits a byte stream into checksum-validated NMEA sentences. Each byte is
+    scanned once and consumed bytes are dropped once per feed(), so the cost
+    stays constant per byte however far the reader falls behind.
+    """
+    # Longest sentence we keep waiting for (the NMEA limit is 82 characters)
+    MAX_SENTENCE = 128
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.bad_checksums = 0
+
+    def feed(self, data):
+        """
+        Adds raw bytes and returns the complete valid sentences (str, without checksum).
+        """
+        buffer = self.buffer
+        # Only the new bytes can contain a line end: the old ones were scanned already
+        scan = len(buffer)
+        buffer += data
+        sentences = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", scan)
+            if end < 0:
+                break
+            sentence = self._validate(buffer, start, end)
+            if sentence is not None:
+                sentences.append(sentence)
+            start = scan = end + 1
+        del buffer[:start]
+        # Noise without line ends: resynchronise instead of growing forever
+        if len(buffer) > self.MAX_SENTENCE:
+            del buffer[:]
+        return sentences
+
+    def _validate(self, buffer, start, end):
+        # The sentence starts at the last '$' of the line (skips noise before it)
+        dollar = buffer.rfind(b"$", start, end)
+        star = buffer.rfind(b"*", start, end)
+        if dollar < 0 or star < dollar or end - star < 3:
+            return None
+        try:
+            expected = int(buffer[star + 1:star + 3], 16)
+        except ValueError:
+            self.bad_checksums += 1
+            return None
+        if nmea_checksum(buffer[dollar + 1:star]) != expected:
+            self.bad_checksums += 1
+            return None
+        return buffer[dollar:star].decode("ascii", errors="ignore")
+
+
+# Convert ddmm.mmmm to decimal degrees
+def convert(coord, direction):
+    if not coord or not direction:
+        return None
+    deg_len = 2 if direction in ['N', 'S'] else 3
+    degrees = float(coord[:deg_len])
+    minutes = float(coord[deg_len:])
+    decimal = degrees + minutes / 60
+    if direction in ['S', 'W']:
+        decimal *= -1
+    return decimal
+
+
+def parse_rmc(sentence):
+    """
+    Parses a $GPRMC / $GNRMC sentence. Returns a GpsFix, or None if it is not
+    an RMC sentence or the receiver has no fix.
+    """
+    fields = sentence.split(',')
+    if len(fields) < 10 or fields[0] not in ("$GPRMC", "$GNRMC") or fields[2] != 'A':
+        return None  # No fix or bad sentence
+
+    # Time and date
+    hhmmss = fields[1]
+    ddmmyy = fields[9]
+    time_str = f"{hhmmss[:2]}:{hhmmss[2:4]}:{hhmmss[4:6]}"
+    date_str = f"{ddmmyy[:2]}/{ddmmyy[2:4]}/20{ddmmyy[4:]}"
+
+    # Lat/Lon, speed, heading
+    lat = convert(fields[3], fields[4])
+    lon = convert(fields[5], fields[6])
+    if lat is None or lon is None:
+        return None
+    speed = float(fields[7]) if fields[7] else 0.0
+    heading = float(fields[8]) if fields[8] else 0.0
+
+    return GpsFix(time_str, date_str, lat, lon, speed, heading)
+
+
+def send_nmea_command(pi, cmd, tx_gpio=GPS_RX, baud=BAUD, clock=hardware.clock):
+    """
+    Sends an NMEA configuration sentence to the GPS over the software UART.
+    Returns False if the waveform could not be created.
+    """
+    pi.wave_clear()
+    pi.wave_add_serial(tx_gpio, baud, (cmd + '\r\n').encode())
+    wid = pi.wave_create()
+    if wid < 0:
+        return False
+    pi.wave_send_once(wid)
+    while pi.wave_tx_busy():
+        clock.sleep(0.01)
+    pi.wave_delete(wid)
+    return True
+
+
+class GpsReader:
+    """
+    Background reader of the bit-banged GPS UART that keeps the latest fix.
+    """
+
+    def __init__(self, pi, rx_gpio=GPS_TX, tx_gpio=GPS_RX, baud=BAUD, poll_period=0.05,
+                 clock=hardware.clock):
+        self.pi = pi
+        self.rx_gpio = rx_gpio
+        self.tx_gpio = tx_gpio
+        self.baud = baud
+        self.poll_period = poll_period
+        self.clock = clock
+        self.framer = NmeaFramer()
+        # (latest fix, monotonic time it was received), replaced atomically
+        self._latest = (None, None)
+        self.sentences = 0
+        # Sentences with a valid checksum that parse_rmc() could not read (e.g. a garbled number)
+        self.bad_sentences = 0
+        self.last_error = None
+        self.running = False
+        self.thread = None
+
+    def configure(self):
+        """
+        Turns off every sentence except $GPRMC.
+        """
+        self.pi.set_mode(self.tx_gpio, hardware.OUTPUT)
+        for cmd in RMC_ONLY_COMMANDS:
+            if not send_nmea_command(self.pi, cmd, self.tx_gpio, self.baud, self.clock):
+                print(f"Failed to send GPS command {cmd}")
+
+    def start(self):
+        """
+        Opens the software UART and starts the reader thread.
+        """
+        self.pi.bb_serial_read_open(self.rx_gpio, self.baud)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the reader thread and closes the software UART.
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        self.pi.bb_serial_read_close(self.rx_gpio)
+
+    def _run(self):
+        while self.running:
+            count, data = self.pi.bb_serial_read(self.rx_gpio)
+            if count > 0:
+                for sentence in self.framer.feed(data):
+                    self.sentences += 1
+                    try:
+                        fix = parse_rmc(sentence)
+                    except ValueError as e:
+                        # Skip the sentence: an exception here would end the thread and the fix would just age
+                        self.bad_sentences += 1
+                        self.last_error = e
+                        continue
+                    if fix is not None:
+                        self._latest = (fix, self.clock.monotonic())
+            self.clock.sleep(self.poll_period)
+
+    def summary(self):
+        return (f"{self.sentences} sentences, {self.framer.bad_checksums} bad checksums, "
+                f"{self.bad_sentences} unreadable (last: {self.last_error})")
+
+    def latest(self):
+        """
+        Returns (latest fix, its age in seconds), or (None, None) before the first fix.
+        """
+        fix, received_at = self._latest
+        if fix is None:
+            return None, None
+        return fix, self.clock.monotonic() - received_at
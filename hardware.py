@@ -0,0 +1,518 @@
+import array
+import fcntl
+import math
+import os
+import random
+import select
+import socket
+import termios
+import threading
+import time
+
+import telemetry
+
+# --- Backend Selection ---
+# BOAT_HARDWARE=real (default) talks to pigpio, the I2C bus and the LoRa UART.
+# BOAT_HARDWARE=fake runs the boat scripts against in-process fakes driven by a
+# virtual clock, so a whole session can run on any Linux box.
+BACKEND = os.environ.get("BOAT_HARDWARE", "real")
+# How many times faster than real time the virtual clock runs (fake backend only)
+CLOCK_SPEED = float(os.environ.get("BOAT_CLOCK_SPEED", "1"))
+# Directory holding one Unix datagram socket per fake LoRa module (the shared "air")
+FAKE_LORA_DIR = os.environ.get("BOAT_FAKE_LORA_DIR", "/tmp/boat_fake_lora")
+# RSSI and SNR reported by fake LoRa modules for every received packet
+FAKE_RSSI = int(os.environ.get("BOAT_FAKE_RSSI", "-60"))
+FAKE_SNR = int(os.environ.get("BOAT_FAKE_SNR", "9"))
+# Probability that a fake LoRa module misses a packet sent to it (0 = perfect channel)
+FAKE_LOSS = float(os.environ.get("BOAT_FAKE_LORA_LOSS", "0"))
+
+# pigpio GPIO modes (same values as pigpio.INPUT / pigpio.OUTPUT)
+INPUT = 0
+OUTPUT = 1
+
+try:
+    from serial import SerialException
+except ImportError:
+    # pyserial is only needed by the real backend; the fake one raises this instead
+    class SerialException(OSError):
+        pass
+
+
+# --- Clocks ---
+# Scripts use clock.monotonic() and clock.sleep() instead of the time module so the
+# fake backend can run them faster than real time.
+class RealClock:
+    speed = 1.0
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    # Convert a duration in clock seconds to real seconds (for blocking waits)
+    def to_real(self, seconds):
+        return seconds
+
+
+class VirtualClock:
+    def __init__(self, speed):
+        self.speed = speed
+        self._start = time.monotonic()
+
+    def monotonic(self):
+        return self._start + (time.monotonic() - self._start) * self.speed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def to_real(self, seconds):
+        return seconds / self.speed
+
+
+clock = RealClock() if BACKEND == "real" else VirtualClock(CLOCK_SPEED)
+
+
+# --- Fake Boat Model ---
+# GPIO pins of the TB6612FNG motor driver on the boats (see leaderboat.py / followerboat.py)
+FAKE_MOTOR_PINS = {"AIN1": 5, "AIN2": 10, "BIN1": 13, "BIN2": 19, "PWMA": 9, "PWMB": 26, "STBY": 6}
+
+
+class FakeBoat:
+    """
+    Very small hull model shared by the fake motor driver, compass and GPS:
+    heading rate follows the thrust difference between the motors and speed
+    follows their average.
+    """
+    # Turn rate in degrees per second with one motor full forward and the other full reverse
+    MAX_TURN_RATE = 90.0
+    # Speed in metres per second with both motors at full duty
+    MAX_SPEED = 2.0
+    METRES_PER_DEG_LAT = 111_320.0
+
+    def __init__(self, clock, heading=0.0, lat=43.138460, lon=-75.232241, pins=FAKE_MOTOR_PINS):
+        self.clock = clock
+        self.heading = heading
+        self.lat = lat
+        self.lon = lon
+        self.pins = pins
+        self.levels = {}
+        self.duty = {}
+        self.last_update = clock.monotonic()
+        self.lock = threading.Lock()
+
+    # Signed thrust of one motor in -1..1 from its direction pins and PWM duty cycle
+    def _thrust(self, in1, in2, pwm):
+        if not self.levels.get(self.pins["STBY"]):
+            return 0.0
+        forward = self.levels.get(self.pins[in1], 0)
+        reverse = self.levels.get(self.pins[in2], 0)
+        direction = 1 if forward and not reverse else -1 if reverse and not forward else 0
+        return direction * self.duty.get(self.pins[pwm], 0) / 255
+
+    # Advance the model to the current clock time
+    def update(self):
+        with self.lock:
+            now = self.clock.monotonic()
+            dt = now - self.last_update
+            self.last_update = now
+            left = self._thrust("AIN1", "AIN2", "PWMA")
+            right = self._thrust("BIN1", "BIN2", "PWMB")
+            self.heading = (self.heading + self.MAX_TURN_RATE * (left - right) / 2 * dt) % 360
+            distance = self.MAX_SPEED * (left + right) / 2 * dt
+            rad = math.radians(self.heading)
+            self.lat += distance * math.cos(rad) / self.METRES_PER_DEG_LAT
+            self.lon += distance * math.sin(rad) / (self.METRES_PER_DEG_LAT * math.cos(math.radians(self.lat)))
+
+
+# --- Fake pigpio ---
+class FakePi:
+    """
+    Stand-in for pigpio.pi() that drives the FakeBoat model. Counts every
+    call so actuation cost can be compared between versions of the code.
+    """
+    def __init__(self, boat):
+        self.boat = boat
+        self.connected = True
+        self.calls = 0
+
+    def set_mode(self, gpio, mode):
+        self.calls += 1
+        return 0
+
+    def write(self, gpio, level):
+        self.calls += 1
+        self.boat.update()
+        self.boat.levels[gpio] = 1 if level else 0
+        return 0
+
+    def read(self, gpio):
+        self.calls += 1
+        return self.boat.levels.get(gpio, 0)
+
+    # Bank writes change every pin in the mask at once (GPIO 0-31)
+    def set_bank_1(self, bits):
+        self._write_bank(bits, 1)
+        return 0
+
+    def clear_bank_1(self, bits):
+        self._write_bank(bits, 0)
+        return 0
+
+    def _write_bank(self, bits, level):
+        self.calls += 1
+        self.boat.update()
+        for gpio in range(32):
+            if bits & (1 << gpio):
+                self.boat.levels[gpio] = level
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        self.calls += 1
+        self.boat.update()
+        self.boat.duty[user_gpio] = dutycycle
+        return 0
+
+    def get_PWM_dutycycle(self, user_gpio):
+        self.calls += 1
+        return self.boat.duty.get(user_gpio, 0)
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        self.calls += 1
+        return frequency
+
+    # Bit-banged serial input: a GPS sending one $GPRMC sentence per second
+    def bb_serial_read_open(self, user_gpio, baud, data_bits=8):
+        self.gps_next_fix = self.boat.clock.monotonic()
+        return 0
+
+    def bb_serial_read(self, user_gpio):
+        data = bytearray()
+        now = self.boat.clock.monotonic()
+        while now >= self.gps_next_fix:
+            self.boat.update()
+            data += fake_gprmc(self.boat.lat, self.boat.lon, self.boat.heading)
+            self.gps_next_fix += FAKE_GPS_PERIOD
+        return len(data), data
+
+    def bb_serial_read_close(self, user_gpio):
+        return 0
+
+    # Waveforms are only used to send configuration to the GPS; accept and drop them
+    def wave_clear(self):
+        return 0
+
+    def wave_add_serial(self, user_gpio, baud, data, offset=0, bb_bits=8, bb_stop=2):
+        return len(data)
+
+    def wave_create(self):
+        return 0
+
+    def wave_send_once(self, wave_id):
+        return 0
+
+    def wave_tx_busy(self):
+        return 0
+
+    def wave_delete(self, wave_id):
+        return 0
+
+    def stop(self):
+        self.connected = False
+
+
+# --- Fake GPS ---
+FAKE_GPS_PERIOD = 1.0
+
+
+def fake_gprmc(lat, lon, heading):
+    """
+    Builds a valid $GPRMC sentence (with checksum) for the given position.
+    """
+    def ddmm(value, degree_digits):
+        value = abs(value)
+        degrees = int(value)
+        return f"{degrees:0{degree_digits}d}{(value - degrees) * 60:07.4f}"
+
+    t = time.gmtime()
+    body = (f"GPRMC,{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}.00,A,"
+            f"{ddmm(lat, 2)},{'N' if lat >= 0 else 'S'},{ddmm(lon, 3)},{'E' if lon >= 0 else 'W'},"
+            f"0.0,{heading:.1f},{t.tm_mday:02d}{t.tm_mon:02d}{t.tm_year % 100:02d},,,A")
+    checksum = 0
+    for char in body.encode():
+        checksum ^= char
+    return f"${body}*{checksum:02X}\r\n".encode()
+
+
+# --- Fake I2C Bus (HMC5883L) ---
+HMC5883L_ADDR = 0x1E
+HMC5883L_DATA_REG = 0x03
+# Horizontal field strength reported by the fake compass, in raw counts
+FAKE_FIELD = 400
+
+
+class FakeSMBus:
+    """
+    Stand-in for smbus2.SMBus with an HMC5883L whose X/Y readings follow the
+    FakeBoat heading.
+    """
+    def __init__(self, boat):
+        self.boat = boat
+        self.registers = {}
+
+    def write_byte_data(self, i2c_addr, register, value):
+        self.registers[(i2c_addr, register)] = value
+
+    def read_byte_data(self, i2c_addr, register):
+        return self.registers.get((i2c_addr, register), 0)
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        if i2c_addr != HMC5883L_ADDR or register != HMC5883L_DATA_REG:
+            raise OSError(f"no fake device at 0x{i2c_addr:02X} register 0x{register:02X}")
+        self.boat.update()
+        rad = math.radians(self.boat.heading)
+        x = round(FAKE_FIELD * math.cos(rad))
+        y = round(FAKE_FIELD * math.sin(rad))
+        # Data registers are X, Z, Y as big endian two's complement
+        data = []
+        for value in (x, 0, y):
+            value &= 0xFFFF
+            data += [value >> 8, value & 0xFF]
+        return data[:length]
+
+    def close(self):
+        pass
+
+
+# --- Fake Serial Port (RYLR896) ---
+class FakeSerial:
+    """
+    Stand-in for serial.Serial connected to an emulated RYLR896. AT commands
+    are answered like the real module; AT+SEND delivers the payload, after the
+    packet's airtime, to the other fake modules through Unix datagram sockets
+    in FAKE_LORA_DIR (address 0 reaches every module on the network).
+    """
+    def __init__(self, port, baudrate=115200, timeout=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.address = 0
+        self.network_id = 0
+        self.parameters = "12,7,1,4"
+        self.is_open = True
+        self._rfd, self._wfd = os.pipe()
+        self._pending = bytearray()
+        self._sock = None
+        self._sock_path = None
+        self._sock_lock = threading.Lock()
+        os.makedirs(FAKE_LORA_DIR, exist_ok=True)
+        threading.Thread(target=self._air_loop, daemon=True).start()
+
+    # --- serial.Serial interface ---
+    def fileno(self):
+        return self._rfd
+
+    @property
+    def in_waiting(self):
+        # Number of bytes buffered in the pipe
+        count = array.array("i", [0])
+        fcntl.ioctl(self._rfd, termios.FIONREAD, count)
+        return count[0]
+
+    def _wait_readable(self, deadline):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        ready, _, _ = select.select([self._rfd], [], [], timeout)
+        return bool(ready)
+
+    def _deadline(self):
+        return None if self.timeout is None else time.monotonic() + clock.to_real(self.timeout)
+
+    def read(self, size=1):
+        deadline = self._deadline()
+        data = bytearray()
+        while len(data) < size and self._wait_readable(deadline):
+            data += os.read(self._rfd, size - len(data))
+        return bytes(data)
+
+    def readline(self):
+        deadline = self._deadline()
+        line = bytearray()
+        while not line.endswith(b"\n") and self._wait_readable(deadline):
+            line += os.read(self._rfd, 1)
+        return bytes(line)
+
+    def write(self, data):
+        self._pending += data
+        while True:
+            end = self._pending.find(b"\r\n")
+            if end < 0:
+                break
+            command = self._pending[:end].decode(errors="ignore")
+            del self._pending[:end + 2]
+            self._handle_command(command)
+        return len(data)
+
+    def reset_input_buffer(self):
+        while select.select([self._rfd], [], [], 0)[0]:
+            os.read(self._rfd, 4096)
+
+    def isOpen(self):
+        return self.is_open
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        with self._sock_lock:
+            self._unbind()
+        os.close(self._wfd)
+        os.close(self._rfd)
+
+    # --- RYLR896 emulation ---
+    def _respond(self, line):
+        if self.is_open:
+            os.write(self._wfd, (line + "\r\n").encode())
+
+    def _handle_command(self, command):
+        name, _, value = command.partition("=")
+        if command == "AT":
+            self._respond("+OK")
+        elif name == "AT+ADDRESS" and value:
+            self.address = int(value)
+            with self._sock_lock:
+                self._bind()
+            self._respond("+OK")
+        elif command == "AT+ADDRESS?":
+            self._respond(f"+ADDRESS={self.address}")
+        elif name == "AT+NETWORKID" and value:
+            self.network_id = int(value)
+            self._respond("+OK")
+        elif command == "AT+NETWORKID?":
+            self._respond(f"+NETWORKID={self.network_id}")
+        elif name == "AT+PARAMETER" and value:
+            self.parameters = value
+            self._respond("+OK")
+        elif command == "AT+PARAMETER?":
+            self._respond(f"+PARAMETER={self.parameters}")
+        elif command == "AT+RESET":
+            self._respond("+RESET")
+            # The module comes back after a short reboot
+            threading.Timer(clock.to_real(0.05), self._respond, ("+READY",)).start()
+        elif name == "AT+SEND" and value:
+            try:
+                dest, length, payload = value.split(",", 2)
+                dest, length = int(dest), int(length)
+            except ValueError:
+                self._respond("+ERR=2")
+                return
+            if length != len(payload):
+                self._respond("+ERR=5")
+                return
+            self._respond("+OK")
+            # Deliver once the packet has been "on air" for its LoRa airtime
+            sf = int(self.parameters.split(",")[0])
+            airtime = telemetry.lora_airtime(length, sf=sf)
+            threading.Timer(clock.to_real(airtime), self._transmit, (dest, payload)).start()
+        else:
+            self._respond("+ERR=4")
+
+    def _bind(self):
+        self._unbind()
+        path = os.path.join(FAKE_LORA_DIR, f"{self.address}.sock")
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        self._sock, self._sock_path = sock, path
+
+    def _unbind(self):
+        if self._sock is not None:
+            self._sock.close()
+            try:
+                os.unlink(self._sock_path)
+            except FileNotFoundError:
+                pass
+            self._sock = self._sock_path = None
+
+    def _transmit(self, dest, payload):
+        datagram = f"{self.network_id},{self.address},{payload}".encode()
+        if dest == 0:
+            targets = [os.path.join(FAKE_LORA_DIR, name) for name in os.listdir(FAKE_LORA_DIR)
+                       if name.endswith(".sock") and name != f"{self.address}.sock"]
+        else:
+            targets = [os.path.join(FAKE_LORA_DIR, f"{dest}.sock")]
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            for target in targets:
+                try:
+                    sock.sendto(datagram, target)
+                except OSError:
+                    # Nobody listening at that address (module off or out of range)
+                    pass
+
+    # Background thread: turn datagrams from other fake modules into +RCV= lines
+    def _air_loop(self):
+        while self.is_open:
+            sock = self._sock
+            if sock is None:
+                time.sleep(0.01)
+                continue
+            try:
+                ready, _, _ = select.select([sock], [], [], 0.1)
+                if not ready:
+                    continue
+                datagram = sock.recv(512).decode(errors="ignore")
+            except (OSError, ValueError):
+                # Socket was closed or rebound under us
+                continue
+            network_id, sender, payload = datagram.split(",", 2)
+            if int(network_id) != self.network_id or random.random() < FAKE_LOSS:
+                continue
+            self._respond(f"+RCV={sender},{len(payload)},{payload},{FAKE_RSSI},{FAKE_SNR}")
+
+
+# --- Backend Factories ---
+_fake_boat = None
+
+
+def fake_boat():
+    """
+    Returns the FakeBoat shared by all fake devices in this process.
+    """
+    global _fake_boat
+    if _fake_boat is None:
+        _fake_boat = FakeBoat(clock)
+    return _fake_boat
+
+
+def open_pigpio():
+    """
+    Returns a connection to the pigpio daemon, or a FakePi.
+    """
+    if BACKEND == "fake":
+        return FakePi(fake_boat())
+    import pigpio
+    pi = pigpio.pi()
+    if not pi.connected:
+        raise RuntimeError("Could not connect to pigpio daemon")
+    return pi
+
+
+def open_i2c_bus(bus_number):
+    """
+    Returns an smbus2.SMBus for the given bus, or a FakeSMBus.
+    """
+    if BACKEND == "fake":
+        return FakeSMBus(fake_boat())
+    import smbus2
+    return smbus2.SMBus(bus_number)
+
+
+def open_serial(port, baudrate, timeout=None):
+    """
+    Returns a serial.Serial for the given port, or a FakeSerial (emulated RYLR896).
+    """
+    if BACKEND == "fake":
+        return FakeSerial(port, baudrate, timeout=timeout)
+    import serial
+    return serial.Serial(port, baudrate, timeout=timeout)
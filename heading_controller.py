@@ -0,0 +1,155 @@
+import math
+from array import array
+
+import follower_control
+import hardware
+
+# --- PID Heading Controller ---
+# Steers a follower towards a target heading with proportional differential
+# thrust: both motors keep the forward PWM and the PID output is added to one side
+# and taken from the other, so the boat turns while it keeps moving instead of
+# spinning in place. Runs at a fixed rate (see LoopTimer) so every step has the
+# same dt, and reports the loop jitter so the rate can be checked on the Pi.
+
+# Default control rate in Hz
+CONTROL_RATE = 20
+
+# PID gains: PWM counts of differential thrust per degree of heading error,
+# per degree-second of accumulated error, and per degree/second of turn rate
+KP = 4.0
+KI = 0.3
+KD = 0.2
+# Limit of the differential thrust in PWM counts (half the difference between the motors)
+TURN_LIMIT = 160
+# Limit of the integral term contribution in PWM counts
+INTEGRAL_LIMIT = 40
+# Highest duty cycle a motor is driven at (pigpio range is 0-255)
+PWM_LIMIT = 255
+
+
+def differential_thrust(base_pwm, turn, pwm_limit=PWM_LIMIT):
+    """
+    Splits a forward PWM and a turn command into signed (left, right) duty
+    cycles; a positive turn steers to starboard. If one side would exceed
+    pwm_limit both sides are shifted down, so the turn is kept and forward
+    speed gives way. Negative values mean reverse.
+    """
+    left = base_pwm + turn
+    right = base_pwm - turn
+    excess = max(left, right) - pwm_limit
+    if excess > 0:
+        left -= excess
+        right -= excess
+    left = max(-pwm_limit, min(pwm_limit, left))
+    right = max(-pwm_limit, min(pwm_limit, right))
+    return int(round(left)), int(round(right))
+
+
+class HeadingPID:
+    """
+    PID on the wrapped heading error with anti-windup. The derivative acts on
+    the measured heading, so a jump of the leader heading does not kick the motors.
+    """
+
+    def __init__(self, kp=KP, ki=KI, kd=KD, turn_limit=TURN_LIMIT, integral_limit=INTEGRAL_LIMIT):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.turn_limit = turn_limit
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the integral and derivative state (e.g. after STOP).
+        """
+        self.integral = 0.0
+        self.previous_heading = None
+
+    def update(self, target, heading, dt):
+        """
+        Returns the turn command in PWM counts (positive = turn to starboard)
+        for one control step of length dt seconds.
+        """
+        error = follower_control.heading_difference(target, heading)
+        if self.previous_heading is None or dt <= 0:
+            rate = 0.0
+        else:
+            rate = follower_control.heading_difference(heading, self.previous_heading) / dt
+        self.previous_heading = heading
+
+        unclamped = self.kp * error + self.ki * self.integral - self.kd * rate
+        # Anti-windup: only integrate while the output is not saturated in the
+        # direction the error would push it further, and bound the integral term
+        if abs(unclamped) < self.turn_limit or (unclamped > 0) != (error > 0):
+            self.integral += error * dt
+            if self.ki:
+                bound = self.integral_limit / self.ki
+                self.integral = max(-bound, min(bound, self.integral))
+        turn = self.kp * error + self.ki * self.integral - self.kd * rate
+        return max(-self.turn_limit, min(self.turn_limit, turn))
+
+
+class LoopTimer:
+    """
+    Fixed-rate schedule for a control loop on `clock`, with jitter statistics.
+    Missed ticks are skipped rather than run back to back.
+    """
+    # Number of recent ticks kept for the percentile
+    HISTORY = 1024
+
+    def __init__(self, rate=CONTROL_RATE, clock=hardware.clock):
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.next_tick = clock.monotonic()
+        # Lateness of each tick behind its scheduled time, in seconds
+        self._late = array("d", [0.0] * self.HISTORY)
+        self.ticks = 0
+        self.skipped = 0
+        self.max_late = 0.0
+        self._sum_late = 0.0
+
+    def time_until_tick(self):
+        """
+        Seconds until the next tick is due (0 if it is already due).
+        """
+        return max(0.0, self.next_tick - self.clock.monotonic())
+
+    def tick(self):
+        """
+        Returns True (and schedules the next tick) if a tick is due now.
+        """
+        now = self.clock.monotonic()
+        if now < self.next_tick:
+            return False
+        late = now - self.next_tick
+        self._late[self.ticks % self.HISTORY] = late
+        self.ticks += 1
+        self._sum_late += late
+        self.max_late = max(self.max_late, late)
+        self.next_tick += self.period
+        if self.next_tick <= now:
+            missed = math.floor((now - self.next_tick) / self.period) + 1
+            self.skipped += missed
+            self.next_tick += missed * self.period
+        return True
+
+    def stats(self):
+        """
+        Returns the jitter statistics: tick count, skipped ticks, and mean, p99
+        (over the last HISTORY ticks) and max lateness in milliseconds.
+        """
+        recent = sorted(self._late[:min(self.ticks, self.HISTORY)])
+        p99 = recent[min(len(recent) - 1, int(len(recent) * 0.99))] if recent else 0.0
+        return {
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "mean_ms": self._sum_late / self.ticks * 1000 if self.ticks else 0.0,
+            "p99_ms": p99 * 1000,
+            "max_ms": self.max_late * 1000,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"{s['ticks']} ticks at {1 / self.period:.0f} Hz, {s['skipped']} skipped, lateness "
+                f"mean {s['mean_ms']:.2f} ms / p99 {s['p99_ms']:.2f} ms / max {s['max_ms']:.2f} ms")
@@ -1,8 +1,20 @@
-import time
-import serial
-import math
-import smbus2
-import pigpio
+import os
+
+import command_link
+import compass_calibration
+import compass_sampler
+import flight_recorder
+import formation
+import formation_planner
+import gps_reader
+import hardware
+import heading_controller
+import lora_at
+import lora_rcv
+import mission
+import motor_driver
+import tdma
+import telemetry
 
 # --- Configuration Variables ---
 # Serial port for the LoRa module
@@ -11,10 +23,19 @@ LORA_PORT = "/dev/serial0"
 BAUDRATE = 115200
 # Unique address for this leader boat in the LoRa network
 MY_ADDRESS = 100
-# Address of the follower boat to send data to
-DEST_ADDR = 101
+# LoRa broadcast address: every node on the network receives frames sent here
+BROADCAST_ADDR = 0
+# Address telemetry is sent to. One broadcast frame per cycle reaches every follower,
+# so the airtime cost does not grow with the size of the swarm
+DEST_ADDR = BROADCAST_ADDR
 # Network ID for the LoRa network (must match other devices)
 NETWORK_ID = 5
+# Spreading factor of the LoRa modules, written at startup (AT+PARAMETER); sets the TDMA slot length
+LORA_SF = 12
+# Number of boats sharing the TDMA frame (leader + followers, addresses MY_ADDRESS and up),
+# and how often in seconds the leader announces the frame while ACTIVE (see tdma.py)
+SWARM_SIZE = 2
+ANNOUNCE_PERIOD = 30
 
 # GPIO pins connected to the TB6612FNG motor driver
 # AIN1, AIN2: Logic pins for Motor A direction
@@ -32,35 +53,92 @@ TURN_PWM = 80
 FORWARD_TIME = 3
 # Duration in seconds for turning in the route
 TURN_TIME = 1.5
+# Duration in seconds of the stop between the turn and the data broadcast
+PAUSE_TIME = 0.5
+# Duration in seconds to wait after broadcasting before the next forward segment
+BROADCAST_TIME = 1
+
+# Route executed in a loop while ACTIVE, as (segment, duration in seconds)
+ROUTE = [
+    ("FORWARD", FORWARD_TIME),
+    ("TURN", TURN_TIME),
+    ("PAUSE", PAUSE_TIME),
+    ("BROADCAST", BROADCAST_TIME),
+]
+# Period in seconds of the main loop (how quickly commands are serviced)
+LOOP_PERIOD = 0.02
+
+# Waypoint mission (see mission.py): loaded at startup from mission_<address>.geojson next to
+# the script (install one with mission.py or upload it from the GUI) and run instead of ROUTE.
+# Forward PWM while following the mission legs (the PID adds differential thrust to steer)
+MISSION_PWM = FORWARD_PWM
+# Seconds after which the GPS fix is too old to navigate by (the motors stop until a new fix)
+GPS_STALE_TIME = 3.0
+# Seconds between telemetry frames while following a mission: every other TDMA frame,
+# so the leader's slot is free in between for ACKs
+TELEMETRY_PERIOD = 2 * tdma.frame_period(SWARM_SIZE, LORA_SF)
+
+# Formation flown by the followers (one of formation.FORMATIONS) and the distance between
+# neighbouring slots in metres. The leader assigns the slots and broadcasts the assignment
+# (see formation_planner.py); followers without one hold their default offset
+FORMATION = "wedge"
+SLOT_SPACING = formation.SLOT_SPACING
+# Seconds without a packet from a follower after which it drops out of the formation:
+# three missed status frames (followers report every other TDMA frame, like TELEMETRY_PERIOD)
+FOLLOWER_TIMEOUT = 3 * TELEMETRY_PERIOD
+# Seconds between slot assignment updates, and before the assignment is sent again
+# to followers whose status frames still report another slot
+PLAN_PERIOD = TELEMETRY_PERIOD
+ASSIGNMENT_RETRY = 3 * TELEMETRY_PERIOD
+
+# Sequence number of the next telemetry frame (lets followers spot lost or repeated frames)
+telemetry_seq = 0
+
+# Compass output rate in Hz (must match CONFIG_REG_A below) and number of samples averaged
+COMPASS_RATE = 75
+COMPASS_WINDOW = 8
+# Seconds after which the last good compass sample is too old to steer by
+COMPASS_STALE_TIME = 0.5
+
+# GPIO pins of the GPS software UART (GPS TX -> Pi RX, Pi TX -> GPS RX) and its baud rate
+GPS_RX_GPIO = 27
+GPS_TX_GPIO = 22
+GPS_BAUD = 9600
 
 # Current state of the leader boat (IDLE or ACTIVE)
 # IDLE: Waiting for START command
 # ACTIVE: Executing the predefined route and broadcasting data
 STATE = "IDLE"
 
+# Clock used for all timing (runs faster than real time with the fake hardware backend)
+clock = hardware.clock
+
+# Every loop iteration while ACTIVE is written to the binary flight recorder (see flight_recorder.py).
+# Human-readable status lines are opt-in (BOAT_VERBOSE=1) and printed at most once
+# per LOG_INTERVAL seconds each; START/STOP and errors are always printed
+VERBOSE = os.environ.get("BOAT_VERBOSE") == "1"
+LOG_INTERVAL = 1.0
+
 # --- LoRa Module Class ---
 # Handles serial communication with the RYLR896 LoRa module
 class RYLR896:
     def __init__(self, port, baudrate=115200):
         # Initialize serial connection
-        self.ser = serial.Serial(port, baudrate, timeout=2)
+        self.ser = hardware.open_serial(port, baudrate, timeout=2)
+        # Sends AT commands and waits for the module's answers (see lora_at.py)
+        self.at = lora_at.ATEngine(self.ser, clock)
 
-    # Send an AT command to the LoRa module and read the response
+    # Send an AT command to the LoRa module and return its response
+    # (raises lora_at.LoraError on +ERR or when the module does not answer)
     def send_command(self, command):
-        self.ser.write((command + '\r\n').encode())
-        # Small delay to allow the module to process the command and respond
-        time.sleep(0.2)
-        # Read and return the response line, stripping whitespace
-        return self.ser.readline().decode(errors='ignore').strip()
-
-    # Configure the LoRa module's address and network ID
-    def configure(self, address, network_id):
-        self.send_command(f"AT+ADDRESS={address}")
-        self.send_command(f"AT+NETWORKID={network_id}")
-        # Reset the module to apply configuration changes
-        self.send_command("AT+RESET")
-        # Wait for the module to reset
-        time.sleep(1)
+        return self.at.command(command)
+
+    # Configure the LoRa module's address, network ID and spreading factor. Each
+    # setting is queried first and only written if it differs; the module is only
+    # reset (to apply the changes) if something was written
+    def configure(self, address, network_id, sf=12):
+        self.at.configure(address, network_id, lora_at.parameters(sf))
+        print(f"LoRa module {self.at.summary()}")
 
     # Send data packet to a specific destination address
     def send_data(self, dest_addr, message):
@@ -71,127 +149,347 @@ class RYLR896:
 
     # Check for and receive data from the LoRa module
     def receive_data(self):
-        # Check if there is data waiting in the serial buffer
-        if self.ser.in_waiting:
-            # Read a line from the serial buffer and return it
-            return self.ser.readline().decode(errors='ignore').strip()
-        # Return None if no data is available
-        return None
+        # Packets that arrived while the module was being configured come first
+        if self.at.received:
+            return self.at.received.pop(0)
+        # Read only the bytes already waiting, so the control loop never blocks; they go
+        # into the AT engine's buffer, which keeps a partial line until the rest arrives
+        waiting = self.ser.in_waiting
+        if waiting:
+            self.at.buffer += self.ser.read(waiting)
+        end = self.at.buffer.find(b"\n")
+        # Return None if no complete line is available
+        if end < 0:
+            return None
+        line = bytes(self.at.buffer[:end]).rstrip(b"\r")
+        del self.at.buffer[:end + 1]
+        return line
 
 # --- Hardware Initialization ---
-# Initialize pigpio library
-pi = pigpio.pi()
+# Initialize pigpio library (or the fake motor driver when BOAT_HARDWARE=fake, see hardware.py)
+pi = hardware.open_pigpio()
 
+# Motor driver that remembers the pin states and only sends pigpio what changed (see motor_driver.py)
+motors = motor_driver.MotorDriver(pi, AIN1, AIN2, BIN1, BIN2, PWMA, PWMB, STBY)
 # Set motor control pins as outputs using pigpio
-for pin in [AIN1, AIN2, BIN1, BIN2, STBY]:
-    pi.set_mode(pin, pigpio.OUTPUT)
+motors.setup()
 
 # Initialize I2C bus for the compass sensor
-bus = smbus2.SMBus(1)
+bus = hardware.open_i2c_bus(1)
 # Configure the HMC5883L compass sensor
 # 0x1E is the default I2C address
-# 0x00 (CONFIG_REG_A): 0x70 sets 8-average, 75 Hz, Normal Measurement
-bus.write_byte_data(0x1E, 0x00, 0x70)
+# 0x00 (CONFIG_REG_A): 0x78 sets 8-average, 75 Hz, Normal Measurement
+bus.write_byte_data(0x1E, 0x00, 0x78)
 # 0x01 (CONFIG_REG_B): 0xA0 sets Gain = 5, Range = +/- 4.7 Gauss (adjust as needed)
 bus.write_byte_data(0x1E, 0x01, 0xA0)
 # 0x02 (MODE_REG): 0x00 sets Continuous Measurement Mode
 bus.write_byte_data(0x1E, 0x02, 0x00)
+# Load this boat's hard/soft-iron calibration (identity if compass_calibration.py has not been run)
+calibration_file = compass_calibration.calibration_path(MY_ADDRESS)
+calibration = compass_calibration.CompassCalibration.load(calibration_file)
+if not os.path.exists(calibration_file):
+    print(f"No compass calibration found at {calibration_file}; using raw readings")
+# Sample the compass in the background at its 75 Hz output rate (see compass_sampler.py)
+compass = compass_sampler.CompassSampler(bus, rate=COMPASS_RATE, window=COMPASS_WINDOW, clock=clock,
+                                         calibration=calibration)
+compass.start()
+
+# Read the GPS in the background, keeping only the latest $GPRMC fix (see gps_reader.py)
+gps = gps_reader.GpsReader(pi, rx_gpio=GPS_RX_GPIO, tx_gpio=GPS_TX_GPIO, baud=GPS_BAUD, clock=clock)
+gps.configure()
+gps.start()
+
+# Flight recorder ring file and the rate-limited status log
+recorder = flight_recorder.FlightRecorder(flight_recorder.recording_path(MY_ADDRESS), clock=clock)
+log = flight_recorder.RateLimitedLog(VERBOSE, LOG_INTERVAL, clock)
 
 # Initialize the LoRa module
 lora = RYLR896(LORA_PORT, BAUDRATE)
 # Configure the LoRa module with the boat's address and network ID
-lora.configure(MY_ADDRESS, NETWORK_ID)
+lora.configure(MY_ADDRESS, NETWORK_ID, LORA_SF)
+
+# Every frame is queued and sent in the leader's TDMA slot (slot 0); the leader's clock defines the frame
+scheduler = tdma.TdmaScheduler(MY_ADDRESS, MY_ADDRESS, LORA_SF)
+scheduler.configure(tdma.frame_period(SWARM_SIZE, LORA_SF), SWARM_SIZE)
+scheduler.sync(clock.monotonic(), clock.monotonic())
+
+# Waypoint mission, if one is installed; uploads over LoRa replace it (see mission.py)
+mission_file = mission.mission_path(MY_ADDRESS)
+tracker = None
+if os.path.exists(mission_file):
+    try:
+        tracker = mission.MissionTracker(mission.load(mission_file))
+        print(f"Loaded {tracker.mission.summary()}")
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Invalid mission file {mission_file}: {e}; running the timed route")
+else:
+    print(f"No mission at {mission_file}; running the timed route")
+# Reassembles missions uploaded in chunks
+mission_receiver = mission.MissionReceiver()
+# Heading control along the mission legs (same PID and differential thrust as the followers)
+pid = heading_controller.HeadingPID()
 
 # --- Sensor Reading Functions ---
-# Read heading data from the HMC5883L compass sensor
+# Get the filtered heading from the HMC5883L compass sampler
+# Returns None if there has been no good sample for COMPASS_STALE_TIME seconds
 def read_heading():
-    try:
-        # Read raw data from the sensor (X, Z, Y) registers
-        data = bus.read_i2c_block_data(0x1E, 0x03, 6)
-        # Combine bytes to form 16-bit signed integers for X and Y axes
-        x = (data[0] << 8) | data[1]
-        y = (data[4] << 8) | data[5]
-
-        # Convert raw data to signed integers (two's complement)
-        if x >= 32768: x -= 65536
-        if y >= 32768: y -= 65536
-
-        # Calculate heading in radians using arctan2 (Y, X)
-        # Convert radians to degrees
-        heading = math.degrees(math.atan2(y, x))
-
-        # Normalize heading to 0-360 degrees
-        return heading + 360 if heading < 0 else heading
-    except Exception as e:
-        # Print error if reading or calculation fails
-        print(f"Error reading compass: {e}")
-        # Return 0.0 or last known heading in a real application
-        return 0.0
+    heading, age = compass.latest()
+    if heading is None or age > COMPASS_STALE_TIME:
+        # Report how old the data is instead of returning a fake heading
+        log("compass", f"Compass data is stale ({age:.2f} s old, {compass.errors} read errors, last: {compass.last_error})")
+        return None
+    return heading
 
 # --- Motor Control Functions ---
 # Move the boat straight forward
 def move_forward():
-    # Enable the motor driver
-    pi.write(STBY, 1)
-    # Set direction to forward for both motors
-    pi.write(AIN1, 1); pi.write(AIN2, 0) # Motor A Forward
-    pi.write(BIN1, 1); pi.write(BIN2, 0) # Motor B Forward
-    # Set PWM duty cycle for forward speed
-    pi.set_PWM_dutycycle(PWMA, FORWARD_PWM)
-    pi.set_PWM_dutycycle(PWMB, FORWARD_PWM)
-    print("Moving Forward")
+    # Both motors forward at the forward speed
+    motors.drive(FORWARD_PWM, FORWARD_PWM)
+    log("segment", "Moving Forward")
 
 # Turn the boat left
 def turn_left():
-    # Enable the motor driver
-    pi.write(STBY, 1)
-    # Set direction for turning left (Motor A Reverse, Motor B Forward)
-    pi.write(AIN1, 0); pi.write(AIN2, 1) # Motor A Reverse
-    pi.write(BIN1, 1); pi.write(BIN2, 0) # Motor B Forward
-    # Set PWM duty cycle for turning speed
-    pi.set_PWM_dutycycle(PWMA, TURN_PWM)
-    pi.set_PWM_dutycycle(PWMB, TURN_PWM)
-    print("Turning Left")
+    # Turning left: Motor A Reverse, Motor B Forward, both at the turning speed
+    motors.drive(-TURN_PWM, TURN_PWM)
+    log("segment", "Turning Left")
 
 # Stop both motors and disable the motor driver
 def stop_motors():
-    pi.set_PWM_dutycycle(PWMA, 0) # Set PWM to 0
-    pi.set_PWM_dutycycle(PWMB, 0)
-    pi.write(STBY, 0) # Disable the motor driver
-    print("Motors Stopped")
+    motors.stop()
+    log("segment", "Motors Stopped")
+
+# --- Data Broadcasting ---
+# Send the leader's position and heading to the follower(s)
+def broadcast_data():
+    global telemetry_seq
+    # Get the latest GPS position and how old it is
+    fix, fix_age = gps.latest()
+    if fix is None:
+        # No fix yet: followers see the unknown fix age and ignore the position
+        lat, lon = 0.0, 0.0
+    else:
+        lat, lon = fix.latitude, fix.longitude
+    # Read current heading from the compass sensor
+    heading = read_heading()
+    if heading is None:
+        # Do not send a made-up heading the followers would steer towards
+        log("skip", "Skipping Leader data broadcast: no valid compass heading")
+        return
+
+    # Mission progress: the waypoint being approached and the percent of the mission covered
+    if tracker is not None:
+        mission_id, waypoint, progress = tracker.mission.id, tracker.waypoint, tracker.progress
+    else:
+        mission_id = waypoint = progress = None
+
+    # Pack the data into a compact binary telemetry frame (see telemetry.py)
+    # RSSI will be automatically added by the LoRa module upon reception by the follower
+    message = telemetry.encode_leader(telemetry_seq, lat, lon, heading, fix_age=fix_age,
+                                      mission=mission_id, waypoint=waypoint, progress=progress)
+    # Broadcast the message to all follower boats at once, at the start of the next leader slot
+    # (followers synchronise their slots to it)
+    scheduler.send(DEST_ADDR, message, clock.monotonic(), sync=True)
+    recorder.record(STATE, flight_recorder.EVENT_BROADCAST, heading, seq=telemetry_seq)
+    telemetry_seq = (telemetry_seq + 1) & 0xFFFF
+    fix_status = f"fix {fix_age:.1f} s old" if fix is not None else "no GPS fix"
+    log("broadcast", f"Queued Leader data for {DEST_ADDR}: {message} ({lat:.6f}, {lon:.6f}, {heading:.2f}, {fix_status})")
+
+# --- Route Execution ---
+# Perform the action that starts a route segment (each action returns immediately)
+def start_segment(segment):
+    if segment == "FORWARD":
+        move_forward()
+    elif segment == "TURN":
+        turn_left()
+    elif segment == "PAUSE":
+        # Stop motors briefly between movements (optional, depends on route design)
+        stop_motors()
+    elif segment == "BROADCAST":
+        broadcast_data()
+    recorder.record(STATE, flight_recorder.EVENT_SEGMENT, compass.latest()[0], pwm=FORWARD_PWM,
+                    left=motors.left, right=motors.right)
+
+# --- Mission Execution ---
+# Steer along the current mission leg: the line-of-sight heading is updated with
+# every new GPS fix (see mission.py) and the PID holds it with differential thrust.
+# Without a recent GPS fix or compass heading the motors stop instead of guessing
+def mission_step(now):
+    global last_fix, last_step, mission_heading
+    dt = now - last_step
+    last_step = now
+    fix, fix_age = gps.latest()
+    if fix is None or fix_age > GPS_STALE_TIME:
+        if motors.left or motors.right:
+            print(f"No recent GPS fix: stopping until the position is known (GPS: {gps.summary()})")
+        stop_motors()
+        return
+    if fix is not last_fix:
+        last_fix = fix
+        waypoint, finished = tracker.waypoint, tracker.finished
+        mission_heading = tracker.update(fix.latitude, fix.longitude)
+        if tracker.finished:
+            if not finished:
+                print(f"Mission complete: {tracker.mission.summary()}")
+        elif tracker.waypoint != waypoint:
+            log("waypoint", f"Heading to waypoint {tracker.waypoint + 1}: {tracker.status()}")
+            recorder.record(STATE, flight_recorder.EVENT_SEGMENT, compass.latest()[0], seq=tracker.waypoint)
+    if mission_heading is None:
+        # Finished: wait at the last waypoint (until STOP or a new mission)
+        stop_motors()
+        return
+    heading = read_heading()
+    if heading is None:
+        stop_motors()
+        return
+    turn = pid.update(mission_heading, heading, dt)
+    motors.drive(*heading_controller.differential_thrust(MISSION_PWM, turn))
+    log("mission", f"{tracker.status()} | Target Heading: {mission_heading:.2f}° | My Heading: {heading:.2f}°")
+
+# --- Formation Slot Assignment ---
+# Drop the followers that have gone quiet and give slots to new ones (all followers
+# again with full=True); broadcast the assignment when it changed, or again when a
+# follower's status frames report a different slot than the one assigned
+def plan_formation(now, full=False):
+    global assignment_deadline
+    for address in planner.expire(now, FOLLOWER_TIMEOUT):
+        print(f"Follower {address} not heard for {FOLLOWER_TIMEOUT:.0f} s: dropped from the formation")
+    fix, fix_age = gps.latest()
+    heading = read_heading()
+    if fix is not None and fix_age <= GPS_STALE_TIME and heading is not None:
+        changed = planner.plan(fix.latitude, fix.longitude, heading, full=full)
+    else:
+        # Without the leader's position and heading every slot costs the same
+        changed = planner.plan(full=full)
+    if changed:
+        print(f"Formation slots: {planner.summary()}")
+    if changed or (planner.unconfirmed() and now >= assignment_deadline):
+        for payload in planner.frames():
+            scheduler.send(BROADCAST_ADDR, payload, now)
+        assignment_deadline = now + ASSIGNMENT_RETRY
+
+# Start (or restart) the mission from the current position
+def start_mission(now):
+    global last_fix, last_step, mission_heading, broadcast_deadline
+    tracker.reset()
+    pid.reset()
+    last_fix = None
+    last_step = now
+    mission_heading = None
+    broadcast_deadline = now
 
 # --- Main Loop ---
 print("Leader ready - IDLE until CMD,START received...")
 
+# Acts on each sequence-numbered command once (retransmitted copies are only acknowledged)
+commands = command_link.CommandFilter()
+# Followers heard and their formation slots, with the time of the next update and of the next resend
+planner = formation_planner.SlotPlanner(MY_ADDRESS, FORMATION, SLOT_SPACING)
+plan_deadline = 0.0
+assignment_deadline = 0.0
+# Senders above the swarm's addresses already reported (each is reported once)
+outside_swarm = set()
+
+# Index into ROUTE of the segment currently being executed
+route_index = 0
+# Monotonic time at which the current segment ends
+segment_deadline = 0.0
+# Monotonic time at which the TDMA frame is announced next
+announce_deadline = 0.0
+# Mission state: last GPS fix used, time of the last mission step, heading to steer
+# (None when finished) and time of the next telemetry frame
+last_fix = None
+last_step = 0.0
+mission_heading = None
+broadcast_deadline = 0.0
+
 try:
     # Infinite loop to continuously check for commands and execute the route
     while True:
-        # Attempt to receive data (commands) from the LoRa module
-        incoming = lora.receive_data()
+        # Handle every message waiting in the serial buffer before touching the route
+        while True:
+            # Attempt to receive data (commands) from the LoRa module
+            incoming = lora.receive_data()
+            if incoming is None:
+                break
 
-        # Check if data was received and it's a valid RCV message
-        if incoming and incoming.startswith("+RCV="):
-            print(f"Received RAW LoRa data: {incoming}")
             try:
-                # Remove the "+RCV=" prefix and split the message by commas
-                parts = incoming.replace("+RCV=", "").split(",")
+                # Split the line into sender, payload (sliced by its length field), RSSI and SNR
+                packet = lora_rcv.parse_rcv(incoming)
+                # Skip anything that is not a received packet (e.g. +OK responses)
+                if packet is None:
+                    continue
+                log("raw", f"Received RAW LoRa data: {incoming.decode(errors='ignore')}")
+
+                # --- Follower Status ---
+                # Any packet from a follower shows it is still there; its status frames
+                # carry its position and the slot it holds (see formation_planner.py)
+                if MY_ADDRESS + SWARM_SIZE <= packet.sender and packet.sender not in outside_swarm:
+                    # A follower beyond the TDMA frame has no slot and gets no formation slot
+                    outside_swarm.add(packet.sender)
+                    print(f"Packet from {packet.sender}, outside the swarm (followers {MY_ADDRESS + 1}-"
+                          f"{MY_ADDRESS + SWARM_SIZE - 1}): ignoring it as a follower; raise SWARM_SIZE")
+                if MY_ADDRESS < packet.sender < MY_ADDRESS + SWARM_SIZE:
+                    status = None
+                    if (telemetry.is_binary_frame(packet.text)
+                            and telemetry.message_type(packet.text) == telemetry.MSG_FOLLOWER):
+                        status = telemetry.decode_frame(packet.text)
+                    planner.observe(packet.sender, clock.monotonic(), status)
+                    if status is not None:
+                        continue
 
                 # --- Command Handling ---
-                # Expected format for commands: +RCV=<sender>,<length>,CMD,<command>
-                if len(parts) >= 4 and parts[2] == "CMD":
-                    command = parts[3].strip().upper()
-                    # If START command is received
-                    if command == "START":
+                # Expected payload for commands: CMD,<command>[,<seq>] (see command_link.py)
+                parsed = command_link.parse_command(packet.text)
+                if parsed is not None:
+                    command, seq = parsed
+                    # A copy of a command already acted on is only acknowledged again
+                    if not commands.accept(packet.sender, seq, clock.monotonic()):
+                        log("repeated", f"Command {command} #{seq} already received; acknowledging it again")
+                    # If START command is received (ignored if the route is already running)
+                    elif command == "START" and STATE != "ACTIVE":
                         print("START command received! Entering ACTIVE state.")
                         STATE = "ACTIVE"
+                        recorder.record(STATE, flight_recorder.EVENT_COMMAND)
+                        # Tell the followers the TDMA frame before the first telemetry frame
+                        announce_deadline = clock.monotonic()
+                        # Assign every slot again, by the shortest total travel from where the boats are now
+                        plan_formation(clock.monotonic(), full=True)
+                        plan_deadline = clock.monotonic() + PLAN_PERIOD
+                        if tracker is not None:
+                            # Follow the mission from the current position
+                            start_mission(clock.monotonic())
+                        else:
+                            # Begin the route from its first segment
+                            route_index = 0
+                            segment_deadline = clock.monotonic() + ROUTE[0][1]
+                            start_segment(ROUTE[0][0])
                     # If STOP command is received
                     elif command == "STOP":
                         print("STOP command received! Entering IDLE state.")
                         STATE = "IDLE"
                         # Stop motors immediately when STOP is received
                         stop_motors()
-                    # Continue to the next loop iteration after processing a command
-                    continue # Skip the rest of the loop to process the next incoming message
+                        recorder.record(STATE, flight_recorder.EVENT_COMMAND)
+                    # Acknowledge every copy to its sender (after acting on it)
+                    if seq is not None:
+                        scheduler.send(packet.sender, command_link.encode_ack(command, seq), clock.monotonic())
+                    continue
+
+                # --- Mission Upload ---
+                # MSN,<id>,<index>,<count>,<data> chunks; each is acknowledged (see mission.py)
+                chunk = mission.parse_chunk(packet.text)
+                if chunk is not None:
+                    reply, uploaded = mission_receiver.handle(chunk)
+                    if uploaded is not None:
+                        uploaded.save(mission_file)
+                        print(f"New {uploaded.summary()} received from {packet.sender}")
+                        tracker = mission.MissionTracker(uploaded)
+                        if STATE == "ACTIVE":
+                            # Switch to the new mission right away
+                            start_mission(clock.monotonic())
+                    elif reply.endswith(mission.ACK_ERROR):
+                        print(f"Rejected mission #{chunk[0]} from {packet.sender}: invalid data")
+                    scheduler.send(packet.sender, reply, clock.monotonic())
 
             except ValueError as e:
                 # Handle errors during data parsing
@@ -203,49 +501,56 @@ try:
                 # Catch any other unexpected errors during processing
                 print(f"An unexpected error occurred during command processing: {e}")
 
+        # Keep the formation slots up to date (also while IDLE, so followers know their slots before START)
+        if clock.monotonic() >= plan_deadline:
+            plan_formation(clock.monotonic())
+            plan_deadline = clock.monotonic() + PLAN_PERIOD
+
         # --- Route Execution and Data Broadcasting (only if in ACTIVE state) ---
+        # Advance to the next segment once the current one has run for its duration
         if STATE == "ACTIVE":
-            # Execute a segment of the predefined route (move forward)
-            move_forward()
-            time.sleep(FORWARD_TIME)
-
-            # Execute a segment of the predefined route (turn left)
-            turn_left()
-            time.sleep(TURN_TIME)
-
-            # Stop motors briefly between movements (optional, depends on route design)
-            stop_motors()
-            # Small delay after stopping before sending data
-            time.sleep(0.5)
-
-            # --- Data Broadcasting ---
-            # Get current position (using dummy values for now)
-            # In a real implementation, this would come from a GPS module
-            lat, lon = 43.138460, -75.232241
-            # Read current heading from the compass sensor
-            heading = read_heading()
-
-            # Create the message string to send to the follower(s)
-            # Format: LEADER,<latitude>,<longitude>,<heading>
-            # RSSI will be automatically added by the LoRa module upon reception by the follower
-            message = f"LEADER,{lat:.6f},{lon:.6f},{heading:.2f}"
-            # Send the message to the destination address (follower boat)
-            lora.send_data(DEST_ADDR, message)
-            print(f"Sent Leader data to {DEST_ADDR}: {message}")
-
-            # Small delay after sending data before the next route segment
-            time.sleep(1)
-
-        else:
-            # If in IDLE state, just wait briefly before checking for commands again
-            time.sleep(0.2)
+            now = clock.monotonic()
+            if now >= announce_deadline:
+                scheduler.send(BROADCAST_ADDR, tdma.encode_announcement(scheduler.frame_period, SWARM_SIZE), now)
+                announce_deadline = now + ANNOUNCE_PERIOD
+            if tracker is not None:
+                mission_step(now)
+                if now >= broadcast_deadline:
+                    broadcast_data()
+                    broadcast_deadline = now + TELEMETRY_PERIOD
+            elif now >= segment_deadline:
+                route_index = (route_index + 1) % len(ROUTE)
+                segment, duration = ROUTE[route_index]
+                # Chain deadlines so the route timing does not drift with loop jitter,
+                # but restart the schedule if we fell more than a whole segment behind
+                segment_deadline += duration
+                if segment_deadline < now:
+                    segment_deadline = now + duration
+                start_segment(segment)
+            # One flight recorder record per loop iteration while the route runs
+            recorder.record(STATE, flight_recorder.EVENT_TICK, compass.latest()[0], pwm=FORWARD_PWM,
+                            left=motors.left, right=motors.right)
+
+        # Transmit the next queued frame if the leader's slot has room for it
+        outgoing = scheduler.poll(clock.monotonic())
+        if outgoing is not None:
+            lora.send_data(*outgoing)
+
+        # Short delay so commands are serviced within one loop period
+        clock.sleep(LOOP_PERIOD)
 
 # --- Cleanup on Exit ---
 except KeyboardInterrupt:
     # Handle Ctrl+C to stop the script gracefully
     print("Stopping leader...")
-    # Stop the motors
+    print(f"Motor driver: {motors.summary()}")
+    print(f"TDMA: {scheduler.summary()}")
+    print(f"GPS: {gps.summary()}")
+    # Stop the motors, the compass sampler and the GPS reader
     stop_motors()
+    compass.stop()
+    gps.stop()
+    recorder.close()
     # Close the serial connection to the LoRa module
     lora.ser.close()
     # Stop the pigpio daemon connection
@@ -255,6 +560,9 @@ except Exception as e:
     print(f"An unexpected error caused the program to stop: {e}")
     # Attempt to clean up resources
     stop_motors()
+    compass.stop()
+    gps.stop()
+    recorder.close()
     if lora.ser and lora.ser.isOpen():
         lora.ser.close()
     pi.stop()
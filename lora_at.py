@@ -0,0 +1,214 @@
+import time
+
+import lora_rcv
+
+# --- RYLR896 AT Command Engine ---
+# Sends one AT command at a time and waits for the module's actual answer
+# instead of sleeping a fixed time: +OK, +ERR=<code>, +<NAME>=<value> for
+# queries, and +RESET followed by +READY for AT+RESET. Every command has its
+# own timeout. Lines that are not the expected answer (e.g. +READY printed at
+# power-up, or a late +OK of a timed-out probe) are skipped. +RCV= lines that arrive while waiting for an answer (packets
+# from other nodes during configuration) are kept in `received` for the
+# caller instead of being mistaken for the answer or lost.
+#
+# configure() queries each setting first and only writes (and resets the
+# module) when something differs, so a boat restarted with the same settings
+# is ready after a few short round trips.
+
+# Seconds to wait for the answer to a command, by command name
+DEFAULT_TIMEOUT = 0.5
+TIMEOUTS = {
+    "AT+RESET": 1.0,
+    "AT+PARAMETER": 1.0,
+}
+# Seconds from +RESET until the module reports +READY
+READY_TIMEOUT = 3.0
+# Attempts of the initial AT probe (the module may still be booting)
+PROBE_ATTEMPTS = 5
+
+# RYLR896 error codes
+ERRORS = {
+    1: "no <CR><LF> at the end of the command",
+    2: "command does not start with AT",
+    4: "unknown command",
+    5: "data length does not match",
+    10: "TX timeout",
+    12: "CRC error",
+    13: "TX data longer than 240 bytes",
+    14: "failed to write flash memory",
+    15: "unknown error",
+    17: "last TX was not completed",
+    18: "preamble value is not allowed",
+    19: "RX failed, header error",
+}
+
+
+def parameters(sf=12, bandwidth=7, coding_rate=1, preamble=4):
+    """
+    AT+PARAMETER value for a spreading factor (module defaults: 125 kHz, 4/5, 4 symbols).
+    """
+    return f"{sf},{bandwidth},{coding_rate},{preamble}"
+
+
+class LoraError(Exception):
+    """
+    The module answered a command with +ERR or did not answer in time.
+    """
+
+
+class ATEngine:
+    """
+    Response-driven AT command interface of one RYLR896 on an open serial port.
+    `clock` is anything with monotonic() (hardware.clock on the boats).
+    """
+
+    def __init__(self, ser, clock=time):
+        self.ser = ser
+        self.clock = clock
+        self.buffer = bytearray()
+        # +RCV= lines that arrived while waiting for answers, oldest first
+        self.received = []
+        self.commands = 0
+        self.skipped = 0
+        # Lines skipped while waiting for an answer
+        self.unexpected = 0
+        self.started = clock.monotonic()
+        # Seconds from creation until configure() finished
+        self.ready_time = None
+
+    def _read_line(self, deadline):
+        """
+        Returns the next complete line (without line ending), or None at the deadline.
+        """
+        timeout = self.ser.timeout
+        try:
+            while True:
+                end = self.buffer.find(b"\n")
+                if end >= 0:
+                    line = bytes(self.buffer[:end]).rstrip(b"\r")
+                    del self.buffer[:end + 1]
+                    return line
+                remaining = deadline - self.clock.monotonic()
+                if remaining <= 0:
+                    return None
+                self.ser.timeout = remaining
+                self.buffer += self.ser.read(self.ser.in_waiting or 1)
+        finally:
+            self.ser.timeout = timeout
+
+    def _response(self, deadline):
+        """
+        Returns the next line that is not a received packet, or None at the deadline.
+        """
+        while True:
+            line = self._read_line(deadline)
+            if line is None:
+                return None
+            if lora_rcv.is_rcv(line):
+                self.received.append(line)
+            elif line:
+                return line.decode(errors="ignore")
+
+    def command(self, command, expect="+OK", timeout=None):
+        """
+        Sends a command and returns the module's answer, the first line that
+        starts with `expect`. Raises LoraError for +ERR answers and when there
+        is no answer within the timeout.
+        """
+        if timeout is None:
+            timeout = TIMEOUTS.get(command.split("=")[0].rstrip("?"), DEFAULT_TIMEOUT)
+        self.ser.write((command + "\r\n").encode())
+        self.commands += 1
+        deadline = self.clock.monotonic() + timeout
+        while True:
+            response = self._response(deadline)
+            if response is None:
+                raise LoraError(f"{command}: no answer within {timeout:.1f} s")
+            if response.startswith("+ERR="):
+                code = response[5:]
+                reason = ERRORS.get(int(code), "unknown error") if code.isdigit() else "unknown error"
+                raise LoraError(f"{command}: {response} ({reason})")
+            if response.startswith(expect):
+                return response
+            self.unexpected += 1
+
+    def query(self, name):
+        """
+        Returns the current value of a setting, e.g. query("ADDRESS") -> "101".
+        """
+        prefix = f"+{name}="
+        return self.command(f"AT+{name}?", expect=prefix)[len(prefix):]
+
+    def set(self, name, value):
+        """
+        Writes a setting unless it already has the value. Returns True if it was written.
+        """
+        value = str(value)
+        if self.query(name) == value:
+            self.skipped += 1
+            return False
+        self.command(f"AT+{name}={value}")
+        return True
+
+    def probe(self):
+        """
+        Waits until the module answers AT (it may still be booting), skipping
+        anything it printed before.
+        """
+        for attempt in range(PROBE_ATTEMPTS):
+            try:
+                self.command("AT")
+                return
+            except LoraError:
+                if attempt == PROBE_ATTEMPTS - 1:
+                    raise
+
+    def reset(self):
+        """
+        Resets the module and waits for +READY.
+        """
+        self.command("AT+RESET", expect="+RESET")
+        deadline = self.clock.monotonic() + READY_TIMEOUT
+        while True:
+            response = self._response(deadline)
+            if response is None:
+                raise LoraError(f"AT+RESET: no +READY within {READY_TIMEOUT:.1f} s")
+            if response == "+READY":
+                return
+            self.unexpected += 1
+
+    def configure(self, address, network_id, parameters=None):
+        """
+        Sets the address, network ID and (optionally) the RF parameters
+        "<SF>,<BW>,<CR>,<preamble>", resetting the module only if one of them
+        changed. Returns True if anything changed.
+        """
+        self.probe()
+        changed = self.set("ADDRESS", address)
+        changed |= self.set("NETWORKID", network_id)
+        if parameters is not None:
+            changed |= self.set("PARAMETER", parameters)
+        if changed:
+            # Reset the module to apply configuration changes
+            self.reset()
+        self.ready_time = self.clock.monotonic() - self.started
+        return changed
+
+    def send(self, address, message):
+        """
+        Sends a packet with AT+SEND without waiting for the answer: once the
+        module is configured, the caller's reader reads the port and gets the
+        +OK (or +ERR) like any other line.
+        """
+        self.ser.write(f"AT+SEND={address},{len(message)},{message}\r\n".encode())
+
+    def take_received(self):
+        """
+        Returns the +RCV= lines received while waiting for answers and forgets them.
+        """
+        received, self.received = self.received, []
+        return received
+
+    def summary(self):
+        ready = f"ready in {self.ready_time:.2f} s" if self.ready_time is not None else "not configured"
+        return f"{ready} ({self.commands} commands, {self.skipped} settings already set)"
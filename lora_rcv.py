@@ -0,0 +1,69 @@
+# --- RYLR896 +RCV= Frame Parser ---
+# The module reports every received packet as one line:
+#   +RCV=<sender address>,<payload length>,<payload>,<RSSI>,<SNR>\r\n
+# The payload may itself contain commas, so it is sliced using the length field
+# instead of splitting the whole line. Parsing works directly on the raw bytes
+# read from the serial port (bytes, bytearray or a memoryview of the reader's
+# buffer): only the short header and RSSI/SNR fields are copied, the payload is
+# a slice of the line, and nothing is decoded unless the caller asks for text.
+
+RCV_PREFIX = b"+RCV="
+# Longest "+RCV=<address>,<length>," header: a 5-digit address and a 3-digit length
+MAX_HEADER = 15
+
+
+class RcvFrame:
+    """
+    One packet received by the RYLR896.
+    """
+    __slots__ = ("sender", "payload", "rssi", "snr")
+
+    def __init__(self, sender, payload, rssi, snr):
+        self.sender = sender
+        self.payload = payload
+        self.rssi = rssi
+        self.snr = snr
+
+    @property
+    def text(self):
+        """
+        The payload decoded as ASCII text.
+        """
+        return str(self.payload, "ascii", "ignore")
+
+    def __repr__(self):
+        return f"RcvFrame(sender={self.sender}, payload={self.text!r}, rssi={self.rssi}, snr={self.snr})"
+
+
+def is_rcv(line):
+    """
+    Returns True if a raw line from the module is a received packet.
+    """
+    return line[:5] == RCV_PREFIX
+
+
+def parse_rcv(line):
+    """
+    Parses a raw +RCV= line (bytes, bytearray or memoryview). Returns None if
+    the line is not a received packet (e.g. +OK) and raises ValueError if it is
+    a malformed one. The payload is a slice of `line`, so it has the same type.
+    """
+    if line[:5] != RCV_PREFIX:
+        return None
+
+    # Sender address and payload length are the first two fields (bytes.index
+    # raises ValueError if a separator is missing); a memoryview is searched
+    # through a copy of its header only
+    view = isinstance(line, memoryview)
+    head = bytes(line[:MAX_HEADER]) if view else line
+    first = head.index(b",", 5)
+    second = head.index(b",", first + 1)
+    start = second + 1
+    end = start + int(head[first + 1:second])
+
+    # Slice the payload exactly; RSSI and SNR follow it
+    sep, rssi, snr = (bytes(line[end:]) if view else line[end:]).split(b",")
+    if sep:
+        raise ValueError("payload length does not match the +RCV line")
+
+    return RcvFrame(int(head[5:first]), line[start:end], int(rssi), int(snr))
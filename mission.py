@@ -0,0 +1,469 @@
+import argparse
+import base64
+import binascii
+import csv
+import json
+import math
+import os
+import random
+import struct
+
+import command_link
+import formation
+import telemetry
+
+# --- Waypoint Missions ---
+# A mission is a list of waypoints (latitude, longitude in degrees), optionally
+# looped back to the first. It is loaded from a CSV file (lat,lon columns) or a
+# GeoJSON LineString / Point features ([lon, lat] coordinates). The bearing,
+# length and unit vector of every leg are computed once when the mission is
+# loaded, in the local east/north plane of formation.py anchored at the first
+# waypoint; tracking a leg is then a few multiplications per GPS fix.
+#
+# Guidance is line-of-sight: the leader steers at a point LOOKAHEAD metres
+# ahead of its projection on the current leg, i.e. towards the leg bearing
+# minus atan(cross-track error / LOOKAHEAD), and moves on to the next leg
+# within ACCEPTANCE_RADIUS of the leg's end (or once it has passed it).
+#
+# Upload over LoRa: the mission is packed (MISSION_HEADER + WAYPOINT_STRUCT per
+# waypoint), identified by the CRC-16 of the packed bytes and sent in chunks
+#   MSN,<mission id>,<chunk index>,<chunk count>,<base64 chunk>
+# one at a time. The leader answers each chunk with MACK,<id>,<index>, and the
+# chunk that completes the mission with MACK,<id>,DONE (loaded) or
+# MACK,<id>,ERR (CRC or content invalid). Unanswered chunks are resent with
+# the command retransmission schedule of command_link.py.
+
+# Steering point distance ahead on the leg in metres (larger: smoother, slower convergence)
+LOOKAHEAD = 15.0
+# Distance in metres from a waypoint at which it counts as reached
+ACCEPTANCE_RADIUS = 8.0
+# Most waypoints in a mission (the telemetry frame has one byte for the waypoint index)
+MAX_WAYPOINTS = telemetry.MISSION_NONE - 1
+
+# Packed mission: flags (bit 0: loop) and waypoint count, then lat/lon in 1e-7 degrees per waypoint
+MISSION_HEADER = struct.Struct("<BH")
+WAYPOINT_STRUCT = struct.Struct("<ii")
+FLAG_LOOP = 0x01
+# Packed bytes per upload chunk (a payload of about 80 characters, 3.2 s on air at SF12)
+CHUNK_BYTES = 48
+
+CHUNK_PREFIX = "MSN,"
+ACK_PREFIX = "MACK,"
+ACK_DONE = "DONE"
+ACK_ERROR = "ERR"
+
+
+class Leg:
+    """
+    Straight line between two points of the local plane, with its precomputed geometry.
+    """
+
+    def __init__(self, start, end, before):
+        self.start = start
+        self.end = end
+        de, dn = end[0] - start[0], end[1] - start[1]
+        self.length = math.hypot(de, dn)
+        # Unit vector along the leg (any direction for a zero-length leg)
+        self.unit = (de / self.length, dn / self.length) if self.length > 0 else (0.0, 1.0)
+        self.bearing = math.degrees(math.atan2(self.unit[0], self.unit[1])) % 360
+        # Mission length covered before this leg
+        self.before = before
+
+    def track(self, position):
+        """
+        Returns (along-track, cross-track) position in metres; cross-track is positive to starboard of the leg.
+        """
+        de, dn = position[0] - self.start[0], position[1] - self.start[1]
+        return de * self.unit[0] + dn * self.unit[1], de * self.unit[1] - dn * self.unit[0]
+
+
+class Mission:
+    """
+    Waypoints [(lat, lon), ...] with their legs precomputed. With loop=True
+    the last waypoint is followed by the first again.
+    """
+
+    def __init__(self, waypoints, loop=False):
+        if not waypoints:
+            raise ValueError("a mission needs at least one waypoint")
+        if len(waypoints) > MAX_WAYPOINTS:
+            raise ValueError(f"a mission has at most {MAX_WAYPOINTS} waypoints")
+        self.waypoints = [(float(lat), float(lon)) for lat, lon in waypoints]
+        for lat, lon in self.waypoints:
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"invalid waypoint {lat}, {lon}")
+        self.loop = loop
+        self.plane = formation.LocalFrame(*self.waypoints[0])
+        self.points = [self.plane.to_enu(lat, lon) for lat, lon in self.waypoints]
+        # legs[i] ends at waypoint i + 1 (legs[-1] ends at waypoint 0 when looping)
+        targets = self.points[1:] + (self.points[:1] if loop else [])
+        self.legs = []
+        before = 0.0
+        for start, end in zip(self.points, targets):
+            self.legs.append(Leg(start, end, before))
+            before += self.legs[-1].length
+        self.length = before
+        self.id = binascii.crc_hqx(self.pack(), 0xFFFF)
+
+    def pack(self):
+        """
+        Packed mission bytes (what is uploaded over LoRa).
+        """
+        scale = telemetry.COORD_SCALE
+        data = MISSION_HEADER.pack(FLAG_LOOP if self.loop else 0, len(self.waypoints))
+        return data + b"".join(WAYPOINT_STRUCT.pack(round(lat * scale), round(lon * scale))
+                               for lat, lon in self.waypoints)
+
+    @classmethod
+    def unpack(cls, data):
+        """
+        Mission from packed bytes. Raises ValueError if they are malformed.
+        """
+        if len(data) < MISSION_HEADER.size:
+            raise ValueError("mission data too short")
+        flags, count = MISSION_HEADER.unpack_from(data)
+        if len(data) != MISSION_HEADER.size + count * WAYPOINT_STRUCT.size:
+            raise ValueError(f"mission data is {len(data)} bytes for {count} waypoints")
+        waypoints = [(lat / telemetry.COORD_SCALE, lon / telemetry.COORD_SCALE)
+                     for lat, lon in WAYPOINT_STRUCT.iter_unpack(data[MISSION_HEADER.size:])]
+        return cls(waypoints, loop=bool(flags & FLAG_LOOP))
+
+    def summary(self):
+        loop = ", looped" if self.loop else ""
+        return f"mission #{self.id}: {len(self.waypoints)} waypoints, {self.length:.0f} m{loop}"
+
+    def save(self, path):
+        """
+        Saves the mission as a GeoJSON LineString feature.
+        """
+        feature = {
+            "type": "Feature",
+            "properties": {"loop": self.loop},
+            "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in self.waypoints]},
+        }
+        with open(path, "w") as f:
+            json.dump(feature, f, indent=2)
+
+
+def load_csv(path, loop=False):
+    """
+    Mission from a CSV file with lat and lon (or latitude and longitude) columns.
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    waypoints = []
+    for row in rows:
+        row = {key.strip().lower(): value for key, value in row.items() if key}
+        waypoints.append((float(row.get("lat", row.get("latitude"))), float(row.get("lon", row.get("longitude")))))
+    return Mission(waypoints, loop)
+
+
+def load_geojson(path, loop=None):
+    """
+    Mission from a GeoJSON LineString (geometry, Feature or the first one in a
+    FeatureCollection) or from the Point features of a FeatureCollection in
+    order. A "loop" property is used unless loop is given.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    features = data["features"] if data.get("type") == "FeatureCollection" else [data]
+    properties = {}
+    coordinates = []
+    for feature in features:
+        geometry = feature.get("geometry", feature)
+        if geometry.get("type") == "LineString":
+            properties = feature.get("properties") or {}
+            coordinates = geometry["coordinates"]
+            break
+        if geometry.get("type") == "Point":
+            coordinates.append(geometry["coordinates"])
+    if loop is None:
+        loop = bool(properties.get("loop", (data.get("properties") or {}).get("loop", False)))
+    return Mission([(position[1], position[0]) for position in coordinates], loop)
+
+
+def load(path, loop=None):
+    """
+    Mission from a .csv or .geojson/.json file.
+    """
+    if path.lower().endswith(".csv"):
+        return load_csv(path, bool(loop))
+    return load_geojson(path, loop)
+
+
+def mission_path(address):
+    """
+    Mission file of the boat with the given LoRa address (uploaded missions are saved here).
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"mission_{address}.geojson")
+
+
+class MissionTracker:
+    """
+    Follows a mission leg by leg with line-of-sight guidance. Call start()
+    with the position when the mission begins (the first leg runs from there
+    to the first waypoint) and update() with every new GPS fix.
+    """
+
+    def __init__(self, mission, lookahead=LOOKAHEAD, acceptance_radius=ACCEPTANCE_RADIUS):
+        self.mission = mission
+        self.lookahead = lookahead
+        self.acceptance_radius = acceptance_radius
+        self.leg = None
+        # Index of the waypoint being approached
+        self.waypoint = 0
+        self.finished = False
+        self.laps = 0
+        self.target_heading = None
+        self.cross_track = 0.0
+        self.progress = 0.0
+
+    def reset(self):
+        """
+        Starts the mission over: the next update() begins the approach to the first waypoint.
+        """
+        self.leg = None
+        self.waypoint = 0
+        self.finished = False
+
+    def start(self, lat, lon):
+        self.waypoint = 0
+        self.laps = 0
+        self.finished = False
+        self.progress = 0.0
+        self._approach(self.mission.plane.to_enu(lat, lon))
+
+    def _approach(self, position):
+        # First leg: from where the mission starts to waypoint 0
+        self.leg = Leg(position, self.mission.points[0], 0.0)
+
+    def _next_leg(self):
+        mission = self.mission
+        if self.waypoint + 1 < len(mission.waypoints):
+            self.waypoint += 1
+        elif mission.loop and len(mission.waypoints) > 1:
+            self.waypoint = 0
+            self.laps += 1
+        else:
+            self.finished = True
+            self.progress = 100.0
+            return
+        # legs[i] ends at waypoint i + 1; waypoint 0 is reached by the closing leg when looping
+        self.leg = mission.legs[self.waypoint - 1]
+
+    def update(self, lat, lon):
+        """
+        Applies a GPS fix. Returns the heading to steer in degrees, or None once the mission is finished.
+        """
+        if self.leg is None:
+            self.start(lat, lon)
+        if self.finished:
+            return None
+        position = self.mission.plane.to_enu(lat, lon)
+        along, cross = self.leg.track(position)
+        # Move on when the waypoint is reached or passed (several in one fix if needed,
+        # but at most one lap so a mission smaller than the acceptance radius cannot spin)
+        for _ in range(len(self.mission.waypoints) + 1):
+            to_end = math.hypot(position[0] - self.leg.end[0], position[1] - self.leg.end[1])
+            if along < self.leg.length - self.acceptance_radius and to_end > self.acceptance_radius:
+                break
+            self._next_leg()
+            if self.finished:
+                return None
+            along, cross = self.leg.track(position)
+        self.cross_track = cross
+        if self.waypoint == 0 and self.laps == 0:
+            # Approach leg: not part of the mission length
+            self.progress = 0.0
+        elif self.mission.length > 0:
+            covered = self.leg.before + min(max(along, 0.0), self.leg.length)
+            self.progress = 100 * covered / self.mission.length
+        # Steer at the point `lookahead` ahead on the leg: bearing corrected towards the track
+        self.target_heading = (self.leg.bearing - math.degrees(math.atan2(cross, self.lookahead))) % 360
+        return self.target_heading
+
+    def status(self):
+        if self.finished:
+            return f"mission #{self.mission.id} finished"
+        return (f"waypoint {self.waypoint + 1}/{len(self.mission.waypoints)}, {self.progress:.0f}% done, "
+                f"{self.cross_track:+.1f} m off track")
+
+
+# --- Upload ---
+def encode_chunks(mission, chunk_bytes=CHUNK_BYTES):
+    """
+    Returns the MSN,... payloads that upload the mission.
+    """
+    data = mission.pack()
+    pieces = [data[i:i + chunk_bytes] for i in range(0, len(data), chunk_bytes)]
+    return [f"{CHUNK_PREFIX}{mission.id},{index},{len(pieces)},{base64.b64encode(piece).decode('ascii')}"
+            for index, piece in enumerate(pieces)]
+
+
+def parse_chunk(payload):
+    """
+    Parses a MSN,<id>,<index>,<count>,<data> payload into (id, index, count,
+    bytes). Returns None for other payloads and raises ValueError for
+    malformed ones.
+    """
+    if not payload.startswith(CHUNK_PREFIX):
+        return None
+    mission_id, index, count, data = payload[len(CHUNK_PREFIX):].split(",")
+    mission_id, index, count = int(mission_id), int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"chunk {index} of {count}")
+    try:
+        return mission_id, index, count, base64.b64decode(data, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"bad chunk encoding: {e}") from None
+
+
+def parse_ack(payload):
+    """
+    Parses a MACK,<id>,<index|DONE|ERR> payload into (id, index or DONE/ERR).
+    Returns None for other payloads and raises ValueError for malformed ones.
+    """
+    if not payload.startswith(ACK_PREFIX):
+        return None
+    mission_id, result = payload[len(ACK_PREFIX):].split(",")
+    return int(mission_id), result if result in (ACK_DONE, ACK_ERROR) else int(result)
+
+
+class MissionReceiver:
+    """
+    Boat side: reassembles uploaded chunks. handle() returns the ACK payload to
+    send back and the new Mission once its last chunk arrived (else None).
+    """
+
+    def __init__(self):
+        self.id = None
+        self.chunks = []
+        self.result = None
+
+    def handle(self, chunk):
+        mission_id, index, count, data = chunk
+        if mission_id != self.id or count != len(self.chunks):
+            # A new upload replaces an unfinished one
+            self.id = mission_id
+            self.chunks = [None] * count
+            self.result = None
+        if self.result is not None:
+            # Copy of a chunk of a mission already handled: its ACK was lost
+            return f"{ACK_PREFIX}{mission_id},{self.result}", None
+        self.chunks[index] = data
+        if any(piece is None for piece in self.chunks):
+            return f"{ACK_PREFIX}{mission_id},{index}", None
+        data = b"".join(self.chunks)
+        mission = None
+        if binascii.crc_hqx(data, 0xFFFF) == mission_id:
+            try:
+                mission = Mission.unpack(data)
+            except ValueError:
+                pass
+        self.result = ACK_DONE if mission is not None else ACK_ERROR
+        return f"{ACK_PREFIX}{mission_id},{self.result}", mission
+
+
+class MissionUpload:
+    """
+    Sender side: uploads a mission to one boat, one chunk at a time. Call
+    due() regularly and send what it returns; feed received payloads to ack().
+    """
+
+    def __init__(self, mission, address, sf=12, base=command_link.RETRY_BASE, maximum=command_link.RETRY_MAX,
+                 jitter=command_link.RETRY_JITTER, max_attempts=command_link.MAX_ATTEMPTS, rng=None):
+        self.mission = mission
+        self.address = address
+        self.chunks = encode_chunks(mission)
+        self.sf = sf
+        self.base = base
+        self.maximum = maximum
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.rng = rng or random.Random()
+        self.index = 0
+        self.attempts = 0
+        self.next_time = 0.0
+        self.started = None
+        self.finished = None
+        # None while uploading, then "loaded", "rejected" or "no answer"
+        self.result = None
+        self.transmissions = 0
+
+    def due(self, now):
+        """
+        Returns the (address, payload) to transmit now, or None.
+        """
+        if self.result is not None or now < self.next_time:
+            return None
+        if self.attempts >= self.max_attempts:
+            self.result = "no answer"
+            self.finished = now
+            return None
+        if self.started is None:
+            self.started = now
+        self.attempts += 1
+        payload = self.chunks[self.index]
+        # Wait for the chunk to go out and its ACK to come back
+        delay = min(self.base * 2 ** (self.attempts - 1), self.maximum)
+        self.next_time = (now + telemetry.lora_airtime(len(payload), sf=self.sf)
+                          + delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+        self.transmissions += 1
+        return self.address, payload
+
+    def ack(self, sender, payload, now):
+        """
+        Applies a received payload. Returns True if it acknowledged the current chunk.
+        """
+        try:
+            ack = parse_ack(payload)
+        except ValueError:
+            return False
+        if sender != self.address or ack is None or ack[0] != self.mission.id or self.result is not None:
+            return False
+        result = ack[1]
+        if result in (ACK_DONE, ACK_ERROR):
+            self.result = "loaded" if result == ACK_DONE else "rejected"
+            self.finished = now
+            return True
+        if result != self.index:
+            return False
+        self.index += 1
+        self.attempts = 0
+        self.next_time = now
+        return True
+
+    def status(self, now):
+        if self.result is None:
+            return (f"Uploading {self.mission.summary()} to {self.address}: chunk {self.index + 1}/{len(self.chunks)}, "
+                    f"attempt {self.attempts}")
+        return (f"Upload of mission #{self.mission.id} to {self.address}: {self.result} after "
+                f"{self.finished - (self.started or self.finished):.1f} s ({self.transmissions} transmissions)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a waypoint mission and install it for a boat")
+    parser.add_argument("path", help="CSV (lat,lon) or GeoJSON mission file")
+    parser.add_argument("--loop", action="store_true", help="go back to the first waypoint after the last")
+    parser.add_argument("--address", type=int, help="save as the mission of the boat with this LoRa address")
+    args = parser.parse_args()
+
+    mission = load(args.path, True if args.loop else None)
+    print(mission.summary())
+    # Each waypoint with the bearing and length of the leg leaving it
+    for index, (lat, lon) in enumerate(mission.waypoints):
+        leg = ""
+        if index < len(mission.legs):
+            leg = f"{mission.legs[index].bearing:5.1f}° {mission.legs[index].length:7.1f} m"
+        print(f"  {index + 1:>3}  {lat:.7f}, {lon:.7f}  {leg}")
+    chunks = encode_chunks(mission)
+    airtime = sum(telemetry.lora_airtime(len(chunk)) for chunk in chunks)
+    print(f"Upload: {len(chunks)} chunks, {airtime:.1f} s on air at SF12")
+    if args.address is not None:
+        path = mission_path(args.address)
+        mission.save(path)
+        print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import hardware
+
+# --- TB6612FNG Motor Driver ---
+# Keeps the last commanded level of every driver pin and the last PWM duty cycle
+# of each motor, and only sends pigpio what changed. All direction/standby pins
+# that change together are applied with one clear_bank_1 and one set_bank_1
+# call, so both motors switch direction in the same instant instead of one
+# motor running reversed while the other pins are still being written.
+
+
+class MotorDriver:
+    """
+    State-caching driver for two motors on a TB6612FNG. Motor A is the left
+    motor. Duty cycles are signed: positive is forward, negative is reverse.
+    """
+
+    def __init__(self, pi, ain1, ain2, bin1, bin2, pwma, pwmb, stby,
+                 left_balance=1.0, right_balance=1.0):
+        self.pi = pi
+        self.ain1, self.ain2, self.bin1, self.bin2 = ain1, ain2, bin1, bin2
+        self.pwma, self.pwmb, self.stby = pwma, pwmb, stby
+        self.left_balance = left_balance
+        self.right_balance = right_balance
+        # Last level written to each logic pin and last duty cycle of each PWM pin;
+        # None until the first write, so the first command sets everything
+        self.levels = {pin: None for pin in (stby, ain1, ain2, bin1, bin2)}
+        self.duty = {pwma: None, pwmb: None}
+        # Last commanded signed duty cycles (0 when stopped)
+        self.left = self.right = 0
+        # Statistics: commands received and pigpio calls actually issued
+        self.commands = 0
+        self.pigpio_calls = 0
+
+    def setup(self):
+        """
+        Configures the logic pins as outputs.
+        """
+        for pin in self.levels:
+            self.pi.set_mode(pin, hardware.OUTPUT)
+            self.pigpio_calls += 1
+
+    def _set_levels(self, levels):
+        # Bit masks of the pins that have to go low and high
+        low = high = 0
+        for pin, level in levels.items():
+            if self.levels[pin] != level:
+                if level:
+                    high |= 1 << pin
+                else:
+                    low |= 1 << pin
+                self.levels[pin] = level
+        # Clearing first passes through IN1 = IN2 = 0 (coast), never through brake
+        if low:
+            self.pi.clear_bank_1(low)
+            self.pigpio_calls += 1
+        if high:
+            self.pi.set_bank_1(high)
+            self.pigpio_calls += 1
+
+    def _set_duty(self, pin, duty):
+        if self.duty[pin] != duty:
+            self.pi.set_PWM_dutycycle(pin, duty)
+            self.duty[pin] = duty
+            self.pigpio_calls += 1
+
+    def drive(self, left, right):
+        """
+        Drives the left and right motors at signed duty cycles (-255 to 255),
+        applying the balance factors.
+        """
+        self.commands += 1
+        self.left, self.right = left, right
+        self._set_levels({
+            self.stby: 1,
+            self.ain1: 1 if left >= 0 else 0, self.ain2: 0 if left >= 0 else 1,
+            self.bin1: 1 if right >= 0 else 0, self.bin2: 0 if right >= 0 else 1,
+        })
+        self._set_duty(self.pwma, min(255, int(abs(left) * self.left_balance)))
+        self._set_duty(self.pwmb, min(255, int(abs(right) * self.right_balance)))
+
+    def stop(self):
+        """
+        Sets both duty cycles to 0 and disables the driver.
+        """
+        self.commands += 1
+        self.left = self.right = 0
+        self._set_duty(self.pwma, 0)
+        self._set_duty(self.pwmb, 0)
+        self._set_levels({self.stby: 0})
+
+    def summary(self):
+        calls_per_command = self.pigpio_calls / self.commands if self.commands else 0.0
+        return f"{self.commands} commands, {self.pigpio_calls} pigpio calls ({calls_per_command:.2f} per command)"
@@ -0,0 +1,219 @@
+import argparse
+import collections
+import csv
+import json
+import math
+import os
+
+# --- RSSI Range Estimator ---
+# LoRa RSSI on water jumps 5-10 dB from packet to packet, so a single reading
+# says little about the distance to the leader. The estimator filters the
+# readings in two O(1) stages:
+#   1. Hampel filter: a reading further than HAMPEL_THRESHOLD scaled median
+#      absolute deviations from the median of the last HAMPEL_WINDOW readings is
+#      replaced by that median.
+#   2. 1-D Kalman filter on x = log10(distance) with the log-distance path-loss
+#      model as the measurement: rssi = rssi_at_1m - 10 * exponent * x + noise,
+#      where the noise is the shadowing. x follows a random walk between packets.
+# The output is the distance in metres and its variance.
+#
+# Calibrate the model from a distance sweep (drive the follower away from the
+# leader and log "distance,rssi" rows, distances e.g. from GPS or a range finder):
+#   python3 range_estimator.py sweep_101.csv --address 101
+
+# Default path-loss model (the one swarm_sim.py uses): RSSI at 1 m in dBm, path
+# loss exponent (2 = free space; 2.5-3 over water with low antennas) and the
+# standard deviation of the shadowing in dB
+RSSI_AT_1M = -35.0
+PATH_LOSS_EXPONENT = 2.5
+SHADOWING_DB = 4.0
+
+# Readings in the Hampel window and the outlier threshold in scaled MADs
+HAMPEL_WINDOW = 7
+HAMPEL_THRESHOLD = 3.0
+# Smallest MAD in dB used by the Hampel test (identical readings would otherwise reject everything)
+MIN_MAD_DB = 1.0
+# Random-walk variance of log10(distance) per second (how fast the distance can change)
+PROCESS_NOISE = 0.002
+# Shortest and longest distance in metres the estimate is clamped to
+MIN_DISTANCE = 1.0
+MAX_DISTANCE = 2000.0
+
+
+class PathLossModel:
+    """
+    Log-distance path-loss model: rssi = rssi_at_1m - 10 * exponent * log10(distance).
+    """
+
+    def __init__(self, rssi_at_1m=RSSI_AT_1M, exponent=PATH_LOSS_EXPONENT, shadowing_db=SHADOWING_DB):
+        self.rssi_at_1m = rssi_at_1m
+        self.exponent = exponent
+        self.shadowing_db = shadowing_db
+
+    def rssi(self, distance):
+        """
+        Mean RSSI in dBm at a distance in metres.
+        """
+        return self.rssi_at_1m - 10 * self.exponent * math.log10(max(distance, MIN_DISTANCE))
+
+    def distance(self, rssi):
+        """
+        Distance in metres at which the mean RSSI equals rssi.
+        """
+        return 10 ** ((self.rssi_at_1m - rssi) / (10 * self.exponent))
+
+    @classmethod
+    def fit(cls, distances, rssis):
+        """
+        Least-squares fit of the model to (distance, rssi) samples; the shadowing
+        is the standard deviation of the residuals.
+        """
+        points = [(math.log10(d), r) for d, r in zip(distances, rssis) if d >= MIN_DISTANCE]
+        if len(points) < 3:
+            raise ValueError("need at least 3 samples at 1 m or more")
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_r = sum(r for _, r in points) / n
+        sxx = sum((x - mean_x) ** 2 for x, _ in points)
+        if sxx < 1e-6:
+            raise ValueError("the samples do not cover a range of distances")
+        slope = sum((x - mean_x) * (r - mean_r) for x, r in points) / sxx
+        if slope >= 0:
+            raise ValueError("RSSI does not fall with distance in the samples")
+        intercept = mean_r - slope * mean_x
+        residuals = [r - (intercept + slope * x) for x, r in points]
+        shadowing = math.sqrt(sum(e * e for e in residuals) / max(n - 2, 1))
+        return cls(intercept, -slope / 10, shadowing)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"rssi_at_1m": self.rssi_at_1m, "exponent": self.exponent,
+                       "shadowing_db": self.shadowing_db}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a calibration file, or returns the default model if it does not exist.
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["rssi_at_1m"], data["exponent"], data["shadowing_db"])
+
+
+def calibration_path(address):
+    """
+    Default path-loss calibration file of the boat with the given LoRa address.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"range_calibration_{address}.json")
+
+
+class RangeEstimator:
+    """
+    Distance to the leader from its packets' RSSI (Hampel filter + Kalman
+    filter on log10 of the distance). Each update costs O(HAMPEL_WINDOW).
+    """
+
+    def __init__(self, model=None, window=HAMPEL_WINDOW, threshold=HAMPEL_THRESHOLD, process_noise=PROCESS_NOISE):
+        self.model = model or PathLossModel()
+        self.window = collections.deque(maxlen=window)
+        self.threshold = threshold
+        self.process_noise = process_noise
+        # Kalman state: log10(distance), its variance and the time of the last update
+        self.x = None
+        self.p = None
+        self.last_time = None
+        self.samples = 0
+        self.outliers = 0
+
+    def reset(self):
+        self.window.clear()
+        self.x = self.p = self.last_time = None
+
+    def hampel(self, rssi):
+        """
+        Returns rssi, or the window median if rssi is an outlier.
+        """
+        self.window.append(rssi)
+        if len(self.window) < 3:
+            return rssi
+        ordered = sorted(self.window)
+        median = ordered[len(ordered) // 2]
+        mad = sorted(abs(r - median) for r in ordered)[len(ordered) // 2]
+        # 1.4826 * MAD estimates the standard deviation of normally distributed readings
+        if abs(rssi - median) > self.threshold * 1.4826 * max(mad, MIN_MAD_DB):
+            self.outliers += 1
+            return median
+        return rssi
+
+    def update(self, rssi, now):
+        """
+        Applies an RSSI reading taken at monotonic time `now` and returns the
+        estimated (distance in metres, variance in square metres).
+        """
+        self.samples += 1
+        z = self.hampel(rssi)
+        h = -10 * self.model.exponent
+        r = self.model.shadowing_db ** 2
+        if self.x is None:
+            # First reading: invert the model, with the measurement noise as uncertainty
+            self.x = (z - self.model.rssi_at_1m) / h
+            self.p = r / (h * h)
+        else:
+            # Predict: the distance may have drifted since the last packet
+            self.p += self.process_noise * max(now - self.last_time, 0.0)
+            # Update with the (filtered) reading
+            innovation = z - (self.model.rssi_at_1m + h * self.x)
+            gain = self.p * h / (h * h * self.p + r)
+            self.x += gain * innovation
+            self.p *= 1 - gain * h
+        self.x = min(max(self.x, math.log10(MIN_DISTANCE)), math.log10(MAX_DISTANCE))
+        self.last_time = now
+        return self.distance, self.variance
+
+    @property
+    def distance(self):
+        return None if self.x is None else 10 ** self.x
+
+    @property
+    def variance(self):
+        """
+        Variance of the distance estimate in square metres (first-order from the log-domain variance).
+        """
+        if self.x is None:
+            return None
+        return (math.log(10) * 10 ** self.x) ** 2 * self.p
+
+
+def read_sweep(path):
+    """
+    Reads a distance sweep CSV with "distance" and "rssi" columns.
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return [float(row["distance"]) for row in rows], [float(row["rssi"]) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the RSSI path-loss model to a logged distance sweep")
+    parser.add_argument("sweep", help="CSV file with distance (m) and rssi (dBm) columns")
+    parser.add_argument("--address", type=int, required=True, help="LoRa address of the follower")
+    args = parser.parse_args()
+
+    distances, rssis = read_sweep(args.sweep)
+    try:
+        model = PathLossModel.fit(distances, rssis)
+    except ValueError as e:
+        print(f"Calibration failed: {e}")
+        return
+    print(f"{len(distances)} samples from {min(distances):.1f} to {max(distances):.1f} m")
+    print(f"RSSI at 1 m: {model.rssi_at_1m:.1f} dBm, path loss exponent {model.exponent:.2f}, "
+          f"shadowing {model.shadowing_db:.1f} dB")
+    path = calibration_path(args.address)
+    model.save(path)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
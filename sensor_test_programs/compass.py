@@ -1,8 +1,18 @@
+import os
+import sys
 import time
 import math
 import smbus2
 import serial
 
+#Optional hard/soft-iron calibration file made by compass_calibration.py, passed as the first argument:
+#python3 compass.py compass_calibration_101.json
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+calibration = None
+if len(sys.argv) > 1:
+	import compass_calibration
+	calibration = compass_calibration.CompassCalibration.load(sys.argv[1])
+
 #HMC5883l I2C Address found by using sudo i2cdetect -y 1 command in terminal
 HMC5883l_ADDR = 0x1E
 
@@ -94,6 +104,10 @@ while True:
 	#Calls read_data function to get the X, Y, and Z magnetometer values
 	x, y, z = read_data()
 
+	#Apply the hard-iron offset and soft-iron matrix if a calibration was loaded
+	if calibration is not None:
+		x, y = calibration.apply(x, y)
+
 	heading = calculate_heading(x, y)
 
 	direction = get_direction(heading)
@@ -0,0 +1,436 @@
+import argparse
+import time
+
+import numpy as np
+
+import follower_control
+import heading_controller
+import tdma
+import telemetry
+
+# --- Swarm Simulator ---
+# Runs one leader and N followers as NumPy arrays: the leader drives the route
+# from leaderboat.py and broadcasts telemetry, each follower runs the control law
+# from follower_control.py, and every packet goes through a LoRa channel model
+# (log-distance RSSI with shadowing, airtime, collisions with capture effect,
+# half-duplex radios). Reports formation convergence and packet loss versus
+# swarm size. --controller bangbang runs the old spin-in-place heading control
+# instead of the PID from heading_controller.py for comparison. --mac tdma sends
+# every frame in its node's TDMA slot (see tdma.py) instead of unscheduled
+# (pure ALOHA); --mac both compares the two.
+#
+#   python3 swarm_sim.py --sizes 1 5 10 20 50 100 200
+#   python3 swarm_sim.py --mac both --sizes 5 20 50
+
+# Simulation time step in seconds (also the follower control period)
+DT = 0.05
+
+# --- Hull Model ---
+# Turn rate in degrees per second with one motor full forward and the other full reverse
+MAX_TURN_RATE = 90.0
+# Speed in metres per second with both motors at full duty
+MAX_SPEED = 2.0
+# Time constant in seconds of the surge speed response to thrust
+SPEED_TIME_CONSTANT = 1.5
+
+# --- Leader Route (mirrors ROUTE in leaderboat.py) ---
+FORWARD_PWM = 90
+TURN_PWM = 80
+# (segment, duration in seconds, left duty, right duty); telemetry is sent when BROADCAST starts
+ROUTE = [
+    ("FORWARD", 3.0, FORWARD_PWM, FORWARD_PWM),
+    ("TURN", 1.5, -TURN_PWM, TURN_PWM),
+    ("PAUSE", 0.5, 0, 0),
+    ("BROADCAST", 1.0, 0, 0),
+]
+
+# --- LoRa Channel Model ---
+# RSSI in dBm at the 1 m reference distance
+RSSI_AT_1M = -35.0
+# Path loss exponent (2 = free space; 2.5-3 over water with low antennas)
+PATH_LOSS_EXPONENT = 2.5
+# Standard deviation in dB of the per-packet log-normal shadowing
+SHADOWING_DB = 4.0
+# Receiver sensitivity in dBm (RYLR896 at SF12, 125 kHz)
+SENSITIVITY_DBM = -136.0
+# A packet survives a collision if it is this many dB stronger than every interferer
+CAPTURE_DB = 6.0
+# Size in bytes of telemetry and status frames (see telemetry.py)
+FRAME_BYTES = 29
+
+
+def distance_for_rssi(rssi):
+    """
+    Distance in metres at which the mean RSSI of the channel model equals rssi.
+    """
+    return 10 ** ((RSSI_AT_1M - rssi) / (10 * PATH_LOSS_EXPONENT))
+
+
+def rssi_to_pwm(rssi):
+    """
+    Vectorized follower_control.rssi_to_pwm.
+    """
+    ratio = (follower_control.RSSI_CLOSE - rssi) / (follower_control.RSSI_CLOSE - follower_control.RSSI_FAR)
+    pwm = follower_control.PWM_MIN + (follower_control.PWM_MAX - follower_control.PWM_MIN) * np.clip(ratio, 0, 1)
+    return pwm.astype(int)
+
+
+def motor_directions(diff):
+    """
+    Vectorized follower_control.motor_directions.
+    """
+    straight = np.abs(diff) <= follower_control.HEADING_TOLERANCE
+    left = np.where(straight | (diff > 0), 1, -1)
+    right = np.where(straight | (diff <= 0), 1, -1)
+    return left, right
+
+
+def differential_thrust(base_pwm, turn):
+    """
+    Vectorized heading_controller.differential_thrust.
+    """
+    limit = heading_controller.PWM_LIMIT
+    excess = np.maximum(np.maximum(base_pwm + turn, base_pwm - turn) - limit, 0)
+    left = np.clip(base_pwm + turn - excess, -limit, limit)
+    right = np.clip(base_pwm - turn - excess, -limit, limit)
+    return left, right
+
+
+class HeadingPID:
+    """
+    Vectorized heading_controller.HeadingPID (one controller per follower).
+    """
+
+    def __init__(self, n):
+        self.integral = np.zeros(n)
+        self.previous_heading = None
+
+    def update(self, target, heading, dt):
+        error = wrap_heading(target - heading)
+        rate = 0.0 if self.previous_heading is None else wrap_heading(heading - self.previous_heading) / dt
+        self.previous_heading = heading.copy()
+        kp, ki, kd = heading_controller.KP, heading_controller.KI, heading_controller.KD
+        limit = heading_controller.TURN_LIMIT
+        unclamped = kp * error + ki * self.integral - kd * rate
+        integrate = (np.abs(unclamped) < limit) | ((unclamped > 0) != (error > 0))
+        bound = heading_controller.INTEGRAL_LIMIT / ki
+        self.integral = np.where(integrate, np.clip(self.integral + error * dt, -bound, bound), self.integral)
+        return np.clip(kp * error + ki * self.integral - kd * rate, -limit, limit)
+
+
+def wrap_heading(diff):
+    """
+    Vectorized follower_control.heading_difference normalization to -180..180.
+    """
+    return (diff + 180) % 360 - 180
+
+
+class Swarm:
+    """
+    State of one simulated swarm. Index 0 is the leader, 1..N are followers.
+    """
+
+    def __init__(self, followers, rng, sf=12, status_period=5.0, controller="pid", mac="aloha"):
+        self.n = followers + 1
+        self.controller = controller
+        self.mac = mac
+        self.rng = rng
+        self.airtime = telemetry.lora_airtime(FRAME_BYTES, sf=sf)
+        self.status_period = status_period
+
+        # Hull state
+        self.x = np.zeros(self.n)
+        self.y = np.zeros(self.n)
+        self.heading = np.zeros(self.n)
+        self.speed = np.zeros(self.n)
+        self.left = np.zeros(self.n)
+        self.right = np.zeros(self.n)
+        # Followers start scattered behind the leader, from the near edge of the
+        # formation band to 1.5 times its far edge, with random headings
+        near = distance_for_rssi(follower_control.RSSI_CLOSE)
+        far = distance_for_rssi(follower_control.RSSI_FAR)
+        r = rng.uniform(near, 1.5 * far, followers)
+        bearing = np.radians(rng.uniform(135, 225, followers))
+        self.x[1:] = r * np.sin(bearing)
+        self.y[1:] = r * np.cos(bearing)
+        self.heading[1:] = rng.uniform(0, 360, followers)
+
+        # Follower control state
+        self.leader_heading = np.full(self.n, np.nan)
+        self.pwm = np.full(self.n, 90)
+        self.pid = HeadingPID(followers)
+
+        # Radio state: current and previous transmission interval of every node
+        self.cur_start = np.full(self.n, -np.inf)
+        self.cur_end = np.full(self.n, -np.inf)
+        self.prev_start = np.full(self.n, -np.inf)
+        self.prev_end = np.full(self.n, -np.inf)
+        # Heading carried by the leader's packet currently on air
+        self.tx_heading = 0.0
+        # Followers have a status frame to send every status_period seconds (random phase).
+        # ALOHA: sent right away. TDMA: sent at the start of the follower's next slot
+        # (node i has slot i, the leader slot 0), as is the leader's telemetry frame
+        self.next_status = np.full(self.n, np.inf)
+        if status_period > 0:
+            self.next_status[1:] = rng.uniform(0, status_period, followers)
+        self.frame_period = tdma.frame_period(self.n, sf)
+        self.next_slot = np.arange(self.n) * tdma.slot_time(sf)
+        self.telemetry_pending = False
+
+        # Route state
+        self.route_index = 0
+        self.segment_end = ROUTE[0][1]
+
+        # Counters
+        self.telemetry_sent = 0
+        self.telemetry_received = 0
+        self.status_sent = 0
+        self.status_received = 0
+        # Finished packets and how many of them overlapped another transmission
+        self.packets_finished = 0
+        self.packets_collided = 0
+        # Follower control steps with the motors turning in opposite directions
+        self.spin_steps = 0
+        self.active_steps = 0
+        # Heading settling: time from a new leader heading until the error is within tolerance
+        self.t = 0.0
+        self.target_time = np.zeros(self.n)
+        self.settling = np.zeros(self.n, dtype=bool)
+        self.settle_total = 0.0
+        self.settle_count = 0
+
+    # --- Channel ---
+    def rssi(self, senders, receivers):
+        """
+        Received power in dBm for every (sender, receiver) pair, with fresh shadowing.
+        """
+        dx = self.x[senders][:, None] - self.x[receivers][None, :]
+        dy = self.y[senders][:, None] - self.y[receivers][None, :]
+        distance = np.maximum(np.hypot(dx, dy), 1.0)
+        shadowing = self.rng.normal(0, SHADOWING_DB, distance.shape)
+        return RSSI_AT_1M - 10 * PATH_LOSS_EXPONENT * np.log10(distance) + shadowing
+
+    def start_transmission(self, nodes, t):
+        self.prev_start[nodes] = self.cur_start[nodes]
+        self.prev_end[nodes] = self.cur_end[nodes]
+        self.cur_start[nodes] = t
+        self.cur_end[nodes] = t + self.airtime
+
+    def overlapping(self, senders):
+        """
+        (len(senders), n) mask of nodes whose transmissions overlap each sender's current packet.
+        """
+        start = self.cur_start[senders][:, None]
+        end = self.cur_end[senders][:, None]
+        overlap = (((self.cur_start[None, :] < end) & (self.cur_end[None, :] > start))
+                   | ((self.prev_start[None, :] < end) & (self.prev_end[None, :] > start)))
+        overlap[np.arange(len(senders)), senders] = False
+        return overlap
+
+    def count_collisions(self, overlap):
+        self.packets_finished += len(overlap)
+        self.packets_collided += int(np.any(overlap, axis=1).sum())
+
+    def deliver_telemetry(self):
+        """
+        The leader's packet just finished: decide which followers decoded it.
+        """
+        followers = np.arange(1, self.n)
+        signal = self.rssi(np.array([0]), followers)[0]
+        received = signal >= SENSITIVITY_DBM
+        overlap = self.overlapping(np.array([0]))
+        self.count_collisions(overlap)
+        interferers = np.flatnonzero(overlap[0])
+        if len(interferers):
+            power = self.rssi(interferers, followers)
+            received &= ~np.any(power > signal - CAPTURE_DB, axis=0)
+            # A follower that was transmitting itself cannot receive (half duplex)
+            received[interferers - 1] = False
+        self.telemetry_received += int(received.sum())
+
+        # Followers that decoded the frame update their heading target and PWM
+        got = followers[received]
+        self.leader_heading[got] = self.tx_heading
+        self.target_time[got] = self.t
+        self.settling[got] = True
+        self.pwm[got] = rssi_to_pwm(np.round(signal[received]))
+
+    def deliver_status(self, senders):
+        """
+        Follower packets just finished: decide which ones the leader decoded.
+        """
+        signal = self.rssi(senders, np.array([0]))[:, 0]
+        received = signal >= SENSITIVITY_DBM
+        overlap = self.overlapping(senders)
+        self.count_collisions(overlap)
+        power_at_leader = self.rssi(np.arange(self.n), np.array([0]))[:, 0]
+        received &= ~np.any(overlap & (power_at_leader[None, :] > signal[:, None] - CAPTURE_DB), axis=1)
+        # The leader cannot receive while it is transmitting
+        received &= ~overlap[:, 0]
+        self.status_received += int(received.sum())
+
+    # --- Step ---
+    def step(self, t):
+        self.t = t
+        # Leader route: advance segments and broadcast at the start of BROADCAST
+        if t >= self.segment_end:
+            self.route_index = (self.route_index + 1) % len(ROUTE)
+            self.segment_end += ROUTE[self.route_index][1]
+            if ROUTE[self.route_index][0] == "BROADCAST":
+                self.tx_heading = self.heading[0]
+                self.telemetry_pending = True
+        _, _, left, right = ROUTE[self.route_index]
+        self.left[0], self.right[0] = left / 255, right / 255
+
+        if self.mac == "tdma":
+            # Nodes whose slot starts during this step
+            in_slot = self.next_slot <= t
+            self.next_slot[in_slot] += self.frame_period
+        else:
+            in_slot = np.ones(self.n, dtype=bool)
+        # Leader telemetry (the heading is taken when BROADCAST starts, as in leaderboat.py)
+        if self.telemetry_pending and in_slot[0]:
+            self.start_transmission(np.array([0]), t)
+            self.telemetry_sent += 1
+            self.telemetry_pending = False
+
+        # Follower status frames (a node that is still transmitting waits until it is done)
+        due = np.flatnonzero((self.next_status <= t) & (self.cur_end <= t) & in_slot)
+        if len(due):
+            self.start_transmission(due, t)
+            self.next_status[due] = t + self.status_period * self.rng.uniform(0.9, 1.1, len(due))
+            self.status_sent += len(due)
+
+        # Packets finishing during this step
+        finished = np.flatnonzero((self.cur_end > t - DT) & (self.cur_end <= t))
+        if len(finished):
+            if finished[0] == 0:
+                self.deliver_telemetry()
+                finished = finished[1:]
+            if len(finished):
+                self.deliver_status(finished)
+
+        # Follower control law (only once leader data has been received)
+        follower = slice(1, self.n)
+        active = ~np.isnan(self.leader_heading[follower])
+        if self.controller == "pid":
+            target = np.where(active, self.leader_heading[follower], self.heading[follower])
+            turn = self.pid.update(target, self.heading[follower], DT)
+            left, right = differential_thrust(self.pwm[follower], turn)
+            self.left[follower] = np.where(active, left / 255, 0.0)
+            self.right[follower] = np.where(active, right / 255, 0.0)
+        else:
+            diff = wrap_heading(self.leader_heading[follower] - self.heading[follower])
+            left_dir, right_dir = motor_directions(diff)
+            duty = np.where(active, self.pwm[follower] / 255, 0.0)
+            self.left[follower] = left_dir * duty
+            self.right[follower] = right_dir * duty
+        self.spin_steps += int(np.sum(active & (self.left[follower] * self.right[follower] < 0)))
+        self.active_steps += int(active.sum())
+        # Followers whose heading error just came within tolerance of the latest target
+        aligned = np.abs(wrap_heading(self.leader_heading - self.heading)) <= follower_control.HEADING_TOLERANCE
+        done = np.flatnonzero(self.settling & aligned)
+        self.settle_total += float(np.sum(t - self.target_time[done]))
+        self.settle_count += len(done)
+        self.settling[done] = False
+
+        # Hull dynamics
+        self.heading = (self.heading + MAX_TURN_RATE * (self.left - self.right) / 2 * DT) % 360
+        target_speed = MAX_SPEED * (self.left + self.right) / 2
+        self.speed += (target_speed - self.speed) * DT / SPEED_TIME_CONSTANT
+        rad = np.radians(self.heading)
+        self.x += self.speed * np.sin(rad) * DT
+        self.y += self.speed * np.cos(rad) * DT
+
+    # --- Metrics ---
+    def in_formation(self):
+        """
+        Mask of followers whose distance to the leader is inside the RSSI band.
+        """
+        distance = np.hypot(self.x[1:] - self.x[0], self.y[1:] - self.y[0])
+        return ((distance >= distance_for_rssi(follower_control.RSSI_CLOSE))
+                & (distance <= distance_for_rssi(follower_control.RSSI_FAR)))
+
+    def heading_error(self):
+        return np.abs(wrap_heading(self.heading[1:] - self.heading[0]))
+
+
+def simulate(followers, duration, seed=0, sf=12, status_period=5.0, converged_fraction=0.8, controller="pid",
+             mac="aloha"):
+    """
+    Runs one swarm and returns its metrics as a dict.
+    """
+    swarm = Swarm(followers, np.random.default_rng(seed), sf=sf, status_period=status_period,
+                  controller=controller, mac=mac)
+    steps = int(duration / DT)
+    settle_from = int(steps * 0.75)
+    in_band = []
+    heading_error = []
+    # Time after which at least converged_fraction of the followers stayed in the band
+    converged_at = 0.0
+    wall_start = time.perf_counter()
+    for i in range(steps):
+        t = i * DT
+        swarm.step(t)
+        fraction = swarm.in_formation().mean()
+        if fraction < converged_fraction:
+            converged_at = None if i == steps - 1 else t + DT
+        if i >= settle_from:
+            in_band.append(fraction)
+            heading_error.append(swarm.heading_error().mean())
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "followers": followers,
+        "channel_load": (swarm.telemetry_sent + swarm.status_sent) * swarm.airtime / duration,
+        "telemetry_loss": 1 - swarm.telemetry_received / max(swarm.telemetry_sent * followers, 1),
+        "status_loss": 1 - swarm.status_received / swarm.status_sent if swarm.status_sent else float("nan"),
+        "collided": swarm.packets_collided / max(swarm.packets_finished, 1),
+        # Status frames decoded by the leader per minute
+        "goodput": swarm.status_received * 60 / duration,
+        "in_formation": float(np.mean(in_band)),
+        "heading_error": float(np.mean(heading_error)),
+        "converged_at": converged_at,
+        "heading_settle": swarm.settle_total / swarm.settle_count if swarm.settle_count else float("nan"),
+        "spinning": swarm.spin_steps / max(swarm.active_steps, 1),
+        "wall": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized leader/follower swarm simulator")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 20, 50, 100, 200],
+                        help="numbers of followers to simulate")
+    parser.add_argument("--duration", type=float, default=600, help="simulated seconds per run")
+    parser.add_argument("--sf", type=int, default=12, help="LoRa spreading factor")
+    parser.add_argument("--status-period", type=float, default=5.0,
+                        help="seconds between follower status frames (0 disables them)")
+    parser.add_argument("--controller", choices=["pid", "bangbang"], default="pid",
+                        help="follower heading control (bangbang = old spin-in-place control)")
+    parser.add_argument("--mac", choices=["aloha", "tdma", "both"], default="aloha",
+                        help="channel access: unscheduled (aloha), TDMA slots, or both for comparison")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    airtime = telemetry.lora_airtime(FRAME_BYTES, sf=args.sf)
+    print(f"SF{args.sf}: {FRAME_BYTES}-byte frame airtime {airtime * 1000:.0f} ms, "
+          f"formation band {distance_for_rssi(follower_control.RSSI_CLOSE):.1f}-"
+          f"{distance_for_rssi(follower_control.RSSI_FAR):.1f} m")
+    print(f"{'followers':>9} {'mac':>5} {'load':>6} {'collided':>8} {'telem loss':>10} {'status loss':>11} "
+          f"{'status/min':>10} {'in band':>8} {'hdg err':>8} {'hdg settle':>10} {'spinning':>8} {'settled':>8} "
+          f"{'wall s':>7}")
+    macs = ["aloha", "tdma"] if args.mac == "both" else [args.mac]
+    for size in args.sizes:
+        for mac in macs:
+            m = simulate(size, args.duration, seed=args.seed, sf=args.sf, status_period=args.status_period,
+                         controller=args.controller, mac=mac)
+            converged = f"{m['converged_at']:.0f} s" if m["converged_at"] is not None else "never"
+            status_loss = f"{m['status_loss']:.1%}" if args.status_period > 0 else "-"
+            print(f"{m['followers']:>9} {mac:>5} {m['channel_load']:>6.2f} {m['collided']:>8.1%} "
+                  f"{m['telemetry_loss']:>10.1%} {status_loss:>11} {m['goodput']:>10.1f} "
+                  f"{m['in_formation']:>8.1%} {m['heading_error']:>7.1f}° {m['heading_settle']:>8.2f} s "
+                  f"{m['spinning']:>8.1%} {converged:>8} {m['wall']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
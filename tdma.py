@@ -0,0 +1,214 @@
+import collections
+import math
+
+import telemetry
+
+# --- TDMA Transmit Scheduling ---
+# The boats share the channel in a repeating frame of equal slots. Each boat
+# owns one slot, derived from its LoRa address: slot = address - leader
+# address, so the leader has slot 0. A boat whose address is outside the frame
+# has no slot (it is not wrapped around onto another boat's slot: that would
+# make the two collide every frame). A slot fits one frame of up to
+# MAX_FRAME_BYTES at the configured spreading factor plus a guard time.
+#
+# The leader announces the frame as TDMA,<frame period in ms>,<slots> and sends
+# its telemetry frames at the very start of its slot. Followers take the frame
+# start from the reception time of a telemetry frame minus its airtime, so no
+# clock synchronisation is needed. Outgoing frames are queued until the boat's
+# slot; a follower that has no schedule (or lost sync) sends them right away,
+# as before.
+
+# Largest frame sent in one slot (binary telemetry frame: "#" + base64 of 21 bytes)
+MAX_FRAME_BYTES = 29
+# Idle time at the end of each slot for clock drift, serial latency and loop jitter
+GUARD_TIME = 0.1
+# Telemetry (sync) frames are only sent this close to the start of the leader's slot
+SYNC_WINDOW = 0.05
+# Seconds without a sync frame after which a follower sends unscheduled again
+SYNC_TIMEOUT = 60.0
+# Outgoing frames waiting for the slot; the oldest is dropped when full
+QUEUE_SIZE = 8
+
+ANNOUNCE_PREFIX = "TDMA,"
+
+
+def slot_time(sf=12, frame_bytes=MAX_FRAME_BYTES, guard=GUARD_TIME):
+    """
+    Length in seconds of one slot: the airtime of the largest frame plus the guard time.
+    """
+    return telemetry.lora_airtime(frame_bytes, sf=sf) + guard
+
+
+def frame_period(slots, sf=12):
+    return slots * slot_time(sf)
+
+
+def slot_index(address, leader_address, slots):
+    """
+    Slot of the boat at `address` in a frame of `slots` slots starting with the
+    leader's. Raises ValueError if the address is outside the frame.
+    """
+    slot = address - leader_address
+    if not 0 <= slot < slots:
+        raise ValueError(f"address {address} has no slot in the {slots}-slot frame of leader {leader_address} "
+                         f"(addresses {leader_address}-{leader_address + slots - 1}; raise SWARM_SIZE)")
+    return slot
+
+
+def encode_announcement(period, slots):
+    return f"{ANNOUNCE_PREFIX}{round(period * 1000)},{slots}"
+
+
+def parse_announcement(payload):
+    """
+    Parses a TDMA,<frame period ms>,<slots> payload into (frame period in s, slots).
+    Returns None for other payloads and raises ValueError for malformed ones.
+    """
+    if not payload.startswith(ANNOUNCE_PREFIX):
+        return None
+    period_ms, slots = payload[len(ANNOUNCE_PREFIX):].split(",")
+    period, slots = int(period_ms) / 1000, int(slots)
+    if period <= 0 or slots <= 0:
+        raise ValueError(f"invalid TDMA schedule {payload!r}")
+    return period, slots
+
+
+class TdmaScheduler:
+    """
+    Queues one boat's outgoing frames and releases them during its own slot.
+    Call send() instead of writing AT+SEND directly and poll() every loop
+    iteration; poll() returns the (dest, message) to transmit now, one at a
+    time, each only if its airtime fits in the rest of the slot.
+    """
+
+    def __init__(self, address, leader_address, sf=12, queue_size=QUEUE_SIZE):
+        self.address = address
+        self.leader_address = leader_address
+        self.sf = sf
+        self.queue = collections.deque()
+        self.queue_size = queue_size
+        self.frame_period = None
+        self.slots = None
+        self.slot = None
+        # Start time of a frame (start of the leader's slot) and when it was last observed
+        self.origin = None
+        self.synced_at = None
+        # The module sends one packet at a time
+        self.busy_until = -math.inf
+        # Counters
+        self.sent = 0
+        self.unscheduled = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def is_leader(self):
+        return self.address == self.leader_address
+
+    def configure(self, period, slots):
+        """
+        Sets the frame period in seconds and the number of slots. Raises
+        ValueError (and keeps the previous schedule) if the boat has no slot in it.
+        """
+        slot = slot_index(self.address, self.leader_address, slots)
+        self.frame_period = period
+        self.slots = slots
+        self.slot = slot
+
+    def sync(self, frame_start, now):
+        """
+        Sets the start time of a frame (the leader's slot 0).
+        """
+        self.origin = frame_start
+        self.synced_at = now
+
+    def observe(self, packet, now):
+        """
+        Takes the schedule and timing from a packet of the leader received at `now`.
+        Returns True if the packet was a TDMA announcement or a sync frame. Raises
+        ValueError for an announced frame without a slot for this boat.
+        """
+        if packet is None or packet.sender != self.leader_address or self.is_leader:
+            return False
+        payload = packet.text
+        announcement = parse_announcement(payload)
+        if announcement is not None:
+            self.configure(*announcement)
+            return True
+        if telemetry.is_binary_frame(payload) and telemetry.message_type(payload) == telemetry.MSG_LEADER:
+            # The leader starts its telemetry frames at the start of its slot (other
+            # frames, e.g. slot assignments, may go out later in the slot)
+            self.sync(now - telemetry.lora_airtime(len(packet.payload), sf=self.sf), now)
+            return True
+        return False
+
+    def synchronized(self, now):
+        if self.frame_period is None or self.origin is None:
+            return False
+        return self.is_leader or now - self.synced_at <= SYNC_TIMEOUT
+
+    def slot_bounds(self, now):
+        """
+        (start, end) of the boat's current slot, or of its next one if it is not in it.
+        """
+        length = self.frame_period / self.slots
+        first = self.origin + self.slot * length
+        start = first + math.floor((now - first) / self.frame_period) * self.frame_period
+        if now >= start + length:
+            start += self.frame_period
+        return start, start + length
+
+    def send(self, dest, message, now, sync=False):
+        """
+        Queues a frame. A sync frame (leader telemetry) goes first and replaces
+        a sync frame still waiting, whose data would be out of date.
+        """
+        if sync:
+            for item in [item for item in self.queue if item[3]]:
+                self.queue.remove(item)
+                self.dropped += 1
+        if len(self.queue) >= self.queue_size:
+            self.queue.popleft()
+            self.dropped += 1
+        item = (dest, message, now, sync)
+        if sync:
+            self.queue.appendleft(item)
+        else:
+            self.queue.append(item)
+
+    def poll(self, now):
+        """
+        Returns the (dest, message) to transmit now, or None.
+        """
+        if not self.queue or now < self.busy_until:
+            return None
+        dest, message, queued, sync = self.queue[0]
+        airtime = telemetry.lora_airtime(len(message), sf=self.sf)
+        if self.synchronized(now):
+            start, end = self.slot_bounds(now)
+            if now < start:
+                return None
+            at_start = now - start <= SYNC_WINDOW
+            if sync and not at_start:
+                return None
+            # Frames longer than a slot only go out at the slot start (and spill into the guard time)
+            if now + airtime > end - GUARD_TIME and not at_start:
+                return None
+        else:
+            self.unscheduled += 1
+        self.queue.popleft()
+        self.busy_until = now + airtime
+        self.sent += 1
+        self.total_wait += now - queued
+        self.max_wait = max(self.max_wait, now - queued)
+        return dest, message
+
+    def summary(self):
+        if self.frame_period is None:
+            schedule = "no schedule"
+        else:
+            schedule = f"slot {self.slot}/{self.slots} of {self.frame_period:.2f} s"
+        mean_wait = self.total_wait / self.sent if self.sent else 0.0
+        return (f"{schedule}, {self.sent} frames sent ({self.unscheduled} unscheduled), {self.dropped} dropped, "
+                f"wait mean {mean_wait:.2f} s / max {self.max_wait:.2f} s")
@@ -0,0 +1,270 @@
+import base64
+import binascii
+import math
+import struct
+import time
+from collections import namedtuple
+
+# --- Frame Format ---
+# Leader telemetry is sent as a packed binary struct, base64 encoded so that it
+# survives the RYLR896 ASCII payload (no commas, CR or LF in the encoded text).
+# A leading FRAME_MARKER tells receivers it is a binary frame and not a
+# text message such as "CMD,START".
+#
+# Layout (little endian, 21 bytes -> 28 base64 characters, 29 with the marker):
+#   B  header        high nibble = FRAME_VERSION, low nibble = message type
+#   H  seq           sequence number, wraps at 65536
+#   i  lat           latitude in 1e-7 degrees
+#   i  lon           longitude in 1e-7 degrees
+#   H  heading       heading in 0.01 degrees (0-35999)
+#   I  timestamp_ms  sender wall clock in milliseconds, wraps at 2**32
+#   B  fix_age       age of the GPS fix in 0.1 s, FIX_AGE_UNKNOWN if there is no fix
+#                    (version 1 frames have a reserved pad byte here)
+#   B  mission       low byte of the ID of the leader's mission (see mission.py)
+#   B  waypoint      index of the waypoint the leader is heading to, MISSION_NONE without a mission
+#   B  progress      percent of the mission (lap) length covered
+# Versions 1 and 2 end after fix_age (18 bytes). 21 bytes is a multiple of 3,
+# so the base64 text needs no padding.
+#
+# Follower status (version 3, broadcast by each follower in its TDMA slot; 15 bytes -> 21 characters):
+#   B  header, H seq, i lat, i lon, H heading, B fix_age   as in the leader frame
+#   B  slot          formation slot the follower holds, SLOT_NONE before an assignment
+#
+# Slot assignment (version 3, leader; 5 header bytes + one byte per follower, at
+# most ASSIGNMENT_SLOTS followers per frame -> up to 21 bytes, 29 characters):
+#   B  header
+#   B  epoch         assignment number, wraps at 256 (see formation_planner.py)
+#   B  formation     index into formation.FORMATIONS
+#   B  spacing       slot spacing in metres
+#   B  first         follower index of the first slot byte (follower address - leader address - 1)
+#   B  slot * n      slot of each follower from `first` on, SLOT_NONE if it has none
+FRAME_MARKER = "#"
+FRAME_VERSION = 3
+
+# Message types
+MSG_LEADER = 1
+MSG_FOLLOWER = 2
+MSG_ASSIGNMENT = 3
+
+LEADER_STRUCT = struct.Struct("<BHiiHIBBBB")
+LEADER_STRUCT_V2 = struct.Struct("<BHiiHIB")
+LEADER_STRUCT_V1 = struct.Struct("<BHiiHIx")
+FOLLOWER_STRUCT = struct.Struct("<BHiiHBB")
+ASSIGNMENT_HEADER = struct.Struct("<BBBBB")
+# Most followers in one slot assignment frame (keeps it within tdma.MAX_FRAME_BYTES)
+ASSIGNMENT_SLOTS = 16
+
+# Scale factors between floating point values and the packed integers
+COORD_SCALE = 10_000_000
+HEADING_SCALE = 100
+FIX_AGE_SCALE = 10
+# fix_age value for "no fix" (or a fix older than 25.4 s)
+FIX_AGE_UNKNOWN = 255
+# waypoint value for "no mission"
+MISSION_NONE = 255
+# slot value for "no slot assigned"
+SLOT_NONE = 255
+
+# Decoded leader telemetry frame; fix_age is in seconds, or None without a GPS fix.
+# mission, waypoint and progress are None without a mission (and in version 1/2 frames)
+LeaderTelemetry = namedtuple("LeaderTelemetry", "seq lat lon heading timestamp_ms fix_age mission waypoint progress",
+                             defaults=(None, None, None))
+# Decoded follower status frame; slot is None before the follower got an assignment
+FollowerStatus = namedtuple("FollowerStatus", "seq lat lon heading fix_age slot")
+# Decoded slot assignment frame; slots[i] is the slot of follower index first + i (None: no slot)
+SlotAssignment = namedtuple("SlotAssignment", "epoch formation spacing first slots")
+
+
+def _pack_fix_age(fix_age):
+    if fix_age is None:
+        return FIX_AGE_UNKNOWN
+    return min(round(fix_age * FIX_AGE_SCALE), FIX_AGE_UNKNOWN)
+
+
+def _encode(raw):
+    return FRAME_MARKER + base64.b64encode(raw).decode("ascii")
+
+
+def encode_leader(seq, lat, lon, heading, timestamp_ms=None, fix_age=None, mission=None, waypoint=None,
+                  progress=None):
+    """
+    Packs a leader telemetry frame into a LoRa-safe ASCII payload.
+    fix_age is the age of the GPS fix in seconds, or None without a fix.
+    mission is the mission ID, waypoint the index of the waypoint being
+    approached and progress the percent covered, or None without a mission.
+    """
+    if timestamp_ms is None:
+        timestamp_ms = int(time.time() * 1000)
+    packed_age = _pack_fix_age(fix_age)
+    if waypoint is None:
+        mission, waypoint, progress = 0, MISSION_NONE, 0
+    else:
+        waypoint = min(waypoint, MISSION_NONE - 1)
+        progress = max(0, min(round(progress), 100))
+    header = (FRAME_VERSION << 4) | MSG_LEADER
+    raw = LEADER_STRUCT.pack(
+        header,
+        seq & 0xFFFF,
+        round(lat * COORD_SCALE),
+        round(lon * COORD_SCALE),
+        round(heading * HEADING_SCALE) % (360 * HEADING_SCALE),
+        timestamp_ms & 0xFFFFFFFF,
+        packed_age,
+        mission & 0xFF,
+        waypoint,
+        progress,
+    )
+    return _encode(raw)
+
+
+def encode_follower(seq, lat, lon, heading, fix_age=None, slot=None):
+    """
+    Packs a follower status frame. lat and lon are 0 without a fix (fix_age None).
+    """
+    header = (FRAME_VERSION << 4) | MSG_FOLLOWER
+    return _encode(FOLLOWER_STRUCT.pack(
+        header,
+        seq & 0xFFFF,
+        round(lat * COORD_SCALE),
+        round(lon * COORD_SCALE),
+        round(heading * HEADING_SCALE) % (360 * HEADING_SCALE),
+        _pack_fix_age(fix_age),
+        SLOT_NONE if slot is None else slot,
+    ))
+
+
+def encode_assignment(epoch, formation, spacing, first, slots):
+    """
+    Packs a slot assignment frame for followers first .. first + len(slots) - 1
+    (at most ASSIGNMENT_SLOTS); slots holds each one's slot index or None.
+    """
+    if len(slots) > ASSIGNMENT_SLOTS:
+        raise ValueError(f"at most {ASSIGNMENT_SLOTS} slots per assignment frame")
+    header = (FRAME_VERSION << 4) | MSG_ASSIGNMENT
+    raw = ASSIGNMENT_HEADER.pack(header, epoch & 0xFF, formation, min(round(spacing), 255), first)
+    return _encode(raw + bytes(SLOT_NONE if slot is None else slot for slot in slots))
+
+
+def is_binary_frame(payload):
+    """
+    Returns True if a received payload is a binary telemetry frame.
+    """
+    return payload.startswith(FRAME_MARKER)
+
+
+def message_type(payload):
+    """
+    Returns the message type of a binary frame from its first base64 quantum
+    (without decoding the rest), or None if it cannot be read.
+    """
+    try:
+        return base64.b64decode(payload[len(FRAME_MARKER):len(FRAME_MARKER) + 4], validate=True)[0] & 0x0F
+    except (binascii.Error, ValueError, IndexError):
+        return None
+
+
+def decode_frame(payload):
+    """
+    Decodes a binary telemetry frame. Raises ValueError for malformed frames,
+    unknown versions or unknown message types.
+    """
+    if not is_binary_frame(payload):
+        raise ValueError("not a binary telemetry frame")
+    try:
+        raw = base64.b64decode(payload[len(FRAME_MARKER):], validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"bad frame encoding: {e}") from None
+    if not raw:
+        raise ValueError("empty frame")
+
+    version, msg_type = raw[0] >> 4, raw[0] & 0x0F
+    if version not in (1, 2, FRAME_VERSION):
+        raise ValueError(f"unsupported frame version {version}")
+    if msg_type == MSG_LEADER:
+        layout = {1: LEADER_STRUCT_V1, 2: LEADER_STRUCT_V2}.get(version, LEADER_STRUCT)
+        if len(raw) != layout.size:
+            raise ValueError(f"leader frame is {len(raw)} bytes, expected {layout.size}")
+        mission = waypoint = progress = None
+        if version == 1:
+            _, seq, lat, lon, heading, timestamp_ms = layout.unpack(raw)
+            packed_age = FIX_AGE_UNKNOWN
+        elif version == 2:
+            _, seq, lat, lon, heading, timestamp_ms, packed_age = layout.unpack(raw)
+        else:
+            _, seq, lat, lon, heading, timestamp_ms, packed_age, mission, waypoint, progress = layout.unpack(raw)
+            if waypoint == MISSION_NONE:
+                mission = waypoint = progress = None
+        fix_age = None if packed_age == FIX_AGE_UNKNOWN else packed_age / FIX_AGE_SCALE
+        return LeaderTelemetry(seq, lat / COORD_SCALE, lon / COORD_SCALE,
+                               heading / HEADING_SCALE, timestamp_ms, fix_age, mission, waypoint, progress)
+    if version != FRAME_VERSION:
+        raise ValueError(f"message type {msg_type} needs frame version {FRAME_VERSION}")
+    if msg_type == MSG_FOLLOWER:
+        if len(raw) != FOLLOWER_STRUCT.size:
+            raise ValueError(f"follower frame is {len(raw)} bytes, expected {FOLLOWER_STRUCT.size}")
+        _, seq, lat, lon, heading, packed_age, slot = FOLLOWER_STRUCT.unpack(raw)
+        fix_age = None if packed_age == FIX_AGE_UNKNOWN else packed_age / FIX_AGE_SCALE
+        return FollowerStatus(seq, lat / COORD_SCALE, lon / COORD_SCALE, heading / HEADING_SCALE, fix_age,
+                              None if slot == SLOT_NONE else slot)
+    if msg_type == MSG_ASSIGNMENT:
+        if not ASSIGNMENT_HEADER.size <= len(raw) <= ASSIGNMENT_HEADER.size + ASSIGNMENT_SLOTS:
+            raise ValueError(f"assignment frame is {len(raw)} bytes")
+        _, epoch, formation, spacing, first = ASSIGNMENT_HEADER.unpack_from(raw)
+        slots = tuple(None if slot == SLOT_NONE else slot for slot in raw[ASSIGNMENT_HEADER.size:])
+        return SlotAssignment(epoch, formation, spacing, first, slots)
+    raise ValueError(f"unknown message type {msg_type}")
+
+
+# --- LoRa Airtime ---
+# RYLR896 defaults (AT+PARAMETER=12,7,1,4): SF12, 125 kHz, coding rate 4/5, 4 preamble symbols
+def lora_airtime(payload_len, sf=12, bandwidth=125000, coding_rate=1, preamble=4,
+                 explicit_header=True, crc=True):
+    """
+    Returns the time on air in seconds of a LoRa packet with payload_len bytes
+    (Semtech SX127x datasheet formula).
+    """
+    symbol_time = (2 ** sf) / bandwidth
+    # Low data rate optimisation is enabled by the module when symbols are longer than 16 ms
+    low_dr = 1 if symbol_time > 0.016 else 0
+    header = 0 if explicit_header else 1
+    numerator = 8 * payload_len - 4 * sf + 28 + 16 * int(crc) - 20 * header
+    payload_symbols = 8 + max(math.ceil(numerator / (4 * (sf - 2 * low_dr))) * (coding_rate + 4), 0)
+    return (preamble + 4.25) * symbol_time + payload_symbols * symbol_time
+
+
+# --- Sequence Filtering ---
+# Sequence numbers are compared with serial number arithmetic so the 16-bit counter can wrap
+SEQ_MODULO = 0x10000
+
+
+class SequenceFilter:
+    """
+    Drops duplicate and out-of-date frames by sequence number. If nothing has
+    been accepted for `reset_after` seconds (e.g. the sender restarted and its
+    counter went back to 0), the next frame is accepted unconditionally.
+    """
+
+    def __init__(self, reset_after=10.0):
+        self.reset_after = reset_after
+        self.last_seq = None
+        self.last_time = None
+        self.duplicates = 0
+        self.stale = 0
+
+    def accept(self, seq, now=None):
+        """
+        Returns True if `seq` is newer than the last accepted frame.
+        """
+        if now is None:
+            now = time.monotonic()
+        if self.last_seq is not None and now - self.last_time <= self.reset_after:
+            delta = (seq - self.last_seq) % SEQ_MODULO
+            if delta == 0:
+                self.duplicates += 1
+                return False
+            if delta >= SEQ_MODULO // 2:
+                self.stale += 1
+                return False
+        self.last_seq = seq
+        self.last_time = now
+        return True